@@ -0,0 +1,313 @@
+import sys
+from collections import Counter, deque
+
+from utils import read_conll
+
+"""
+Aligns the sentences and tokens of a gold and a system CoNLL-U file, so their enhanced edges can
+be compared pair by pair instead of only through corpus-wide counts, e.g.:
+
+python conllugraph/align.py -g data/UD_English-EWT/en_ewt-ud-test.conllu -s sysoutputs/en_ewt-ud-test-sys.conllu
+"""
+
+SENT_ID_PREFIX = "# sent_id = "
+TEXT_PREFIX = "# text = "
+
+# alignment methods, in the order they are tried
+METHODS = ("sent_id", "text", "tokens")
+
+
+def normalise_text(text):
+    """Removes all whitespace, so texts which only differ in spacing (or tokenisation) are equal."""
+    return "".join(text.split())
+
+
+def get_comment_value(sentence, prefix):
+    for line in sentence.comments:
+        if line.startswith(prefix):
+            return line[len(prefix):].strip()
+    return None
+
+
+def get_surface_forms(sentence):
+    """Returns the surface forms of the sentence: multi-word tokens instead of their words, and no empty nodes."""
+
+    forms = []
+    mwt_last = None
+    # skip ROOT
+    for token in sentence[1:]:
+        conllu_id = str(token.conllu_id)
+        if "-" in conllu_id:
+            mwt_last = conllu_id.split("-")[1]
+            forms.append(token.word)
+        elif "." in conllu_id:
+            continue
+        elif mwt_last is not None:
+            if conllu_id == mwt_last:
+                mwt_last = None
+        else:
+            forms.append(token.word)
+    return forms
+
+
+def get_sentence_keys(sentence):
+    """
+    Returns the alignment key of the sentence for each method: its sent_id, its normalised text
+    (from the text comment, or else its surface forms) and the sequence of its surface forms.
+    Keys which are not available are None.
+    """
+
+    forms = get_surface_forms(sentence)
+    text = get_comment_value(sentence, TEXT_PREFIX)
+    return {
+        "sent_id": get_comment_value(sentence, SENT_ID_PREFIX),
+        "text": normalise_text(text if text is not None else "".join(forms)),
+        "tokens": "\t".join(forms),
+    }
+
+
+class SentenceAlignment(object):
+    """
+    SentenceAlignment
+
+    The aligned (gold index, system index, method) pairs of two lists of sentences, in gold order,
+    and the indices of the sentences which could not be aligned.
+    """
+
+    def __init__(self, pairs, unaligned_gold, unaligned_system):
+        self.pairs = pairs
+        self.unaligned_gold = unaligned_gold
+        self.unaligned_system = unaligned_system
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def method_counts(self):
+        return Counter(method for _, _, method in self.pairs)
+
+    def summary(self):
+        counts = self.method_counts()
+        aligned = ", ".join(f"{counts[method]} by {method}" for method in METHODS if counts[method])
+        return (f"aligned {len(self.pairs)} sentences ({aligned if aligned else 'none'}), "
+                f"unaligned: {len(self.unaligned_gold)} gold, {len(self.unaligned_system)} system")
+
+
+def align_sentences(gold_sentences, system_sentences, methods=METHODS, gold_keys=None):
+    """
+    Aligns gold and system sentences in linear time, with one pass per method. Each pass matches
+    the gold sentences which are still unaligned to the first unused system sentence with the same
+    key, so duplicate sentences are matched in file order, and a sentence which could be aligned
+    by its sent_id never takes the place of another one with the same text.
+
+    Arguments:
+        gold_sentences: list of ConlluSentence objects.
+        system_sentences: list of ConlluSentence objects.
+        methods: the keys to align on, see get_sentence_keys.
+        gold_keys: optional keys of the gold sentences, e.g. to align many system files to one gold file.
+
+    Returns:
+        alignment: a SentenceAlignment.
+    """
+
+    if gold_keys is None:
+        gold_keys = [get_sentence_keys(sentence) for sentence in gold_sentences]
+    system_keys = [get_sentence_keys(sentence) for sentence in system_sentences]
+
+    used = [False] * len(system_sentences)
+    aligned = [None] * len(gold_sentences)
+
+    for method in methods:
+        # the unused system sentences with each key, in file order
+        index = {}
+        for system_index, keys in enumerate(system_keys):
+            if not used[system_index] and keys[method]:
+                index.setdefault(keys[method], deque()).append(system_index)
+
+        for gold_index, keys in enumerate(gold_keys):
+            if aligned[gold_index] is None and keys[method]:
+                candidates = index.get(keys[method])
+                if candidates:
+                    system_index = candidates.popleft()
+                    used[system_index] = True
+                    aligned[gold_index] = (gold_index, system_index, method)
+
+    pairs = [pair for pair in aligned if pair is not None]
+    unaligned_gold = [gold_index for gold_index, pair in enumerate(aligned) if pair is None]
+    unaligned_system = [system_index for system_index, is_used in enumerate(used) if not is_used]
+
+    return SentenceAlignment(pairs, unaligned_gold, unaligned_system)
+
+
+def get_token_spans(sentence):
+    """
+    Returns the character span of every word of the sentence in its text without whitespace,
+    as {conllu_id: (start, end, part)}. The words of a multi-word token share its span and are
+    told apart by their position in it. Empty nodes have no surface form, so they get no span.
+    """
+
+    spans = {}
+    offset = 0
+    mwt_span = None
+    mwt_last = None
+    part = 0
+
+    # skip ROOT
+    for token in sentence[1:]:
+        conllu_id = str(token.conllu_id)
+        if "-" in conllu_id:
+            length = len(normalise_text(token.word))
+            mwt_span = (offset, offset + length)
+            mwt_last = conllu_id.split("-")[1]
+            part = 0
+            offset += length
+        elif "." in conllu_id:
+            continue
+        elif mwt_span is not None:
+            spans[conllu_id] = (mwt_span[0], mwt_span[1], part)
+            part += 1
+            if conllu_id == mwt_last:
+                mwt_span = None
+        else:
+            length = len(normalise_text(token.word))
+            spans[conllu_id] = (offset, offset + length, 0)
+            offset += length
+
+    return spans
+
+
+def get_empty_node_ids(sentence):
+    return [str(token.conllu_id) for token in sentence[1:] if "." in str(token.conllu_id)]
+
+
+def align_tokens(gold_sentence, system_sentence):
+    """
+    Aligns the words of two sentences with the same text through their character spans, so words
+    are only aligned when they cover exactly the same characters. ROOT is always aligned, and an
+    empty node N.k is aligned to M.k when word N is aligned to word M.
+
+    Returns:
+        token_alignment: dictionary from gold to system CoNLL-U IDs (as strings).
+    """
+
+    system_ids = {span: conllu_id for conllu_id, span in get_token_spans(system_sentence).items()}
+    token_alignment = {"0": "0"}
+    for conllu_id, span in get_token_spans(gold_sentence).items():
+        system_id = system_ids.get(span)
+        if system_id is not None:
+            token_alignment[conllu_id] = system_id
+
+    system_empty_nodes = set(get_empty_node_ids(system_sentence))
+    if system_empty_nodes:
+        for conllu_id in get_empty_node_ids(gold_sentence):
+            word_id, _, position = conllu_id.partition(".")
+            system_word_id = token_alignment.get(word_id)
+            if system_word_id is not None and f"{system_word_id}.{position}" in system_empty_nodes:
+                token_alignment[conllu_id] = f"{system_word_id}.{position}"
+
+    return token_alignment
+
+
+def get_enhanced_edges(sentence):
+    """Returns the (dependent, head, label) enhanced edges of the sentence, with string IDs."""
+
+    # skip ROOT
+    return [(str(token.conllu_id), enhanced_head, enhanced_label)
+            for token in sentence[1:] for enhanced_head, enhanced_label in token.deps_set]
+
+
+def compare_edges(gold_sentence, system_sentence, token_alignment=None):
+    """
+    Compares the enhanced edges of an aligned pair of sentences. An edge matches when both its
+    dependent and its head are aligned to those of a system edge (with the same label for a labelled match).
+
+    Returns:
+        counts: Counter with the number of gold and system edges, of (un)labelled matches and
+        of gold edges with a word which is not aligned.
+    """
+
+    if token_alignment is None:
+        token_alignment = align_tokens(gold_sentence, system_sentence)
+
+    system_edges = get_enhanced_edges(system_sentence)
+    system_labelled = Counter(system_edges)
+    system_unlabelled = Counter((dependent, head) for dependent, head, _ in system_edges)
+
+    counts = Counter(system_edges=len(system_edges))
+    for dependent, head, label in get_enhanced_edges(gold_sentence):
+        counts["gold_edges"] += 1
+        system_dependent = token_alignment.get(dependent)
+        system_head = token_alignment.get(head)
+        if system_dependent is None or system_head is None:
+            counts["unaligned_edges"] += 1
+            continue
+        if system_unlabelled[system_dependent, system_head] > 0:
+            system_unlabelled[system_dependent, system_head] -= 1
+            counts["unlabelled_matches"] += 1
+        if system_labelled[system_dependent, system_head, label] > 0:
+            system_labelled[system_dependent, system_head, label] -= 1
+            counts["labelled_matches"] += 1
+
+    return counts
+
+
+def evaluate_aligned(gold_sentences, system_sentences, alignment=None):
+    """
+    Compares the enhanced edges of every aligned pair of sentences.
+
+    Returns:
+        alignment: the SentenceAlignment.
+        counts: Counter with the summed counts of compare_edges, over the aligned pairs only.
+    """
+
+    if alignment is None:
+        alignment = align_sentences(gold_sentences, system_sentences)
+
+    counts = Counter()
+    for gold_index, system_index, _ in alignment.pairs:
+        counts.update(compare_edges(gold_sentences[gold_index], system_sentences[system_index]))
+
+    return alignment, counts
+
+
+def get_scores(counts, matches):
+    """Returns the precision, recall and F1 of a kind of match from the counts of evaluate_aligned."""
+
+    precision = counts[matches] / counts["system_edges"] if counts["system_edges"] else 0.
+    recall = counts[matches] / counts["gold_edges"] if counts["gold_edges"] else 0.
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.
+    return precision, recall, f1
+
+
+def log_alignment(alignment, counts):
+    """Prints the alignment summary and the edge scores over the aligned sentences."""
+
+    print(alignment.summary())
+    print(f"enhanced edges: {counts['gold_edges']} gold, {counts['system_edges']} system, "
+          f"{counts['unaligned_edges']} gold edges with unaligned words")
+    for name, matches in [("unlabelled", "unlabelled_matches"), ("labelled", "labelled_matches")]:
+        precision, recall, f1 = get_scores(counts, matches)
+        print(f"{name}: precision {precision:.4f}, recall {recall:.4f}, f1 {f1:.4f}")
+
+
+def argparser():
+    from argparse import ArgumentParser
+    ap = ArgumentParser()
+    ap.add_argument('-g', '--gold', type=str,
+    help='Gold CoNLL-U file.')
+    ap.add_argument('-s', '--system', type=str,
+    help='System CoNLL-U file.')
+    return ap
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+
+    gold_sentences, _ = read_conll(args.gold)
+    system_sentences, _ = read_conll(args.system)
+    log_alignment(*evaluate_aligned(gold_sentences, system_sentences))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
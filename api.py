@@ -0,0 +1,118 @@
+from delexicalise_enhanced_dependencies import DelexicaliseConllu
+from graph import ConlluSentence
+from relexicalise_enhanced_dependencies import RelexicaliseConllu
+from treebank_profile import TreebankProfile
+from utils import format_sentence, get_root, iter_sentence_lines, parse_sentence
+
+"""
+In-memory delexicalisation and relexicalisation, e.g. for online parsing:
+
+from api import LexicalisationPipeline
+
+pipeline = LexicalisationPipeline.from_treebank("data/train-dev/UD_Finnish-TDT/fi_tdt-ud-train.conllu")
+delexicalised = pipeline.delexicalise_text(conllu_text)
+# ... parse the delexicalised sentences ...
+relexicalised = pipeline.relexicalise_text(parser_output)
+"""
+
+
+class LexicalisationPipeline(object):
+    """
+    LexicalisationPipeline
+
+    Delexicalises and relexicalises sentences in memory, without writing or reading any files.
+    The treebank profile (morphological case decision and forbidden list) is loaded once, and the
+    (de|re)lexicalisers are kept between calls, so their compiled rules and counters are reused.
+
+    Sentences can be given as ConlluSentence objects, as lists of ConlluToken objects (with or
+    without the ROOT token) or as CoNLL-U text with one or more sentences. Note that
+    delexicalisation and relexicalisation modify the given tokens in place.
+
+    Params:
+        attach_morphological_case: whether to attach the "Case" attribute from the morphological features.
+        forbidden_list: lexical items which are never delexicalised, see get_forbidden_from_vocab.
+        skip_mwt: whether to skip multi-word token ranges when parsing CoNLL-U text.
+    """
+
+    def __init__(self, attach_morphological_case, forbidden_list, skip_mwt=False):
+        self.attach_morphological_case = attach_morphological_case
+        self.forbidden_list = forbidden_list
+        self.skip_mwt = skip_mwt
+        self.root = get_root()
+
+        self.delexicalise_conllu = DelexicaliseConllu(attach_morphological_case, False, forbidden_list)
+        self.relexicalise_conllu = RelexicaliseConllu(attach_morphological_case, False)
+
+    @classmethod
+    def from_profile(cls, profile, skip_mwt=False):
+        """Builds the pipeline from a TreebankProfile."""
+
+        return cls(profile.attach_morphological_case, profile.forbidden_list, skip_mwt)
+
+    @classmethod
+    def from_treebank(cls, filename, skip_mwt=False):
+        """Builds the pipeline from the stored profile of a treebank, computing it if needed."""
+
+        return cls.from_profile(TreebankProfile.load(filename), skip_mwt)
+
+    def parse(self, sentences):
+        """
+        Converts the sentences to ConlluSentence objects with their ID index and children.
+
+        Arguments:
+            sentences: CoNLL-U text, a single sentence or an iterable of sentences, see the class docstring.
+
+        Returns:
+            annotated_sentences: list of ConlluSentence objects, starting with the ROOT token.
+        """
+
+        if isinstance(sentences, str):
+            return [parse_sentence(sentence_lines, self.skip_mwt, self.root)
+                    for sentence_lines in iter_sentence_lines(sentences.split("\n"))]
+
+        if isinstance(sentences, ConlluSentence):
+            sentences = [sentences]
+        else:
+            sentences = list(sentences)
+            if sentences and not isinstance(sentences[0], (list, str)):
+                # a single list of tokens
+                sentences = [sentences]
+
+        annotated_sentences = []
+        for sentence in sentences:
+            if isinstance(sentence, str):
+                annotated_sentences.extend(self.parse(sentence))
+                continue
+
+            if not sentence or sentence[0].conllu_id not in (0, "0"):
+                # e.g. the output of delexicalise, which has no ROOT token
+                sentence = ConlluSentence([self.root] + list(sentence), getattr(sentence, "comments", None))
+            elif not isinstance(sentence, ConlluSentence):
+                sentence = ConlluSentence(sentence)
+
+            if sentence.id_index is None:
+                sentence.build_index()
+                sentence.build_children()
+            annotated_sentences.append(sentence)
+
+        return annotated_sentences
+
+    def delexicalise(self, sentences):
+        """Returns the delexicalised sentences (without the ROOT token) as ConlluSentence objects."""
+
+        return list(self.delexicalise_conllu.iter_delexicalise(self.parse(sentences)))
+
+    def relexicalise(self, sentences):
+        """Returns the relexicalised sentences (without the ROOT token) as ConlluSentence objects."""
+
+        return list(self.relexicalise_conllu.iter_relexicalise(self.parse(sentences)))
+
+    def delexicalise_text(self, sentences):
+        """Returns the delexicalised sentences as CoNLL-U text."""
+
+        return "".join(format_sentence(sentence) for sentence in self.delexicalise(sentences))
+
+    def relexicalise_text(self, sentences):
+        """Returns the relexicalised sentences as CoNLL-U text."""
+
+        return "".join(format_sentence(sentence) for sentence in self.relexicalise(sentences))
@@ -0,0 +1,204 @@
+import io
+import os
+import sys
+import glob
+import time
+import traceback
+import multiprocessing
+from contextlib import redirect_stdout
+
+# imported here, so every worker pays for the imports once rather than once per file
+import conllu_to_text
+import delexicalise_enhanced_dependencies
+import relexicalise_enhanced_dependencies
+import run
+
+"""
+Runs a job over every treebank under a data root in a pool of worker processes, instead of one
+Python interpreter per file, e.g.:
+
+python conllugraph/batch.py delexicalise -d data/train-dev --workers 4
+python conllugraph/batch.py evaluate -d data/iwpt2020stdata --tbids en_ewt fi_tdt --workers 4 -- --evaluate_edges --evaluate_labels
+
+The treebank files are data_dir/UD_*/<pattern>, and the largest ones are started first, so a big
+treebank does not end up running alone at the end. Any argument after "--" is passed on to the
+script of the job. Only the main process writes: the output of each file is printed (or logged)
+as a whole once the file is done, and the rows of all the evaluations are appended to one table.
+"""
+
+# the default files of each job
+JOB_PATTERNS = {
+    "evaluate": ["*-ud-test.conllu"],
+    "delexicalise": ["*-ud-train.conllu", "*-ud-dev.conllu"],
+    "relexicalise": ["*-ud-train.conllu", "*-ud-dev.conllu"],
+    "convert": ["*-ud-train.conllu", "*-ud-dev.conllu"],
+}
+
+# the batch workers are daemon processes, which cannot start the pools of these options
+POOL_OPTIONS = ["--workers", "--parse-workers"]
+
+JOB_SCRIPTS = {
+    "delexicalise": delexicalise_enhanced_dependencies,
+    "relexicalise": relexicalise_enhanced_dependencies,
+    "convert": conllu_to_text,
+}
+
+
+def find_treebank_files(data_dir, patterns, tbids=None):
+    """Returns the files of the treebanks under data_dir which match one of the patterns, optionally only those of the tbids."""
+
+    filenames = set()
+    for pattern in patterns:
+        filenames.update(glob.glob(os.path.join(data_dir, "UD_*", pattern)))
+    return sorted(filename for filename in filenames if tbids is None or run.get_tbid(filename) in tbids)
+
+
+def get_gold_file(filename):
+    """Prefers the variant of a gold file with the full enhanced dependencies, e.g. fr_sequoia-ud-test.fulldeps.conllu."""
+
+    fulldeps = filename[:-len(".conllu")] + ".fulldeps.conllu"
+    return fulldeps if os.path.isfile(fulldeps) else filename
+
+
+def get_job_size(filenames):
+    return sum(os.path.getsize(filename) for filename in filenames if os.path.isfile(filename))
+
+
+def get_tasks(args, job_args):
+    """
+    Returns the (job, filename, arguments, size) tasks of the batch, largest first.
+    An evaluation is as large as its gold file and all its system files together.
+    """
+
+    tasks = []
+    for filename in find_treebank_files(args.data_dir, args.pattern or JOB_PATTERNS[args.job], args.tbids):
+        if args.job == "evaluate":
+            gold = get_gold_file(filename)
+            systems = run.get_system_files([args.systems or os.path.join(args.data_dir, "sysoutputs", "*", "test", "pertreebank")],
+                                           run.get_tbid(gold))
+            if not systems:
+                print(f"no system files for {gold}, skipping it")
+                continue
+            tasks.append((args.job, gold, ["-g", gold, "-s"] + systems + job_args, get_job_size([gold] + systems)))
+        else:
+            tasks.append((args.job, filename, ["-i", filename] + job_args, get_job_size([filename])))
+
+    # the sort is stable, so files of the same size stay in name order
+    return sorted(tasks, key=lambda task: -task[3])
+
+
+def run_task(task):
+    """
+    Runs one task in a worker and captures what it prints.
+
+    Returns:
+        filename: the input of the task.
+        output: its printed output, with the traceback if it failed.
+        rows: the rows of an evaluation, otherwise an empty list.
+        ok: whether the task succeeded.
+        seconds: its running time.
+    """
+
+    job, filename, job_args, _ = task
+    start = time.perf_counter()
+    rows = []
+    ok = True
+
+    with redirect_stdout(io.StringIO()) as output:
+        try:
+            if job == "evaluate":
+                rows = run.evaluate(run.argparser().parse_args(job_args))
+            else:
+                script = JOB_SCRIPTS[job]
+                ok = script.main([script.__file__] + job_args) == 0
+        except (Exception, SystemExit):
+            # one broken treebank should not stop the batch
+            traceback.print_exc(file=output)
+            ok = False
+
+    return filename, output.getvalue(), rows, ok, time.perf_counter() - start
+
+
+def argparser():
+    from argparse import ArgumentParser
+    ap = ArgumentParser()
+    ap.add_argument('job', choices=sorted(JOB_PATTERNS),
+    help='Job to run on every treebank file: evaluate (run.py), delexicalise, relexicalise or convert (conllu_to_text.py).')
+    ap.add_argument('-d', '--data-dir', type=str,
+    help='Data root with one UD_* directory per treebank.')
+    ap.add_argument('--tbids', type=str, nargs='+', default=None,
+    help='Only run the job on these treebanks.')
+    ap.add_argument('--pattern', type=str, nargs='+', default=None,
+    help='File name patterns of the input files in each treebank directory, defaults depend on the job.')
+    ap.add_argument('-s', '--systems', type=str, default=None,
+    help='System files, glob pattern or directories of the evaluation, see run.py. Defaults to data_dir/sysoutputs/*/test/pertreebank.')
+    ap.add_argument('--workers', type=int, default=None,
+    help='Number of worker processes, one per CPU by default. The jobs themselves run in a single process.')
+    ap.add_argument('-o', '--output', type=str, default="metadata.csv",
+    help='CSV table the rows of all the evaluations are appended to, as with run.py --table.')
+    ap.add_argument('--log', metavar='FILE', default=None,
+    help='Write the output of every file to FILE instead of stdout.')
+    return ap
+
+
+def main(argv):
+    if "--" in argv:
+        split = argv.index("--")
+        argv, job_args = argv[:split], argv[split + 1:]
+    else:
+        job_args = []
+    args = argparser().parse_args(argv[1:])
+
+    pool_options = [arg for arg in job_args if arg.split("=")[0] in POOL_OPTIONS]
+    if pool_options:
+        print(f"error: {' '.join(pool_options)} cannot be passed on to the job, every file already runs in a worker of its own; use --workers of batch.py")
+        return 1
+
+    if args.job == "evaluate":
+        # fail before hours of evaluations rather than after them
+        try:
+            run.check_table(args.output)
+        except ValueError as e:
+            print(f"error: {e}")
+            return 1
+
+    tasks = get_tasks(args, job_args)
+    if not tasks:
+        print(f"no files found for {args.job} under {args.data_dir}")
+        return 1
+
+    workers = min(args.workers or multiprocessing.cpu_count(), len(tasks))
+    print(f"{args.job}: {len(tasks)} files, {workers} workers")
+
+    log_file = open(args.log, "w") if args.log else sys.stdout
+    rows = []
+    failed = []
+    try:
+        with multiprocessing.Pool(workers) as pool:
+            # one task at a time, so the workers take the largest remaining file when they are done
+            for filename, output, task_rows, ok, seconds in pool.imap_unordered(run_task, tasks, chunksize=1):
+                print(f"\n--------------------\n{filename}\n--------------------\n", file=log_file)
+                log_file.write(output)
+                log_file.flush()
+                print(f"{'done' if ok else 'FAILED'} {filename} ({seconds:.1f}s)")
+                rows.extend(task_rows)
+                if not ok:
+                    failed.append(filename)
+    finally:
+        if args.log:
+            log_file.close()
+
+    if rows:
+        rows = sorted(rows, key=lambda row: (row[0], row[1]))
+        run.log_table(rows)
+        run.write_table(args.output, rows)
+
+    if failed:
+        print(f"{len(failed)} files failed: {' '.join(failed)}")
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
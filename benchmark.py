@@ -0,0 +1,131 @@
+import sys
+import time
+
+from delexicalise_enhanced_dependencies import DelexicaliseConllu, check_edeps_for_morph_case
+from graph import SymbolTable
+from treebank_profile import get_forbidden_from_vocab
+from utils import iter_conll, VocabCounter
+
+"""
+Times the stages of delexicalisation per sentence, e.g. on a morphologically rich treebank:
+
+python conllugraph/benchmark.py -i data/train-dev/UD_Finnish-TDT/fi_tdt-ud-train.conllu
+
+Only the delexicalisation itself is timed. The input is parsed again before every repetition,
+as delexicalisation modifies the sentences in place. With --check, the fused pass is also
+compared with the separate reference passes, which have to give identical output and counts.
+"""
+
+
+def read_input(filename):
+    vocab_counter = VocabCounter()
+    annotated_sentences = list(iter_conll(filename, vocab_counter=vocab_counter, symbols=SymbolTable()))
+    return annotated_sentences, vocab_counter
+
+
+def time_stages(delexicalise_conllu, annotated_sentences):
+    """Runs the separate delexicalisation passes over every sentence and returns the seconds spent in each."""
+
+    timings = {"case_mark_cc": 0.0, "propagate_first_conj_labels": 0.0, "propagate_cc_modifier_in_conjs": 0.0}
+    clock = time.perf_counter
+
+    for annotated_sentence in annotated_sentences:
+        start = clock()
+        delexicalise_conllu.delexicalise_case_mark_cc(annotated_sentence)
+        case_mark_cc_end = clock()
+        delexicalise_conllu.propagate_first_conj_labels(annotated_sentence)
+        first_conj_end = clock()
+        delexicalise_conllu.propagate_cc_modifier_in_conjs(annotated_sentence)
+        end = clock()
+
+        timings["case_mark_cc"] += case_mark_cc_end - start
+        timings["propagate_first_conj_labels"] += first_conj_end - case_mark_cc_end
+        timings["propagate_cc_modifier_in_conjs"] += end - first_conj_end
+
+    return timings
+
+
+def time_fused(delexicalise_conllu, annotated_sentences):
+    """Runs the fused delexicalisation pass over every sentence and returns the seconds spent."""
+
+    clock = time.perf_counter
+    start = clock()
+    for annotated_sentence in annotated_sentences:
+        delexicalise_conllu.delexicalise_fused(annotated_sentence)
+
+    return {"fused": clock() - start}
+
+
+def get_output(delexicalise_conllu, filename):
+    """Delexicalises the input and returns the output lines and the counters."""
+
+    annotated_sentences, _ = read_input(filename)
+    lines = [str(token) for sentence in delexicalise_conllu.iter_delexicalise(annotated_sentences) for token in sentence]
+    return lines, delexicalise_conllu.deprel_count, delexicalise_conllu.lexical_item_count
+
+
+def check_reference(filename, attach_morphological_case, forbidden_list):
+    """Checks that the fused pass gives the same output and counts as the reference passes."""
+
+    fused_lines, *fused_counts = get_output(DelexicaliseConllu(attach_morphological_case, False, forbidden_list), filename)
+    reference_lines, *reference_counts = get_output(
+        DelexicaliseConllu(attach_morphological_case, False, forbidden_list, reference=True), filename)
+
+    differences = [(line_number, reference_line, fused_line) for line_number, (reference_line, fused_line)
+                   in enumerate(zip(reference_lines, fused_lines), 1) if reference_line != fused_line]
+    for line_number, reference_line, fused_line in differences[:10]:
+        print(f"token {line_number} differs:\n  reference: {reference_line}\n  fused:     {fused_line}")
+
+    identical = not differences and len(reference_lines) == len(fused_lines) and fused_counts == reference_counts
+    print(f"fused output {'identical to' if identical else 'DIFFERS from'} the reference passes")
+    return identical
+
+
+def argparser():
+    from argparse import ArgumentParser
+    ap = ArgumentParser()
+    ap.add_argument('-i', '--input', type=str,
+    help='Input CoNLL-U file.')
+    ap.add_argument('-r', '--repeat', type=int, default=3,
+    help='Number of repetitions, the fastest one is reported.')
+    ap.add_argument('--check', default=False, action='store_true',
+    help='Check that the fused pass gives the same output as the reference passes.')
+    return ap
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+
+    annotated_sentences, vocab_counter = read_input(args.input)
+    num_sentences = len(annotated_sentences)
+    num_tokens = sum(len(annotated_sentence) - 1 for annotated_sentence in annotated_sentences)
+    attach_morphological_case = check_edeps_for_morph_case(annotated_sentences)
+    forbidden_list = get_forbidden_from_vocab(vocab_counter.build())
+
+    results = {}
+    for mode, time_mode in [("reference", time_stages), ("fused", time_fused)]:
+        best = None
+        for repetition in range(args.repeat):
+            if results or repetition > 0:
+                annotated_sentences, _ = read_input(args.input)
+            delexicalise_conllu = DelexicaliseConllu(attach_morphological_case, False, forbidden_list)
+            timings = time_mode(delexicalise_conllu, annotated_sentences)
+            if best is None or sum(timings.values()) < sum(best.values()):
+                best = timings
+        results[mode] = best
+
+    print(f"\n{args.input}: {num_sentences} sentences, {num_tokens} tokens, "
+          f"attach morphological case: {attach_morphological_case}")
+    for mode, best in results.items():
+        print(f"{mode}:")
+        for stage, seconds in list(best.items()) + [("total", sum(best.values()))]:
+            print(f"  {stage:32} {seconds:8.3f}s {seconds / num_sentences * 1e6:10.1f} us/sentence")
+
+    if args.check and not check_reference(args.input, attach_morphological_case, forbidden_list):
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,143 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from corpus import ConlluCorpus
+from utils import iter_conll, hash_file
+
+# bump whenever the layout of a cache entry changes
+CACHE_VERSION = 1
+
+ARRAYS = ("heads", "sentence_offsets", "edge_offsets", "edge_heads", "edge_labels")
+
+
+def get_entry_path(filename, cache_dir, skip_mwt=False):
+    """Each input file (and reader setting) gets its own directory in the cache."""
+
+    key = f"{os.path.abspath(filename)}|skip_mwt={skip_mwt}"
+    name = os.path.basename(filename) + "-" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, name)
+
+
+def write_strings(path, strings):
+    """Stores a list of strings as one newline-separated UTF-8 blob (CoNLL-U fields never contain newlines)."""
+
+    with open(path, "wb") as f:
+        f.write("\n".join(strings).encode("utf-8"))
+
+
+def read_strings(path, count):
+    with open(path, "rb") as f:
+        blob = f.read().decode("utf-8")
+    return blob.split("\n") if count else []
+
+
+def save_entry(entry_path, meta, corpus, vocab):
+    """
+    Writes a cache entry: one .npy file per array, so they can be memory-mapped,
+    the symbol table and comment lines as UTF-8 blobs and the metadata and vocab as JSON.
+    The metadata is written last, so an interrupted write never looks like a valid entry.
+    """
+
+    os.makedirs(entry_path, exist_ok=True)
+    meta_path = os.path.join(entry_path, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    for name in ARRAYS:
+        np.save(os.path.join(entry_path, f"{name}.npy"), getattr(corpus, name))
+    for column in ConlluCorpus.COLUMNS:
+        np.save(os.path.join(entry_path, f"column.{column}.npy"), corpus.columns[column])
+
+    comment_lines = [line for comments in corpus.comments for line in comments]
+    comment_offsets = np.cumsum([0] + [len(comments) for comments in corpus.comments]).astype(np.int64)
+    np.save(os.path.join(entry_path, "comment_offsets.npy"), comment_offsets)
+    write_strings(os.path.join(entry_path, "comments.txt"), comment_lines)
+    write_strings(os.path.join(entry_path, "symbols.txt"), corpus.symbols)
+
+    write_meta(entry_path, dict(meta, num_symbols=len(corpus.symbols), num_comment_lines=len(comment_lines), vocab=vocab))
+
+
+def write_meta(entry_path, meta):
+    """Writes the metadata through a temporary file, so a reader never sees half of it."""
+
+    meta_path = os.path.join(entry_path, "meta.json")
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def load_entry(entry_path, meta, mmap_mode="r"):
+    """Loads a cached corpus, memory-mapping its arrays."""
+
+    def load_array(name):
+        return np.load(os.path.join(entry_path, f"{name}.npy"), mmap_mode=mmap_mode)
+
+    symbols = read_strings(os.path.join(entry_path, "symbols.txt"), meta["num_symbols"])
+    comment_lines = read_strings(os.path.join(entry_path, "comments.txt"), meta["num_comment_lines"])
+    comment_offsets = load_array("comment_offsets").tolist()
+    comments = [comment_lines[start:end] for start, end in zip(comment_offsets[:-1], comment_offsets[1:])]
+    columns = {column: load_array(f"column.{column}") for column in ConlluCorpus.COLUMNS}
+
+    return ConlluCorpus(symbols, columns, *[load_array(name) for name in ARRAYS], comments)
+
+
+def read_meta(entry_path):
+    try:
+        with open(os.path.join(entry_path, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_corpus(filename, cache_dir, skip_mwt=False):
+    """
+    Returns the parsed corpus and vocab of a CoNLL-U file, using the on-disk cache.
+
+    An entry is reused when the file's size and mtime are unchanged. If only the mtime changed,
+    the content hash decides, so touching a file does not force a re-parse. Stale entries are
+    rebuilt automatically.
+
+    Arguments:
+        filename: relative path of input file.
+        cache_dir: directory holding the cache entries.
+        skip_mwt: whether to skip multi-word token ranges.
+
+    Returns:
+        corpus: a ConlluCorpus whose arrays are memory-mapped from the cache.
+        vocab: the buildVocab output for the file.
+    """
+
+    entry_path = get_entry_path(filename, cache_dir, skip_mwt)
+    stat = os.stat(filename)
+    meta = read_meta(entry_path)
+
+    if meta is not None and meta.get("version") == CACHE_VERSION:
+        if meta["size"] == stat.st_size and meta["mtime"] == stat.st_mtime:
+            print(f"Loading cached parse of {filename}")
+            return load_entry(entry_path, meta), meta["vocab"]
+
+        if meta["size"] == stat.st_size and meta["sha1"] == hash_file(filename):
+            print(f"Loading cached parse of {filename} (contents unchanged)")
+            meta["mtime"] = stat.st_mtime
+            write_meta(entry_path, meta)
+            return load_entry(entry_path, meta), meta["vocab"]
+
+        print(f"Cached parse of {filename} is stale, rebuilding")
+
+    corpus = ConlluCorpus.from_sentences(iter_conll(filename, skip_mwt))
+    vocab = corpus.build_vocab(cutoff=1)
+
+    meta = {
+        "version": CACHE_VERSION,
+        "path": os.path.abspath(filename),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha1": hash_file(filename),
+        "skip_mwt": skip_mwt,
+    }
+    save_entry(entry_path, meta, corpus, vocab)
+
+    return load_entry(entry_path, read_meta(entry_path)), vocab
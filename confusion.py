@@ -0,0 +1,271 @@
+import sys
+
+import numpy as np
+
+from delexicalise_enhanced_dependencies import DelexicalisationRules
+
+"""
+Confusion matrix of the enhanced labels of a system file against a gold file, e.g. to find out
+which lexicalised labels a system confuses. Matrices are stored per treebank as NPZ files, which
+can be merged and exported as CSV, either over the full labels, their delexicalised shape
+(e.g. obl:<case_delex>:gen for obl:kanssa:gen) or their lexical suffix (kanssa), e.g.:
+
+python conllugraph/run.py -g data/UD_Finnish-TDT/fi_tdt-ud-test.conllu -s sysoutputs/fi_tdt-ud-test-sys.conllu --confusion fi_tdt.npz
+python conllugraph/confusion.py -i fi_tdt.npz en_ewt.npz -o shapes.csv --view shape
+"""
+
+# the row of the gold edges a system misses and the column of the edges it adds
+NONE = "<none>"
+
+# the relations whose subtype is a lexical item, and the modifier which contributes it
+LEXICAL_RELATIONS = {
+    "obl": "case",
+    "nmod": "case",
+    "acl": "mark",
+    "advcl": "mark",
+    "conj": "cc",
+}
+
+# universal subtypes of these relations, which are not lexical items
+UNIVERSAL_SUBTYPES = {"relcl", "tmod", "npmod", "poss", "agent", "arg", "cleft", "prt", "lmod", "cmp", "emph"}
+
+# values of the Case feature, lowercased as in the enhanced labels
+MORPHOLOGICAL_CASES = {
+    "abe", "abl", "abs", "acc", "add", "ade", "all", "ben", "cau", "cmp", "cns", "com", "dat", "del", "dis",
+    "ela", "equ", "erg", "ess", "gen", "ill", "ine", "ins", "lat", "loc", "nom", "par", "per", "sbe", "sbl",
+    "spl", "sub", "sup", "tem", "ter", "tra", "voc",
+}
+
+VIEWS = ("label", "shape", "suffix")
+
+
+def split_label(enhanced_label, attach_morphological_case=False):
+    """
+    Splits an enhanced label into its delexicalised shape and its lexical suffix, the lexical item
+    of its case/mark/cc modifier, e.g. obl:in_spite_of into obl:<case_delex> and in_spite_of.
+    With attach_morphological_case, a last part which is a morphological case stays in the shape.
+
+    Returns:
+        shape: the label with its lexical item replaced by the modifier's placeholder.
+        suffix: the lexical item, or "_" if there is none.
+    """
+
+    parts = enhanced_label.split(":")
+    modifier = LEXICAL_RELATIONS.get(parts[0])
+    morph_case = len(parts) > 1 and attach_morphological_case and parts[-1] in MORPHOLOGICAL_CASES
+    lexical_parts = parts[1:-1] if morph_case else parts[1:]
+
+    if modifier is None or not lexical_parts or lexical_parts[0] in UNIVERSAL_SUBTYPES:
+        return enhanced_label, "_"
+
+    shape = [parts[0], DelexicalisationRules.PLACEHOLDERS[modifier]] + (parts[-1:] if morph_case else [])
+    return ":".join(shape), ":".join(lexical_parts)
+
+
+def get_occurrence_ranks(sorted_keys):
+    """Returns how many times each key of a sorted array already occurred before it."""
+    return np.arange(len(sorted_keys)) - np.searchsorted(sorted_keys, sorted_keys, side="left")
+
+
+def count_occurrences(sorted_keys, keys):
+    """Returns how often each of the keys occurs in the sorted array."""
+    return np.searchsorted(sorted_keys, keys, side="right") - np.searchsorted(sorted_keys, keys, side="left")
+
+
+class LabelConfusion(object):
+    """
+    LabelConfusion
+
+    Dense confusion matrix of enhanced labels: matrix[gold, system] counts the gold edges with
+    the gold label whose arc (dependent and head) has the system label in the system output. The
+    labels are indexed by the interned label vocab, where NONE (always 0) stands for a missing
+    arc: the NONE column counts the gold edges a system misses, the NONE row the edges it adds.
+    When an arc has several labels, identical labels are paired first.
+
+    Params:
+        labels: the label vocab, starting with NONE.
+        matrix: int64 array of shape (len(labels), len(labels)).
+    """
+
+    def __init__(self, labels, matrix=None):
+        self.labels = labels
+        self.label_ids = {label: label_id for label_id, label in enumerate(labels)}
+        self.matrix = matrix if matrix is not None else np.zeros((len(labels), len(labels)), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def from_edges(cls, edges):
+        """
+        Counts the confusions of the encoded edges of a gold and a system corpus.
+
+        Arguments:
+            edges: an AlignedEdges, see score.encode_edges.
+
+        Returns:
+            confusion: a LabelConfusion.
+        """
+
+        confusion = cls([NONE] + list(edges.labels))
+        matrix = confusion.matrix
+        num_labels = max(len(edges.labels), 1)
+
+        # shift the label IDs past NONE
+        gold_labels = edges.aligned_gold_labels + 1
+        system_labels = edges.system_labels + 1
+        gold_arcs = edges.gold_arcs
+        system_arcs = edges.system_arcs
+
+        # gold edges whose words are not aligned cannot have a system arc
+        np.add.at(matrix, (edges.gold_labels[~edges.is_aligned] + 1, 0), 1)
+
+        # identical edges: the k-th occurrence of an edge in gold is matched if it occurs at least k times in the system output
+        gold_keys = gold_arcs * num_labels + gold_labels - 1
+        system_keys = system_arcs * num_labels + system_labels - 1
+        gold_order = np.argsort(gold_keys, kind="stable")
+        system_order = np.argsort(system_keys, kind="stable")
+        gold_sorted = gold_keys[gold_order]
+        system_sorted = system_keys[system_order]
+        gold_exact = np.zeros(len(gold_keys), dtype=bool)
+        system_exact = np.zeros(len(system_keys), dtype=bool)
+        gold_exact[gold_order] = get_occurrence_ranks(gold_sorted) < count_occurrences(system_sorted, gold_sorted)
+        system_exact[system_order] = get_occurrence_ranks(system_sorted) < count_occurrences(gold_sorted, system_sorted)
+        matrix[np.diag_indices(len(confusion))] += np.bincount(gold_labels[gold_exact], minlength=len(confusion))
+
+        # the remaining edges of the same arc are paired in order of their labels
+        gold_arcs, gold_labels = gold_arcs[~gold_exact], gold_labels[~gold_exact]
+        system_arcs, system_labels = system_arcs[~system_exact], system_labels[~system_exact]
+        gold_order = np.lexsort((gold_labels, gold_arcs))
+        system_order = np.lexsort((system_labels, system_arcs))
+        gold_arcs, gold_labels = gold_arcs[gold_order], gold_labels[gold_order]
+        system_arcs, system_labels = system_arcs[system_order], system_labels[system_order]
+        gold_ranks = get_occurrence_ranks(gold_arcs)
+        system_ranks = get_occurrence_ranks(system_arcs)
+
+        num_ranks = int(max(gold_ranks.max(initial=0), system_ranks.max(initial=0))) + 1
+        gold_pairs = gold_arcs * num_ranks + gold_ranks
+        system_pairs = system_arcs * num_ranks + system_ranks
+        positions = np.searchsorted(system_pairs, gold_pairs).clip(max=max(len(system_pairs) - 1, 0))
+        gold_paired = system_pairs[positions] == gold_pairs if len(system_pairs) else np.zeros(len(gold_pairs), dtype=bool)
+        system_paired = np.zeros(len(system_pairs), dtype=bool)
+        system_paired[positions[gold_paired]] = True
+
+        np.add.at(matrix, (gold_labels[gold_paired], system_labels[positions[gold_paired]]), 1)
+        np.add.at(matrix, (gold_labels[~gold_paired], 0), 1)
+        np.add.at(matrix, (0, system_labels[~system_paired]), 1)
+
+        return confusion
+
+    def merge(self, other):
+        """Returns the confusions of both comparisons together, with the union of their labels."""
+
+        labels = list(self.labels) + [label for label in other.labels if label not in self.label_ids]
+        merged = LabelConfusion(labels)
+        merged.matrix[:len(self), :len(self)] = self.matrix
+        other_ids = np.array([merged.label_ids[label] for label in other.labels], dtype=np.int64)
+        merged.matrix[np.ix_(other_ids, other_ids)] += other.matrix
+        return merged
+
+    def group(self, get_group):
+        """
+        Sums the rows and columns of the labels which get_group maps to the same group.
+
+        Returns:
+            confusion: a LabelConfusion over the groups, where NONE stays NONE.
+        """
+
+        groups = [NONE]
+        group_ids = {NONE: 0}
+        label_groups = [0]
+        for label in self.labels[1:]:
+            group = get_group(label)
+            group_id = group_ids.get(group)
+            if group_id is None:
+                group_id = group_ids[group] = len(groups)
+                groups.append(group)
+            label_groups.append(group_id)
+
+        label_groups = np.array(label_groups, dtype=np.int64)
+        grouped = LabelConfusion(groups)
+        np.add.at(grouped.matrix, (label_groups[:, None], label_groups[None, :]), self.matrix)
+        return grouped
+
+    def view(self, view, attach_morphological_case=False):
+        """Returns the confusions of the full labels, of their delexicalised shapes or of their lexical suffixes."""
+
+        if view == "label":
+            return self
+        part = VIEWS.index(view) - 1
+        return self.group(lambda label: split_label(label, attach_morphological_case)[part])
+
+    def top_confusions(self, num_confusions=10):
+        """Returns the most frequent (gold label, system label, count) confusions, without matches."""
+
+        off_diagonal = self.matrix.copy()
+        np.fill_diagonal(off_diagonal, 0)
+        cells = np.argsort(-off_diagonal, axis=None, kind="stable")[:num_confusions]
+        return [(self.labels[gold], self.labels[system], int(off_diagonal[gold, system]))
+                for gold, system in zip(*np.unravel_index(cells, off_diagonal.shape)) if off_diagonal[gold, system]]
+
+    def save(self, filename):
+        """Writes the matrix as NPZ (with its labels) or, for any other extension, as CSV."""
+
+        if filename.endswith(".npz"):
+            np.savez_compressed(filename, labels=np.array(self.labels, dtype=str), matrix=self.matrix)
+            return
+
+        import csv
+        with open(filename, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["gold\\system"] + self.labels)
+            for label, row in zip(self.labels, self.matrix.tolist()):
+                writer.writerow([label] + row)
+
+    @classmethod
+    def load(cls, filename):
+        """Reads a matrix written by save as NPZ."""
+
+        with np.load(filename) as data:
+            return cls(data["labels"].tolist(), data["matrix"].astype(np.int64))
+
+
+def log_confusions(confusion, num_confusions=10):
+    print(f"most frequent confusions (gold -> system) over {len(confusion) - 1} labels:")
+    for gold, system, count in confusion.top_confusions(num_confusions):
+        print(f"  {gold:24} -> {system:24} {count:8}")
+
+
+def argparser():
+    from argparse import ArgumentParser
+    ap = ArgumentParser()
+    ap.add_argument('-i', '--input', type=str, nargs='+',
+    help='Confusion matrices (NPZ) to merge, e.g. one per treebank.')
+    ap.add_argument('-o', '--output', type=str, default=None,
+    help='Output file, NPZ or CSV depending on its extension.')
+    ap.add_argument('--view', choices=VIEWS, default="label",
+    help='Whether to count the full labels, their delexicalised shapes or their lexical suffixes.')
+    ap.add_argument('-mc', '--attach_morphological_case', default=False, action='store_true',
+    help='Whether the labels end with the morphological case, which is then part of their shape.')
+    ap.add_argument('-n', '--num-confusions', type=int, default=10,
+    help='Number of most frequent confusions to list.')
+    return ap
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+
+    confusion = LabelConfusion.load(args.input[0])
+    for filename in args.input[1:]:
+        confusion = confusion.merge(LabelConfusion.load(filename))
+    confusion = confusion.view(args.view, args.attach_morphological_case)
+
+    log_confusions(confusion, args.num_confusions)
+    if args.output:
+        confusion.save(args.output)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -4,7 +4,8 @@ import os.path
 from collections import Counter
 
 from conllugraph import ConlluGraph
-from graph import stitch_edeps_items, unstitch_edeps_items
+from graph import ConlluSentence, stitch_edeps_items, unstitch_edeps_items
+from utils import get_codec, open_conll
 
 """
 to be automated:
@@ -20,10 +21,12 @@ python conllugraph/conllu_to_text.py -i data/train-dev/UD_Tamil-TTB/ta_ttb-ud-tr
 
 """
 
-def write_output_file(input_path, output_sentences, comment_lines, mode):
+def write_output_file(input_path, output_sentences, mode, compresslevel=None):
     """
     Takes an input path and the delexicalsed sentences and writes them to an output
-    file in CoNLL-U format.
+    file in CoNLL-U format. The sentences can be a lazy iterable, in which case
+    each sentence is written as soon as it has been converted.
+    A .gz, .bz2 or .xz input is written out compressed with the same codec.
     """
 
     dirname = os.path.dirname(input_path)
@@ -38,15 +41,17 @@ def write_output_file(input_path, output_sentences, comment_lines, mode):
 
     if not os.path.exists(output_path):
         print(f"Creating output path {output_path}")
-        os.makedirs(output_path)
+        # another process (e.g. of batch.py) may create it at the same time
+        os.makedirs(output_path, exist_ok=True)
 
     outfile = os.path.join(output_path, basename)
-    with open(outfile, 'w', encoding='utf-8') as fo:
+    # the input's codec, which is also detected from its first bytes when its name does not tell
+    with open_conll(outfile, 'w', compresslevel, codec=get_codec(input_path)) as fo:
 
-       for sentence_information, sent in zip(comment_lines.values(), output_sentences):
+       for sent in output_sentences:
             # write comments if necessary
-            # for line in sentence_information:
-            #     fo.write(line + "\n") 
+            # for line in sent.comments:
+            #     fo.write(line + "\n")
 
             if mode == "gold-to-plainsen":
                 output_sent = " ".join(sent)
@@ -77,8 +82,7 @@ class CopyConllu(object):
         return output_sentences
 
     def conllu_to_text(self, input_annotated_sentences):
-
-        output_sentences = []
+        """Lazily yields the word forms of each sentence."""
 
         for annotated_sentence in input_annotated_sentences:
             output_sentence = []
@@ -93,27 +97,20 @@ class CopyConllu(object):
                     token.word = new_token
 
                 output_sentence.append(token.word)
-            output_sentences.append(output_sentence)
-
-        return output_sentences
+            yield ConlluSentence(output_sentence, annotated_sentence.comments)
 
     def copy_to_pretok(self, input_annotated_sentences):
+        """Lazily yields the word forms of each sentence."""
 
-        output_sentences = []
-        
         for annotated_sentence in input_annotated_sentences:
             output_sentence = []
             for token in annotated_sentence[1:]:
                 output_sentence.append(token.word)
-            output_sentences.append(output_sentence)
-
-        return output_sentences
+            yield ConlluSentence(output_sentence, annotated_sentence.comments)
 
 
     def copy_basic_to_misc(self, input_annotated_sentences, input_secondary_annotated_sentences):
-        """copy basic tree to misc column"""
-
-        output_sentences = []
+        """copy basic tree to misc column, lazily yielding each sentence"""
 
         for input_annotated_sentence, input_secondary_annotated_sentence in zip(input_annotated_sentences, input_secondary_annotated_sentences):
 
@@ -122,8 +119,8 @@ class CopyConllu(object):
             output_sentence = []
             pred_annotations = []
 
-            # get all pred labels in the right format;
-            for pred_token in input_secondary_annotated_sentence:
+            # get all pred labels in the right format, skipping ROOT as for the gold tokens below
+            for pred_token in input_secondary_annotated_sentence[1:]:
                 head = pred_token.head
                 label = pred_token.deprel
                 head_2_misc = f"Head={head}|Label={label}"
@@ -146,9 +143,7 @@ class CopyConllu(object):
             assert i == len(pred_annotations)
             #assert len(output_sentence) == len(pred_annotations), f"{len(output_sentence)} != {len(pred_annotations)}"
 
-            output_sentences.append(output_sentence)
-
-        return output_sentences
+            yield ConlluSentence(output_sentence, input_annotated_sentence.comments)
 
 
 def argparser():
@@ -169,6 +164,8 @@ def argparser():
     help='Skip MWTs in the reader.')
     ap.add_argument('-q', '--quiet', default=False, action='store_true',
     help='Do not display certain helper information.')
+    ap.add_argument('--compress-level', type=int, default=None,
+    help='Compression level for .gz, .bz2 and .xz outputs.')
     return ap
 
 def main(argv):
@@ -181,31 +178,40 @@ def main(argv):
         print("Copying Gold CoNLLU file to plain text.")
 
         base_input = os.path.basename(args.input)
-        input_annotated_sentences, input_vocab, input_comment_lines = conllu_graph.build_dataset(args.input, args.skip_mwt)
-        input_sentence_edges = conllu_graph.build_edges(input_annotated_sentences)
+        input_annotated_sentences = conllu_graph.stream_dataset(args.input, args.skip_mwt, build_children=False)
 
         copy_conllu = CopyConllu()
         output_sentences = copy_conllu.conllu_to_text(input_annotated_sentences)
 
-        write_output_file(args.input, output_sentences, input_comment_lines, args.mode)
+        write_output_file(args.input, output_sentences, args.mode, args.compress_level)
+
+    # Copy GOLD TO PRETOK
+    elif args.mode == "gold-to-pretok":
+        print("Copying Gold CoNLLU file to pretokenised text.")
+
+        base_input = os.path.basename(args.input)
+        input_annotated_sentences = conllu_graph.stream_dataset(args.input, args.skip_mwt, build_children=False)
+
+        copy_conllu = CopyConllu()
+        output_sentences = copy_conllu.copy_to_pretok(input_annotated_sentences)
+
+        write_output_file(args.input, output_sentences, args.mode, args.compress_level)
 
     # COPY BASIC TO MISC
     elif args.mode == "pred-to-misc":
         print("Copying predicted labels to misc.")
         if args.input and args.secondary_input:
             base_input = os.path.basename(args.input)
-            input_annotated_sentences, input_vocab, input_comment_lines = conllu_graph.build_dataset(args.input, args.skip_mwt)
-            input_sentence_edges = conllu_graph.build_edges(input_annotated_sentences)
+            input_annotated_sentences = conllu_graph.stream_dataset(args.input, args.skip_mwt, build_children=False)
 
             base_secondary_input = os.path.basename(args.secondary_input)
-            input_secondary_annotated_sentences, vocab, comment_lines = conllu_graph.build_dataset(args.secondary_input, args.skip_mwt)
-            input_secondary_sentence_edges = conllu_graph.build_edges(input_secondary_annotated_sentences)
+            input_secondary_annotated_sentences = conllu_graph.stream_dataset(args.secondary_input, args.skip_mwt, build_children=False)
 
             copy_conllu = CopyConllu()
             output_sentences = copy_conllu.copy_basic_to_misc(input_annotated_sentences, input_secondary_annotated_sentences)
 
 
-            write_output_file(args.input, output_sentences, input_comment_lines, args.mode)
+            write_output_file(args.input, output_sentences, args.mode, args.compress_level)
         else:
             raise ValueError("mode `pred-to-misc` requires an input and secondary file")
 
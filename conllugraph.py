@@ -1,19 +1,49 @@
-from utils import read_conll, buildVocab
+from utils import read_conll, read_conll_parallel, iter_conll, get_comment_lines, VocabCounter
 
 class ConlluGraph:
     def __init__(self, skip_mwt=False):
         """ ConlluGraph. """
 
-        pass
-
-    def build_dataset(self, filename, skip_mwt):
-        """Reads an input CoNLL-U file and returns a list of ConlluToken objects for each token in a sentence."""
+        # the columnar corpus of the last dataset loaded from the cache
+        self.corpus = None
+
+    def build_dataset(self, filename, skip_mwt=False, cache_dir=None, workers=None):
+        """
+        Reads an input CoNLL-U file and returns a list of ConlluToken objects for each token in a sentence.
+        If a cache directory is given, the parse is loaded from (or stored in) the on-disk cache.
+        Only the arrays are cached, so the sentences are still rebuilt from them, but the loaded
+        ConlluCorpus is kept as self.corpus for callers which can use the arrays directly.
+        With more than one worker, the file is parsed by a pool of processes.
+        """
         print("Building dataset using {}".format(filename))
         print("Skipping MWTs: {}".format(skip_mwt))
-        annotated_sentences, comment_lines = read_conll(filename, skip_mwt)
-        vocab = buildVocab(annotated_sentences, cutoff=1)
+        self.corpus = None
+        if cache_dir:
+            # imported here so numpy is only needed when caching
+            from cache import load_corpus
+            self.corpus, vocab = load_corpus(filename, cache_dir, skip_mwt)
+            annotated_sentences = self.corpus.to_sentences()
+            comment_lines = get_comment_lines(annotated_sentences)
+            return annotated_sentences, vocab, comment_lines
+
+        if workers and workers > 1:
+            return read_conll_parallel(filename, skip_mwt, workers)
+
+        # the vocab is counted while reading, so the corpus is only passed over once
+        vocab_counter = VocabCounter()
+        annotated_sentences, comment_lines = read_conll(filename, skip_mwt, vocab_counter)
+        vocab = vocab_counter.build(cutoff=1)
         return annotated_sentences, vocab, comment_lines
 
+    def stream_dataset(self, filename, skip_mwt=False, build_children=True, vocab_counter=None):
+        """
+        Lazily reads an input CoNLL-U file and yields one ConlluSentence (with its comments) at a time.
+        If a VocabCounter is given, the vocab of each sentence is counted as it is read.
+        """
+        print("Streaming dataset from {}".format(filename))
+        print("Skipping MWTs: {}".format(skip_mwt))
+        return iter_conll(filename, skip_mwt, build_children, vocab_counter)
+
     def build_edges(self, annotated_sentences):
         """Builds individual edges."""
 
@@ -38,8 +68,9 @@ class ConlluGraph:
     def build_subgraph(self, token, sentence_graph, annotated_sentence):
         """ Builds subgraphs of child, parent and grandparent nodes. """
         
-        parent_token = annotated_sentence[int(token.head)]
-        grandparent_token = annotated_sentence[int(parent_token.head)]
+        parent_token = annotated_sentence.get_token(token.head)
+        # ROOT has no head of its own
+        grandparent_token = annotated_sentence.get_token(parent_token.head) if parent_token.conllu_id != 0 else parent_token
         sub_graph = SubGraph(token, parent_token, grandparent_token)
         return sub_graph
 
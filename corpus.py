@@ -0,0 +1,205 @@
+import numpy as np
+
+from graph import ConlluToken, ConlluSentence, pack_deps
+from utils import get_children, get_root
+
+
+class ConlluCorpus(object):
+    """
+    ConlluCorpus
+
+    Columnar representation of a whole treebank for corpus-wide statistics.
+    Every string column is interned in a single symbol table and stored as an
+    array of symbol IDs, with one row per token (ROOT excluded). Sentences are
+    delimited by sentence_offsets, and the enhanced edges of each token are stored
+    in CSR style: the edges of token row t are edge_heads/edge_labels[edge_offsets[t]:edge_offsets[t + 1]].
+    Enhanced heads are stored as positions within the sentence, where 0 is ROOT.
+    """
+    COLUMNS = ("conllu_id", "word", "lemma", "upos", "xpos", "feats", "deprel", "misc")
+
+    def __init__(self, symbols, columns, heads, sentence_offsets, edge_offsets, edge_heads, edge_labels, comments):
+        self.symbols = symbols
+        self.symbol_ids = {symbol: symbol_id for symbol_id, symbol in enumerate(symbols)}
+        self.columns = columns
+        self.heads = heads
+        self.sentence_offsets = sentence_offsets
+        self.edge_offsets = edge_offsets
+        self.edge_heads = edge_heads
+        self.edge_labels = edge_labels
+        self.comments = comments
+
+    def __len__(self):
+        return len(self.sentence_offsets) - 1
+
+    @property
+    def num_tokens(self):
+        return len(self.heads)
+
+    def symbol_id(self, symbol):
+        """Returns the ID of an interned string or -1 if it never occurs in the corpus."""
+        return self.symbol_ids.get(symbol, -1)
+
+    @classmethod
+    def from_sentences(cls, annotated_sentences):
+        """
+        Builds the columnar corpus from annotated sentences, e.g. the output of read_conll or iter_conll.
+
+        Arguments:
+            annotated_sentences: iterable of ConlluSentence objects.
+
+        Returns:
+            corpus: a ConlluCorpus.
+        """
+        symbols = []
+        symbol_ids = {}
+
+        def intern(symbol):
+            symbol_id = symbol_ids.get(symbol)
+            if symbol_id is None:
+                symbol_id = len(symbols)
+                symbol_ids[symbol] = symbol_id
+                symbols.append(symbol)
+            return symbol_id
+
+        columns = {column: [] for column in cls.COLUMNS}
+        heads = []
+        sentence_offsets = [0]
+        edge_offsets = [0]
+        edge_heads = []
+        edge_labels = []
+        comments = []
+
+        for annotated_sentence in annotated_sentences:
+            if annotated_sentence.id_index is None:
+                annotated_sentence.build_index()
+
+            # skip ROOT
+            for token in annotated_sentence[1:]:
+                for column in cls.COLUMNS:
+                    columns[column].append(intern(str(getattr(token, column))))
+
+                head = str(token.head)
+                heads.append(int(head) if head.isdigit() else -1)
+
+                for enhanced_head, enhanced_label in token.deps_set:
+                    edge_heads.append(annotated_sentence.id_index[enhanced_head])
+                    edge_labels.append(intern(enhanced_label))
+                edge_offsets.append(len(edge_heads))
+
+            sentence_offsets.append(len(heads))
+            comments.append(annotated_sentence.comments)
+
+        columns = {column: np.array(values, dtype=np.int32) for column, values in columns.items()}
+
+        return cls(symbols,
+                   columns,
+                   np.array(heads, dtype=np.int32),
+                   np.array(sentence_offsets, dtype=np.int64),
+                   np.array(edge_offsets, dtype=np.int64),
+                   np.array(edge_heads, dtype=np.int32),
+                   np.array(edge_labels, dtype=np.int32),
+                   comments)
+
+    def to_sentences(self):
+        """
+        Converts the corpus back to annotated sentences.
+
+        Returns:
+            annotated_sentences: list of ConlluSentence objects, starting with the ROOT token,
+            with their ID index and children rebuilt.
+        """
+        # resolve every column to its strings in one vectorised lookup
+        symbols = np.array(self.symbols + ["0"], dtype=object)
+        conllu_ids, words, lemmas, upos, xpos, feats, deprels, misc = [symbols[self.columns[column]].tolist()
+                                                                       for column in self.COLUMNS]
+        heads = [str(head) if head >= 0 else "_" for head in self.heads.tolist()]
+        sentence_offsets = self.sentence_offsets.tolist()
+        edge_offsets = self.edge_offsets.tolist()
+        edge_labels = symbols[self.edge_labels].tolist()
+
+        # head positions are relative to the sentence, 0 being ROOT: map them to the row of the head
+        # token, and ROOT to the extra "0" symbol appended above
+        edge_rows = np.repeat(np.arange(self.num_tokens), np.diff(self.edge_offsets))
+        token_sentence_starts = np.repeat(self.sentence_offsets[:-1], np.diff(self.sentence_offsets))
+        head_rows = token_sentence_starts[edge_rows] + self.edge_heads - 1
+        head_symbols = np.where(self.edge_heads == 0, len(self.symbols), self.columns["conllu_id"][head_rows.clip(0)])
+        enhanced_heads = symbols[head_symbols].tolist()
+
+        root = get_root()
+        annotated_sentences = []
+
+        for sentence_index in range(len(self)):
+            start = sentence_offsets[sentence_index]
+            end = sentence_offsets[sentence_index + 1]
+
+            sentence = [root]
+            for row in range(start, end):
+                first_edge = edge_offsets[row]
+                last_edge = edge_offsets[row + 1]
+                deps_set = list(zip(enhanced_heads[first_edge:last_edge], edge_labels[first_edge:last_edge]))
+
+                token = ConlluToken(conllu_ids[row], words[row], lemmas[row], upos[row], xpos[row], feats[row],
+                                    heads[row], deprels[row], pack_deps(deps_set) if deps_set else "_", misc[row])
+                # the edges are already parsed, so there is no need to parse the DEPS column again
+                token.deps_set = deps_set
+                sentence.append(token)
+
+            sentence = ConlluSentence(sentence, self.comments[sentence_index])
+            sentence.build_index()
+            get_children(sentence)
+            annotated_sentences.append(sentence)
+
+        return annotated_sentences
+
+    def edge_tokens(self):
+        """Returns the token row of every enhanced edge."""
+        return np.repeat(np.arange(self.num_tokens), np.diff(self.edge_offsets))
+
+    def build_vocab(self, cutoff=1):
+        """
+        Vectorised equivalent of utils.buildVocab. Items are listed in the order they first occur in the corpus.
+
+        Arguments:
+            cutoff: minimum number of occurrences for an item to be part of the vocab.
+
+        Returns:
+            vocab: dictionary with the "feats", "deprels" and "edeprels" lists.
+        """
+
+        def count_symbols(symbol_ids):
+            """Returns the symbols occurring at least cutoff times, in order of first occurrence."""
+            symbols, counts = self._unique_in_order(symbol_ids)
+            return [symbol for symbol, count in zip(symbols, counts) if count >= cutoff]
+
+        words = count_symbols(self.columns["word"])
+        deprels = count_symbols(self.columns["deprel"])
+        edeprels = count_symbols(self.edge_labels)
+
+        # count each distinct FEATS column once and then split it into its k=v singletons
+        feat_counts = {}
+        for feats, count in zip(*self._unique_in_order(self.columns["feats"])):
+            if feats == "_":
+                continue
+            for feat_singleton in feats.split("|"):
+                feat_counts[feat_singleton] = feat_counts.get(feat_singleton, 0) + int(count)
+        feats = [feat for feat, count in feat_counts.items() if count >= cutoff]
+
+        print("Vocab containing {} words".format(len(words)))
+
+        print("Feats containing {} tags".format(len(feats)))
+        print("Deprels containing {} tags".format(len(deprels)))
+        print("EDeprels containing {} tags".format(len(edeprels)))
+
+        ret = {
+            "feats": feats,
+            "deprels": deprels,
+            "edeprels": edeprels,
+        }
+
+        return ret
+
+    def _unique_in_order(self, symbol_ids):
+        """Returns the distinct symbols in order of first occurrence and how often each occurs."""
+        unique, first_index, counts = np.unique(symbol_ids, return_index=True, return_counts=True)
+        order = np.argsort(first_index, kind="stable")
+        return [self.symbols[symbol_id] for symbol_id in unique[order]], counts[order]
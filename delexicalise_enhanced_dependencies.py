@@ -2,9 +2,12 @@ import sys
 import re
 import os.path
 from collections import Counter
+from itertools import islice
 
 from conllugraph import ConlluGraph
-from graph import stitch_edeps_items, unstitch_edeps_items
+from graph import ConlluSentence, stitch_edeps_items, unstitch_edeps_items
+from treebank_profile import TreebankProfile, profile_treebank
+from utils import VocabCounter, count_vocab_parallel, format_sentence, get_codec, iter_chunk, map_file_chunks, open_conll
 
 LONG_BASIC_LABELS = ["nmod:poss"]
 
@@ -15,10 +18,13 @@ Sample sentences:
 # text = Various mitigating actions have been and will be taken to provide focus, gain comfort over control levels and to provide assurance to senior management as to the accuracy of the Q1 DPR and business balance sheet.
 """
 
-def write_output_file(input_path, delexicalised_sentences, comment_lines):
+def write_output_file(input_path, delexicalised_sentences, compresslevel=None, formatted=False):
     """
     Takes an input path and the delexicalsed sentences and writes them to an output
-    file in CoNLL-U format.
+    file in CoNLL-U format. The sentences can be a lazy iterable, in which case
+    each sentence is written as soon as it has been delexicalised.
+    With formatted, they are already CoNLL-U text, e.g. whole chunks delexicalised by workers.
+    A .gz, .bz2 or .xz input is written out compressed with the same codec.
     """
 
     dirname = os.path.dirname(input_path)
@@ -33,13 +39,19 @@ def write_output_file(input_path, delexicalised_sentences, comment_lines):
 
     if not os.path.exists(output_path):
         print(f"Creating output path {output_path}")
-        os.makedirs(output_path)
+        # another process (e.g. of batch.py) may create it at the same time
+        os.makedirs(output_path, exist_ok=True)
 
     outfile = os.path.join(output_path, basename)
-    with open(outfile, 'w', encoding='utf-8') as fo:
-        for sentence_information, sent in zip(comment_lines.values(), delexicalised_sentences):
-            for line in sentence_information:
-                fo.write(line + "\n") 
+    # the input's codec, which is also detected from its first bytes when its name does not tell
+    with open_conll(outfile, 'w', compresslevel, codec=get_codec(input_path)) as fo:
+        for sent in delexicalised_sentences:
+            if formatted:
+                fo.write(sent)
+                continue
+
+            for line in sent.comments:
+                fo.write(line + "\n")
 
             for conllu_token in sent:
                 fo.write(str(conllu_token) + "\n")
@@ -47,11 +59,55 @@ def write_output_file(input_path, delexicalised_sentences, comment_lines):
             fo.write("\n")
 
 
+class DelexicalisationRules(object):
+    """
+    DelexicalisationRules
+
+    The rewrite rules of delexicalise_case_mark_cc, compiled once per run: the forbidden items
+    as a set, one compiled pattern per lexical item and the rewritten labels, which are memoised
+    as the same few labels are delexicalised over and over again.
+
+    Params:
+        forbidden_list: lexical items which are never delexicalised, see get_forbidden_from_vocab.
+        placeholders: the placeholder which replaces the lexical item for each type of modifier.
+    """
+    PLACEHOLDERS = {
+        "case": "<case_delex>",
+        "mark": "<mark_delex>",
+        "cc": "<cc_delex>",
+    }
+
+    def __init__(self, forbidden_list, placeholders=None):
+        self.forbidden = frozenset(forbidden_list)
+        self.placeholders = placeholders if placeholders else self.PLACEHOLDERS
+        self.patterns = {}
+        self.labels = {}
+
+    def get_pattern(self, lexical_item):
+        """Returns the compiled pattern matching the lexical item as a whole word."""
+        pattern = self.patterns.get(lexical_item)
+        if pattern is None:
+            pattern = self.patterns[lexical_item] = re.compile(r'\b' + lexical_item + r'\b')
+        return pattern
+
+    def delexicalise_label(self, enhanced_label, lexical_item, modifier):
+        """Replaces the lexical item in each part of the enhanced label with the modifier's placeholder."""
+        key = (enhanced_label, lexical_item, modifier)
+        delexicalised_label = self.labels.get(key)
+        if delexicalised_label is None:
+            pattern = self.get_pattern(lexical_item)
+            placeholder = self.placeholders[modifier]
+            parts = [pattern.sub(placeholder, part) for part in enhanced_label.split(":")]
+            delexicalised_label = self.labels[key] = ":".join(parts)
+        return delexicalised_label
+
+
 class DelexicaliseConllu(object):
     def __init__(self,
                 attach_morphological_case,
                 visualise,
                 forbidden_list,
+                reference=False,
                 ):
         """
         DelexicaliseConllu
@@ -59,36 +115,198 @@ class DelexicaliseConllu(object):
         Params:
             attach_morphological_case: whether to attach the "Case" attribute from the morphological features.
             visualise: print outputs
+            forbidden_list: lexical items which are never delexicalised.
+            reference: run the three separate delexicalisation passes instead of the fused one,
+            e.g. to check that both give the same output.
         """
         self.attach_morphological_case = attach_morphological_case
         self.visualise = visualise
         self.forbidden_list = forbidden_list
+        self.rules = DelexicalisationRules(forbidden_list)
+        self.reference = reference
 
         # Counters
         self.deprel_count = Counter()
         self.lexical_item_count = Counter()
         self.lexicalised_deprels_count = Counter()
 
+    def get_counts(self):
+        """Returns the counters, e.g. to send them back from a worker process."""
+
+        return self.deprel_count, self.lexical_item_count, self.lexicalised_deprels_count
+
+    def update_counts(self, counts):
+        """Adds the counters of another DelexicaliseConllu, e.g. the one which delexicalised the next chunk."""
+
+        deprel_count, lexical_item_count, lexicalised_deprels_count = counts
+        self.deprel_count.update(deprel_count)
+        self.lexical_item_count.update(lexical_item_count)
+        self.lexicalised_deprels_count.update(lexicalised_deprels_count)
+
     def delexicalise(self, annotated_sentences):
         """Perform various types of delexicalisation."""
 
-        output_delexicalised_sentences = []
+        output_delexicalised_sentences = list(self.iter_delexicalise(annotated_sentences))
+
+        return output_delexicalised_sentences, self.deprel_count, self.lexical_item_count, self.lexicalised_deprels_count
+
+    def iter_delexicalise(self, annotated_sentences):
+        """Lazily delexicalises the sentences, yielding each one (with its comments) as soon as it is done."""
 
         for annotated_sentence in annotated_sentences:
-        
+            if not self.reference:
+                delexicalised_sentence = self.delexicalise_fused(annotated_sentence)
+                yield ConlluSentence(delexicalised_sentence, annotated_sentence.comments)
+                continue
+
             # Delexicalise enhanced relations which involve 'case', 'mark' and 'cc' dependents.
             delexicalised_sentence, deprel_count, lexical_item_count, \
                 lexicalised_deprels_count = self.delexicalise_case_mark_cc(annotated_sentence)
             # We have delexicalised the labels where tokens have certain modifiers,
             # but we still need to make sure these are applied to conjs which do not have direct
             # modifiers, so they have to get their delexicalised label from the first conjunct.
-            delexicalised_sentence = self.propagate_first_conj_labels(delexicalised_sentence)
+            # The conj passes look up first conjuncts through the ID index of the full sentence and
+            # modify the tokens of the delexicalised sentence in place.
+            self.propagate_first_conj_labels(annotated_sentence)
             # Now propagate 'cc' modifier to all conjuncts
-            delexicalised_sentence = self.propagate_cc_modifier_in_conjs(delexicalised_sentence)
+            self.propagate_cc_modifier_in_conjs(annotated_sentence)
+
+            yield ConlluSentence(delexicalised_sentence, annotated_sentence.comments)
+
+    def iter_delexicalise_parallel(self, filename, workers):
+        """
+        Delexicalises the chunks of an (uncompressed) input file in a pool of worker processes, yielding
+        the CoNLL-U text of each chunk in file order. The counters of the chunks are added in the same
+        order, so the output and the counters are the same as for iter_delexicalise.
+        """
+
+        chunk_args = (self.attach_morphological_case, self.forbidden_list, self.reference)
+        for text, counts in map_file_chunks(delexicalise_chunk, filename, chunk_args, workers):
+            self.update_counts(counts)
+            yield text
+
+    def delexicalise_fused(self, annotated_sentence):
+        """
+        Fused version of delexicalise_case_mark_cc, propagate_first_conj_labels and propagate_cc_modifier_in_conjs,
+        which gives the same output. The tokens are walked once, delexicalising each token with its
+        case/mark/cc dependents, which are collected once per token. The two conj propagations then only
+        visit the conjunction groups of the sentence, following its conj relations in the same order as the
+        separate passes, as the 'cc' propagation has to see the outcome of the first conjunct propagation.
+        """
 
-            output_delexicalised_sentences.append(delexicalised_sentence)
+        delexicalised_sentence = []
+        placeholders = self.rules.placeholders
 
-        return output_delexicalised_sentences, deprel_count, lexical_item_count, lexicalised_deprels_count
+        # Operate on each token apart from ROOT
+        for token in annotated_sentence[1:]:
+            edeps = token.deps_set
+            deps_modified = False
+            modifiers = None
+            for i, edep in enumerate(edeps):
+                enhanced_head = edep[0]
+                enhanced_label = edep[1]
+
+                # only labels with more than one part can be lexicalised
+                lexical_item = self.get_lexical_item(token, enhanced_label) if ":" in enhanced_label else None
+                if lexical_item is not None:
+                    if modifiers is None:
+                        # the dependents attached to the token itself, which relexicalisation looks up
+                        # with get_relation_children, in sentence order
+                        token_id = str(token.conllu_id)
+                        modifiers = [token_child_edep[1] for token_child in token.children
+                                     for token_child_edep in token_child.deps_set
+                                     if token_child_edep[1] in placeholders and token_child_edep[0] == token_id]
+                    for modifier in modifiers:
+                        delexicalised_label = self.delexicalise_modifier(enhanced_label, lexical_item, modifier)
+                        if delexicalised_label is not None:
+                            enhanced_label = delexicalised_label
+                            edeps[i] = (enhanced_head, enhanced_label)
+                            deps_modified = True
+
+            # update token deps, only marking the tokens whose deps were changed as modified
+            if deps_modified:
+                token.deps_set = edeps
+            delexicalised_sentence.append(token)
+
+        conj_edges = annotated_sentence.get_conj_edges()
+        if conj_edges:
+            self.propagate_first_conj_labels_fused(conj_edges)
+            self.propagate_cc_modifier_in_conjs_fused(conj_edges)
+
+        return delexicalised_sentence
+
+    def propagate_first_conj_labels_fused(self, conj_edges):
+        """propagate_first_conj_labels over the conjunction groups of a sentence, see delexicalise_fused."""
+
+        visited_conjuncts = set()
+        propagated = set()
+
+        for conjunct, group in conj_edges:
+            # all the children of a first conjunct have been visited once it has propagated its label
+            if group in propagated:
+                continue
+            first_conjunct_token = group.first_conjunct
+
+            # the children are only compared with the first lexicalised label of the first conjunct
+            # and are not visited again for the others
+            fct_edep = group.get_shared_edep()
+            if fct_edep is None:
+                continue
+            propagated.add(group)
+            fct_head = fct_edep[0]
+            fct_label_prefix = fct_edep[1].split(":")[:-1]
+
+            for fct_child in first_conjunct_token.children:
+                if fct_child.conllu_id not in visited_conjuncts:
+                    fct_child_edeps = fct_child.deps_set
+                    for i, edep in enumerate(fct_child_edeps):
+                        # if the shortened edep has the same label as the first conjunct, take its delexicalised label.
+                        if edep[0] == fct_head and edep[1].split(":")[:-1] == fct_label_prefix:
+                            fct_child_edeps[i] = fct_edep
+
+                    fct_child.deps_set = fct_child_edeps
+                    visited_conjuncts.add(fct_child.conllu_id)
+                    self.deprel_count["first delexicalised conjunct propagated"] += 1
+
+    def propagate_cc_modifier_in_conjs_fused(self, conj_edges):
+        """propagate_cc_modifier_in_conjs over the conjunction groups of a sentence, see delexicalise_fused."""
+
+        visited_conjuncts = set()
+        # children of each first conjunct which have a grandchild with a 'cc' relation
+        cc_conjuncts = {}
+        cc_placeholder = self.rules.placeholders["cc"]
+
+        seen_cc_modifier = False
+
+        for conjunct, group in conj_edges:
+            first_conjunct_token = group.first_conjunct
+
+            conjuncts = cc_conjuncts.get(group)
+            if conjuncts is None:
+                conjuncts = cc_conjuncts[group] = [
+                    fct_child for fct_child in first_conjunct_token.children
+                    if any(edep[1] == "cc" for fct_grandchild in fct_child.children for edep in fct_grandchild.deps_set)]
+
+            # 1) Find the label the 'cc' modifier has been delexicalised in.
+            for fct_child in conjuncts:
+                for edep in fct_child.deps_set:
+                    if cc_placeholder in edep[1]:
+                        cc_to_propagate = edep[1]
+                        seen_cc_modifier = True
+
+            # 2) Now that we have found a cc modifier, traverse the conj chain and use that label.
+            if seen_cc_modifier:
+                for fct_child in first_conjunct_token.children:
+                    if fct_child.conllu_id not in visited_conjuncts:
+                        fct_child_edeps = fct_child.deps_set
+                        for i, edep in enumerate(fct_child_edeps):
+                            edep_parts = edep[1].split(":")
+                            if edep_parts[0] == "conj" and cc_placeholder not in edep_parts:
+                                fct_child_edeps[i] = (edep[0], cc_to_propagate)
+
+                        fct_child.deps_set = fct_child_edeps
+                        visited_conjuncts.add(fct_child.conllu_id)
+                        self.deprel_count["last delexicalised conjunct propagated"] += 1
 
     def delexicalise_case_mark_cc(self, annotated_sentence):
         """
@@ -101,119 +319,111 @@ class DelexicaliseConllu(object):
 
         delexicalised_sentence = []
 
-        
         # Operate on each token apart from ROOT
         for token in annotated_sentence[1:]:
-            
             edeps = token.deps_set
+            deps_modified = False
             for i, edep in enumerate(edeps):
                 enhanced_head = edep[0]
                 enhanced_label = edep[1]
 
-                # Likely a lexicalised head (+1 for morph case langs)
-                if self.attach_morphological_case:
-                    TARGET_LEN = 3
-                else:
-                    TARGET_LEN = 2
-
-                if len(enhanced_label.split(":")) >= TARGET_LEN:
-                    lexical_index = None
-                    if self.attach_morphological_case:
-                        # for certain languages, the morphological case is attached to certain dependency labels,
-                        # it is not always attached, but it seems to be attached in most cases when the information is present in the morph feats column.
-                        if token.feats_set != None:
-                            if "Case" in token.feats_set:
-                                # no case information is attached for advcl labels
-                                if enhanced_label.split(":")[0] == "advcl":
-                                    lexical_item = enhanced_label.split(":")[-1]
-                                    
-                                # no case info on acl:relcl labels in ar_padt
-                                elif ":".join([enhanced_label.split(":")[0], enhanced_label.split(":")[1]]) == "acl:relcl": 
-                                    lexical_item = enhanced_label.split(":")[-1]
-                                    
-                                else:
-                                    lexical_item = enhanced_label.split(":")[-2]
-                                    
-                            else:
-                                # the morphological case feature is not present, so the lemma will be at the last index.
-                                lexical_item = enhanced_label.split(":")[-1]
-                                
-                        else:
-                            lexical_item = enhanced_label.split(":")[-1]
-                            
+                lexical_item = self.get_lexical_item(token, enhanced_label)
+                if lexical_item is None:
+                    continue
+
+                # Look at the token's children and see if they are attached to it with modifiers which involve attaching a lemma.
+                for token_child in token.children:
+                    token_child_edeps = token_child.deps_set
+                    for token_child_edep in token_child_edeps:
+                        if token_child_edep[0] != str(token.conllu_id):
+                            continue
+                        token_child_enhanced_label = token_child_edep[1]
+
+                        delexicalised_label = self.delexicalise_modifier(enhanced_label, lexical_item, token_child_enhanced_label)
+                        if delexicalised_label is not None:
+                            enhanced_label = delexicalised_label
+                            edeps[i] = (enhanced_head, enhanced_label)
+                            deps_modified = True
+
+            # update token deps, only marking the tokens whose deps were changed as modified
+            if deps_modified:
+                token.deps_set = edeps
+            delexicalised_sentence.append(token)
+
+        return delexicalised_sentence, self.deprel_count, self.lexical_item_count, self.lexicalised_deprels_count
+
+    def get_lexical_item(self, token, enhanced_label):
+        """Returns the lexical item of an enhanced label, or None if the label is not lexicalised."""
+
+        # Likely a lexicalised head (+1 for morph case langs)
+        if self.attach_morphological_case:
+            TARGET_LEN = 3
+        else:
+            TARGET_LEN = 2
+
+        label_parts = enhanced_label.split(":")
+        if len(label_parts) < TARGET_LEN:
+            return None
+
+        if self.attach_morphological_case:
+            # for certain languages, the morphological case is attached to certain dependency labels,
+            # it is not always attached, but it seems to be attached in most cases when the information is present in the morph feats column.
+            if token.feats_set != None:
+                if "Case" in token.feats_set:
+                    # no case information is attached for advcl labels
+                    if label_parts[0] == "advcl":
+                        lexical_item = label_parts[-1]
+
+                    # no case info on acl:relcl labels in ar_padt
+                    elif label_parts[0] == "acl" and label_parts[1] == "relcl":
+                        lexical_item = label_parts[-1]
+
                     else:
-                        lexical_item = enhanced_label.split(":")[-1]
+                        lexical_item = label_parts[-2]
 
-                    if lexical_item in self.forbidden_list:
-                        continue
+                else:
+                    # the morphological case feature is not present, so the lemma will be at the last index.
+                    lexical_item = label_parts[-1]
 
-                    # Not allowed in EUD label
-                    if "-" in lexical_item:
-                        h = lexical_item.split("-")[0]
-                        t = lexical_item.split("-")[1]
-                        lexical_item = f"{h}{t}"
-
-                    # Look at the token's children and see if they have modifiers which involve attaching a lemma.
-                    for token_child in token.children:
-                        token_child_edeps = token_child.deps_set
-                        for token_child_edep in token_child_edeps:
-                            token_child_enhanced_label = token_child_edep[1]
-
-                            # 1) Token has a "case" dependent
-                            if token_child_enhanced_label == "case":
-                                if enhanced_label.split(":")[0] != "conj":
-
-                                    # replace parts
-                                    parts = enhanced_label.split(":")
-                                    for j, part in enumerate(parts):
-                                        delex_part = re.sub(r'\b' + lexical_item + r'\b', "<case_delex>", part)
-                                        parts[j] = delex_part
-                                    enhanced_label = ":".join(parts)
-                                    delexicalised_edep = (enhanced_head, enhanced_label)
-
-                                    edeps[i] = delexicalised_edep
-                                    # update counters
-                                    self.deprel_count.update(["case delexicalised"])
-                                    self.lexical_item_count.update([lexical_item])
-
-                            # 2) Token has a "mark" dependent
-                            elif token_child_enhanced_label == "mark":
-                                if enhanced_label.split(":")[0] != "conj":
-                                    
-                                    parts = enhanced_label.split(":")
-                                    for j, part in enumerate(parts):
-                                        delex_part = re.sub(r'\b' + lexical_item + r'\b', "<mark_delex>", part)
-                                        parts[j] = delex_part
-                                    enhanced_label = ":".join(parts)
-                                    delexicalised_edep = (enhanced_head, enhanced_label)
-                                    
-                                    edeps[i] = delexicalised_edep
-                                    # update counters
-                                    self.deprel_count.update(["mark delexicalised"])
-                                    self.lexical_item_count.update([lexical_item])
-
-                            # 3) Token has a "cc" dependent but only append the lemma if the edep is "conj"
-                            elif token_child_enhanced_label == "cc":
-                                if enhanced_label.split(":")[0] == "conj":
-                                    
-                                    parts = enhanced_label.split(":")
-                                    for j, part in enumerate(parts):
-                                        delex_part = re.sub(r'\b' + lexical_item + r'\b', "<cc_delex>", part)
-                                        parts[j] = delex_part
-                                    enhanced_label = ":".join(parts)
-                                    delexicalised_edep = (enhanced_head, enhanced_label)
-
-                                    edeps[i] = delexicalised_edep
-                                    # update counters
-                                    self.deprel_count.update(["cc delexicalised"])
-                                    self.lexical_item_count.update([lexical_item])
+            else:
+                lexical_item = label_parts[-1]
 
-            # update token deps
-            token.deps_set = edeps
-            delexicalised_sentence.append(token)
+        else:
+            lexical_item = label_parts[-1]
 
-        return delexicalised_sentence, self.deprel_count, self.lexical_item_count, self.lexicalised_deprels_count
+        if lexical_item in self.rules.forbidden:
+            return None
 
+        # Not allowed in EUD label
+        if "-" in lexical_item:
+            h = lexical_item.split("-")[0]
+            t = lexical_item.split("-")[1]
+            lexical_item = f"{h}{t}"
+
+        return lexical_item
+
+    def delexicalise_modifier(self, enhanced_label, lexical_item, modifier):
+        """
+        Returns the enhanced label delexicalised for a dependent with the given label, or None if
+        the dependent is not a modifier of the enhanced relation:
+            1) a "case" or 2) a "mark" dependent of a relation which is not "conj",
+            3) a "cc" dependent, but only of a "conj" relation.
+        """
+
+        if modifier == "case" or modifier == "mark":
+            if enhanced_label.split(":")[0] == "conj":
+                return None
+        elif modifier == "cc":
+            if enhanced_label.split(":")[0] != "conj":
+                return None
+        else:
+            return None
+
+        # update counters
+        self.deprel_count[f"{modifier} delexicalised"] += 1
+        self.lexical_item_count[lexical_item] += 1
+
+        return self.rules.delexicalise_label(enhanced_label, lexical_item, modifier)
 
     def propagate_first_conj_labels(self, annotated_sentence):
         """
@@ -236,10 +446,8 @@ class DelexicaliseConllu(object):
                 if base_relation == "conj":
                     first_conjunct_index = enhanced_head
                     # As EUD sentences may contain elided tokens, e.g. 5.1, we can't directly access
-                    # the token from the head ID, so we search for matching conllu_ids instead 
-                    for target_index, target_token in enumerate(annotated_sentence):
-                        if target_token.conllu_id == first_conjunct_index:
-                            first_conjunct_token = annotated_sentence[int(target_index)]
+                    # the token from the head ID, so we look it up in the sentence's ID index instead
+                    first_conjunct_token = annotated_sentence.get_token(first_conjunct_index)
 
 
                     fct_children = first_conjunct_token.children
@@ -308,10 +516,8 @@ class DelexicaliseConllu(object):
                     first_conjunct_index = enhanced_head
 
                     # As EUD sentences may contain elided tokens, e.g. 5.1, we can't directly access
-                    # the token from the head ID, so we search for matching conllu_ids instead
-                    for target_index, target_token in enumerate(annotated_sentence):
-                        if target_token.conllu_id == first_conjunct_index:
-                            first_conjunct_token = annotated_sentence[int(target_index)]
+                    # the token from the head ID, so we look it up in the sentence's ID index instead
+                    first_conjunct_token = annotated_sentence.get_token(first_conjunct_index)
 
                     fct_children = first_conjunct_token.children
                     # 1) Search through all of the grandchildren of the FCT and see which one the 'cc' modifier is attached to
@@ -364,6 +570,21 @@ class DelexicaliseConllu(object):
         return delexicalised_sentence
 
 
+def delexicalise_chunk(filename, start, end, attach_morphological_case, forbidden_list, reference=False):
+    """
+    Delexicalises the sentences in a byte range of the input, e.g. in a worker process.
+
+    Returns:
+        text: the delexicalised sentences as CoNLL-U text.
+        counts: the counters of the chunk, see DelexicaliseConllu.get_counts.
+    """
+
+    delexicalise_conllu = DelexicaliseConllu(attach_morphological_case, False, forbidden_list, reference)
+    sentences = delexicalise_conllu.iter_delexicalise(iter_chunk(filename, start, end))
+    text = "".join(format_sentence(sent) for sent in sentences)
+
+    return text, delexicalise_conllu.get_counts()
+
 def check_edeps_for_morph_case(annotated_sentences):
     """Scan through token's edeps items and check if the label matches the morphological features Case information.
         If we reach a certain number of matches, we will return True for the attach_morphological_case flag."""
@@ -371,7 +592,7 @@ def check_edeps_for_morph_case(annotated_sentences):
     attach_morphological_case = False
     hits = 0
 
-    for sentence in annotated_sentences[:1000]:
+    for sentence in islice(annotated_sentences, 1000):
         for token in sentence[1:]:
             edeps = token.deps_set
             for i, edep in enumerate(edeps):
@@ -395,44 +616,6 @@ def check_edeps_for_morph_case(annotated_sentences):
     
     return attach_morphological_case
 
-def get_forbidden_from_vocab(vocab):
-    """Adds deprels/edeprels/and case feats to forbidden list."""
-
-    # counts will just be 1 as we are taking information from a final vocabulary.
-    featForbidden = Counter()
-    deprelForbidden = Counter()
-    edeprelForbidden = Counter()
-
-    feats = vocab["feats"]
-    for mf in feats:
-        k, v = mf.split("=")
-        if k == "Case":
-            case_info = v.lower()
-            featForbidden.update([case_info])
-
-    for deprel in vocab["deprels"]:
-        deprelForbidden.update([deprel])
-        #split on deprel for uncommon parts.
-        if len(deprel.split(":")) == 2:
-            short = deprel.split(":")[0]
-            long = deprel.split(":")[1]
-            deprelForbidden.update([short])
-            deprelForbidden.update([long])
-
-    for edeprel in vocab["edeprels"]:
-        first = edeprel.split(":")[0]
-        edeprelForbidden.update([first])
-    
-    forbidden = featForbidden + deprelForbidden + edeprelForbidden
-    
-    extras = ["obl", "arg", "pass", "poss", "xsubj", "mod", "tmod", "prt", "agent", "relcl", "relobj", "alias"]
-
-    forbidden_list = list(forbidden.keys()) + extras
-
-    print(f"Not delexicalising the following words: {forbidden_list}")
-
-    return forbidden_list
-
 def argparser():
     from argparse import ArgumentParser
     ap = ArgumentParser()
@@ -448,6 +631,20 @@ def argparser():
     help='Write statistics.')
     ap.add_argument('-q', '--quiet', default=False, action='store_true',
     help='Do not display certain helper information.')
+    ap.add_argument('--reference', default=False, action='store_true',
+    help='Run the separate reference delexicalisation passes instead of the fused one.')
+    ap.add_argument('--vocab', metavar='FILE', type=str, default=None,
+    help='Vocab counts of the input: loaded if the file exists, otherwise counted and saved there.')
+    ap.add_argument('--vocab-cutoff', type=int, default=1,
+    help='Minimum number of occurrences for a feature or label to be part of the vocab.')
+    ap.add_argument('--compress-level', type=int, default=None,
+    help='Compression level for .gz, .bz2 and .xz outputs.')
+    ap.add_argument('--cache-dir', type=str, default=None,
+    help='Directory for caching parsed input files between runs.')
+    ap.add_argument('--parse-workers', type=int, default=1,
+    help='Number of processes used to parse the input files.')
+    ap.add_argument('--workers', type=int, default=1,
+    help='Number of processes which delexicalise chunks of the input.')
     return ap
 
 def main(argv):
@@ -458,26 +655,63 @@ def main(argv):
 
     if args.input:
         base_input = os.path.basename(args.input)
-        input_annotated_sentences, vocab, comment_lines = conllu_graph.build_dataset(args.input)
-        input_sentence_edges = conllu_graph.build_edges(input_annotated_sentences)
-
-        # automatically check whether to attach morphological case.
-        attach_morphological_case = check_edeps_for_morph_case(input_annotated_sentences)
 
-        # get forbidden items from vocab.
-        forbidden_list = get_forbidden_from_vocab(vocab)
-
-        delexicalise_conllu = DelexicaliseConllu(attach_morphological_case, args.visualise, forbidden_list)
-        output_delexicalised_sentences, deprel_count, lexical_item_count, lexicalised_deprels_count = delexicalise_conllu.delexicalise(input_annotated_sentences)
+        # The vocab and the morphological case check need to see the input before anything
+        # can be delexicalised. Unless the vocab is stored or cached, they are taken from the
+        # treebank profile, which is computed with a cheap column-only scan of the file and
+        # stored next to it, so later runs on the same file do not scan it again.
+        profile = None
+        vocab_counter = None
+        attach_morphological_case = None
+        if args.vocab and os.path.exists(args.vocab):
+            print(f"Loading vocab from {args.vocab}")
+            vocab = VocabCounter.load(args.vocab).build(args.vocab_cutoff)
+        elif args.cache_dir and not args.vocab:
+            # imported here so numpy is only needed when caching
+            from cache import load_corpus
+            corpus, vocab = load_corpus(args.input, args.cache_dir)
+            if args.vocab_cutoff != 1:
+                vocab = corpus.build_vocab(args.vocab_cutoff)
+        elif args.parse_workers > 1:
+            vocab_counter = count_vocab_parallel(args.input, workers=args.parse_workers)
+        elif args.vocab:
+            vocab_counter, attach_morphological_case = profile_treebank(args.input)
+        else:
+            profile = TreebankProfile.load(args.input, args.vocab_cutoff)
+
+        if vocab_counter is not None:
+            if args.vocab:
+                vocab_counter.save(args.vocab)
+            vocab = vocab_counter.build(args.vocab_cutoff)
+
+        if profile is None:
+            # automatically check whether to attach morphological case.
+            if attach_morphological_case is None:
+                attach_morphological_case = check_edeps_for_morph_case(conllu_graph.stream_dataset(args.input))
+            # get forbidden items from vocab.
+            profile = TreebankProfile.from_vocab(vocab, attach_morphological_case, vocab_cutoff=args.vocab_cutoff)
+
+        # Delexicalise and write out one sentence at a time, so only the current sentence is held
+        # in memory and the output is written while the input is still being read.
+        delexicalise_conllu = DelexicaliseConllu(profile.attach_morphological_case, args.visualise, profile.forbidden_list, args.reference)
+        parallel = args.workers > 1
+        if parallel and get_codec(args.input):
+            # compressed files can't be split into byte ranges
+            print(f"{args.input} is compressed, delexicalising it in a single process")
+            parallel = False
+        if parallel:
+            output_chunks = delexicalise_conllu.iter_delexicalise_parallel(args.input, args.workers)
+            write_output_file(args.input, output_chunks, args.compress_level, formatted=True)
+        else:
+            output_delexicalised_sentences = delexicalise_conllu.iter_delexicalise(conllu_graph.stream_dataset(args.input))
+            write_output_file(args.input, output_delexicalised_sentences, args.compress_level)
 
         removed = 0
-        for k, v in lexical_item_count.items():
+        for k, v in delexicalise_conllu.lexical_item_count.items():
             print(f"removed {k}, count: {v}")
             removed += 1
         print(f"total: {removed}")
 
-        write_output_file(args.input, output_delexicalised_sentences, comment_lines)
-
         # print(deprel_count)
         # print(lexical_item_count)
         # print(lexicalised_deprels_count)
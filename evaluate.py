@@ -1,6 +1,8 @@
 from collections import Counter
 from conllugraph import ConlluGraph
+from graph import is_conj_label
 import logging
+import numpy as np
 
 logging.basicConfig(format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
                     level=logging.INFO)
@@ -19,6 +21,7 @@ class EvaluateConllu(object):
         self.deprel_count = Counter()
         self.modifier_lemmas = Counter()
         self.morph_case = Counter()
+        self.conj_lemmas = Counter()
 
         # Boolean flags
         self.evaluate_edges = evaluate_edges
@@ -40,6 +43,7 @@ class EvaluateConllu(object):
             # evaluate certain labels
             if self.evaluate_labels:
                 self.deprel_count, self.modifier_lemmas, self.morph_case = self.evaluate_deprels(sentence_graph, annotated_sentence)
+                self.conj_lemmas = self.evaluate_conj(annotated_sentence)
 
 
 
@@ -49,7 +53,7 @@ class EvaluateConllu(object):
     def evaluate_heads(self, sentence_graph, annotated_sentence):
         """ """
         for token_id, edge in sentence_graph.items():
-            token = annotated_sentence[int(token_id)]
+            token = annotated_sentence.get_token(token_id)
             
             # skip ROOT
             if token.head != -1:
@@ -66,13 +70,28 @@ class EvaluateConllu(object):
         return self.edge_count, self.dummy_root_count
 
 
+    def evaluate_corpus_heads(self, corpus):
+        """ Vectorised equivalent of evaluate_heads over a whole ConlluCorpus. """
+
+        num_deps = np.diff(corpus.edge_offsets)
+        edge_tokens = corpus.edge_tokens()
+
+        # only consider extra dummy root edges (assumes the parser only chose one edge when choosing the real root)
+        dummy_root_edges = (corpus.edge_heads == 0) \
+                            & (corpus.edge_labels == corpus.symbol_id("root")) \
+                            & (num_deps[edge_tokens] > 1)
+
+        self.edge_count += int(num_deps.sum())
+        self.dummy_root_count += int(dummy_root_edges.sum())
+
+        return self.edge_count, self.dummy_root_count
 
 
     def evaluate_deprels(self, sentence_graph, annotated_sentence):
         """ Evaluates certain dependency labels, e.g. case, mark etc. """
         
         for token_id, edge in sentence_graph.items():
-            token = annotated_sentence[int(token_id)]
+            token = annotated_sentence.get_token(token_id)
             edge = edge.pop()
             # (m, h, r)
             deprel = str(edge[-1])
@@ -162,6 +181,29 @@ class EvaluateConllu(object):
         return self.deprel_count, self.modifier_lemmas, self.morph_case 
 
 
+    def evaluate_conj(self, annotated_sentence):
+        """ Evaluates conj labels to see if the lemma of the cc modifier of a conjunction
+        group is attached in the enhanced deprels of its conjuncts. """
+
+        for group in annotated_sentence.get_conj_groups():
+            cc_lemma = group.cc_lemma
+            first_conjunct_id = str(group.first_conjunct.conllu_id)
+
+            for conjunct in group.conjuncts:
+                if cc_lemma is None:
+                    self.conj_lemmas.update(["ignored no cc"])
+                    continue
+
+                conj_labels = [enhanced_label for enhanced_head, enhanced_label in conjunct.deps_set
+                               if enhanced_head == first_conjunct_id and is_conj_label(enhanced_label)]
+                if any(conj_label.split(":")[-1] == cc_lemma.lower() for conj_label in conj_labels):
+                    self.conj_lemmas.update(["cc_attached"])
+                else:
+                    self.conj_lemmas.update(["cc missed"])
+
+        return self.conj_lemmas
+
+
     def evaluate_mark(self, token, sentence_graph, annotated_sentence, deprel):
         """ Evaluates mark labels to see if the grandchild lemma is 
         attached in the enhanced deprel of its parent. """
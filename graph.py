@@ -2,9 +2,26 @@
 # https://github.com/ftyers/ud-scripts/blob/e6d2771719c479b3be6e7a884a128def46d4b987/conllu-lift.py
 
 import re
-import numpy as np
+import sys
+from operator import attrgetter
 
 
+class SymbolTable(dict):
+    """
+    SymbolTable
+
+    Interns the strings of a corpus, so that every repeated label, lemma or tag is stored once
+    and shared by all the tokens it occurs in. The first occurrence of a string is also passed
+    through sys.intern, so it is the same object as the identical string literals in the code,
+    which makes comparisons like label == "case" identity checks.
+    """
+
+    def intern(self, string):
+        symbol = self.get(string)
+        if symbol is None:
+            symbol = self[string] = sys.intern(string)
+        return symbol
+
 
 def parse_features(features):
     """
@@ -29,12 +46,13 @@ def parse_features(features):
     return features_dict
 
 
-def parse_deps(deps):
+def parse_deps(deps, symbols=None):
     """
     Parses the token's deps features.
 
     Arguments:
         deps: the unprocessed deps features.
+        symbols: optional SymbolTable to intern the heads and labels in.
     
     Returns:
         parsed_deps: a list of tuples of parsed edeps for each token:
@@ -45,11 +63,11 @@ def parse_deps(deps):
     for edep in deps.split("|"):
         if edep == "_" or not edep:
             continue
-        parts = edep.split(":")
-        enhanced_head = parts[0]
-        remaining_label = parts[1:]
-        # stitch the remaining parts together again
-        enhanced_deprel = ":".join(remaining_label)
+        # the label is everything after the first colon, e.g. obl:in
+        enhanced_head, _, enhanced_deprel = edep.partition(":")
+        if symbols is not None:
+            enhanced_head = symbols.intern(enhanced_head)
+            enhanced_deprel = symbols.intern(enhanced_deprel)
         parsed_edep = (enhanced_head, enhanced_deprel)
         parsed_deps.append(parsed_edep)
 
@@ -86,12 +104,35 @@ def unstitch_edeps_items(edep):
     return edep
 
 
+class Unparsed(object):
+    """Marks a FEATS or DEPS column which has not been parsed yet."""
+
+    def __reduce__(self):
+        # unpickles as the module-level UNPARSED, so identity checks keep working across processes
+        return "UNPARSED"
+
+    def __repr__(self):
+        return "UNPARSED"
+
+
+UNPARSED = Unparsed()
+
+
 class ConlluToken:
     """
     ConlluToken
 
-    Store each CoNLL-U attribute per token.
+    Store each CoNLL-U attribute per token. The FEATS and DEPS columns are only
+    parsed into feats_set and deps_set the first time they are accessed.
+
+    Tokens read from a file keep their original line, which is written out as is unless
+    the token is dirty, i.e. its deps_set or misc have been set since it was read. Code that
+    modifies deps_set in place has to assign it back (or set dirty) for the change to be written.
     """
+    __slots__ = ("conllu_id", "word", "lemma", "upos", "xpos",
+                "feats", "_feats_set", "head", "deprel", "deps", "_deps_set", "_misc",
+                "children", "children_by_relation", "process_deps", "raw", "dirty")
+
     def __init__(self,
                 conllu_id = None,
                 word = None,
@@ -104,7 +145,8 @@ class ConlluToken:
                 deps = None,
                 misc = None,
                 children = None,
-                process_deps = False):
+                process_deps = False,
+                raw = None):
         
         self.conllu_id = conllu_id
         self.word = word
@@ -112,19 +154,63 @@ class ConlluToken:
         self.upos = upos if upos else "_"
         self.xpos = xpos if xpos else "_"
         self.feats = feats if feats else "_"
-        self.feats_set = parse_features(self.feats)
+        self._feats_set = UNPARSED
         self.head = head if head else "_"
         self.deprel = deprel if deprel else "_"
         self.deps = deps if deps else "_"
-        self.deps_set = parse_deps(self.deps)    
-        self.misc = misc if misc else "_"
+        self._deps_set = UNPARSED
+        self._misc = misc if misc else "_"
 
-        # dependents of the current word
-        self.children = set()
+        # dependents of the current word, in sentence order, and the same dependents grouped
+        # by their enhanced relation to the word (None until the word has dependents)
+        self.children = []
+        self.children_by_relation = None
         
         # do some form of processing on deps, if so write out the altered deps items
         self.process_deps = process_deps
 
+        # the original line of the token and whether it has been modified since
+        self.raw = raw
+        self.dirty = False
+
+    def get_relation_children(self, relation):
+        """Returns the dependents attached to the token with the given enhanced relation, in sentence order."""
+
+        if self.children_by_relation is None:
+            return ()
+        return self.children_by_relation.get(relation, ())
+
+    @property
+    def feats_set(self):
+        """The parsed morphological features, see parse_features."""
+        if self._feats_set is UNPARSED:
+            self._feats_set = parse_features(self.feats)
+        return self._feats_set
+
+    @feats_set.setter
+    def feats_set(self, feats_set):
+        self._feats_set = feats_set
+
+    @property
+    def deps_set(self):
+        """The parsed enhanced dependencies, see parse_deps."""
+        if self._deps_set is UNPARSED:
+            self._deps_set = parse_deps(self.deps)
+        return self._deps_set
+
+    @deps_set.setter
+    def deps_set(self, deps_set):
+        self._deps_set = deps_set
+        self.dirty = True
+
+    @property
+    def misc(self):
+        return self._misc
+
+    @misc.setter
+    def misc(self, misc):
+        self._misc = misc
+        self.dirty = True
 
     def cleaned(self):
         return ConlluToken(self.word, "_")
@@ -134,11 +220,19 @@ class ConlluToken:
 
     def __str__(self):
 
+        if self.raw is not None and not self.dirty:
+            return self.raw
+
+        # unparsed deps can't have been modified, so the original column is written out as is
+        if self._deps_set is UNPARSED:
+            deps = self.deps
+        else:
+            deps = pack_deps(self._deps_set) if len(self._deps_set) >=1 else "_"
 
         conllu_row = [str(self.conllu_id), self.word, self.lemma, \
                     self.upos, self.xpos, self.feats, \
                     str(self.head), self.deprel, \
-                    pack_deps(self.deps_set) if len(self.deps_set) >=1 else "_", \
+                    deps, \
                     self.misc]
         return '\t'.join(['_' if item is None else item for item in conllu_row])
 
@@ -146,3 +240,179 @@ class ConlluToken:
         #return "{}_{}_{}|||{}".format(self.word, self.deprel, self.head, self.deps)
         return self.word
 
+
+class ConjGroup(object):
+    """
+    ConjGroup
+
+    A conjunction group: the first conjunct, the conjuncts which are attached to it with a
+    conj relation, in sentence order, and the tokens with a cc relation to any of them.
+    """
+    def __init__(self, first_conjunct):
+        self.first_conjunct = first_conjunct
+        self.conjuncts = []
+        self.cc_tokens = []
+
+    @property
+    def cc_lemma(self):
+        """The lemma of the (last) coordinating conjunction, e.g. "and" in "apples, bananas and oranges"."""
+        return self.cc_tokens[-1].lemma if self.cc_tokens else None
+
+    def get_shared_edep(self):
+        """The first lexicalised enhanced relation of the first conjunct, which its conjuncts share, or None."""
+        for edep in self.first_conjunct.deps_set:
+            if ":" in edep[1]:
+                return edep
+        return None
+
+    def __repr__(self):
+        return f"{self.first_conjunct!r}: {self.conjuncts!r} ({self.cc_lemma})"
+
+
+def is_conj_label(enhanced_label):
+    """Whether the base relation of an enhanced label is conj, e.g. conj or conj:and."""
+    return enhanced_label == "conj" or enhanced_label.startswith("conj:")
+
+
+class ConlluSentence(list):
+    """
+    ConlluSentence
+
+    A list of ConlluToken objects (the first one being the dummy ROOT token)
+    which also carries the comment lines that precede the sentence and an index
+    from CoNLL-U IDs to token positions. The reader builds the index at parse time,
+    other sentences build it on the first lookup. The conjunction groups of the
+    sentence are likewise built on first use.
+    """
+    def __init__(self, tokens=(), comments=None):
+        super().__init__(tokens)
+        self.comments = comments if comments else []
+        self.id_index = None
+        self.conj_groups = None
+        self.conj_edges = None
+
+    def build_index(self):
+        """
+        Maps every CoNLL-U ID in the sentence to its position. This includes the ROOT ("0"),
+        empty nodes, e.g. 5.1, and multi-word token ranges, e.g. 3-4.
+        """
+        self.id_index = {str(token.conllu_id): position for position, token in enumerate(self)}
+
+    def get_token(self, conllu_id):
+        """Returns the token with the given CoNLL-U ID."""
+        if self.id_index is None:
+            self.build_index()
+        return self[self.id_index[str(conllu_id)]]
+
+
+    def build_children(self):
+        """
+        Links each token (apart from ROOT) to the tokens it is an enhanced head of, both in sentence
+        order and grouped by the enhanced relation. Links from an earlier build are replaced.
+        """
+        for word in self:
+            if word.children:
+                word.children = []
+                word.children_by_relation = None
+
+        # skip ROOT
+        for word in self[1:]:
+            parent_deps = word.deps_set
+
+            for parent, relation in parent_deps:
+                # skip ROOT
+                if parent != "0":
+                    # As EUD sentences may contain elided tokens, e.g. 5.1, we can't directly access
+                    # the token from the head ID, so we look it up in the sentence's ID index instead
+                    parent_token = self.get_token(parent)
+                    # a word attached to the same head more than once is listed once, and as the
+                    # words are visited in order, it can only be the last child listed so far
+                    children = parent_token.children
+                    if not children or children[-1] is not word:
+                        children.append(word)
+
+                    if parent_token.children_by_relation is None:
+                        parent_token.children_by_relation = {}
+                    relation_children = parent_token.children_by_relation.get(relation)
+                    if relation_children is None:
+                        parent_token.children_by_relation[relation] = [word]
+                    elif relation_children[-1] is not word:
+                        relation_children.append(word)
+
+    def build_conj_groups(self):
+        """
+        Builds the conjunction groups of the sentence in one pass over its enhanced relations.
+        conj_groups lists the groups in the order their first conj relation occurs in, and conj_edges
+        has a (conjunct, group) pair for every conj relation, in sentence order.
+        Only the structure is stored, so the groups stay valid when labels are rewritten,
+        as long as their base relations are kept.
+        """
+        groups = {}
+        conj_edges = []
+        cc_edges = []
+
+        for token in self:
+            for enhanced_head, enhanced_label in token.deps_set:
+                if is_conj_label(enhanced_label):
+                    group = groups.get(enhanced_head)
+                    if group is None:
+                        group = groups[enhanced_head] = ConjGroup(self.get_token(enhanced_head))
+                    if not group.conjuncts or group.conjuncts[-1] is not token:
+                        group.conjuncts.append(token)
+                    conj_edges.append((token, group))
+                elif enhanced_label == "cc":
+                    cc_edges.append((enhanced_head, token))
+
+        # a cc modifier is attached to one of the conjuncts, usually the one it precedes
+        member_groups = {}
+        for group in groups.values():
+            member_groups[str(group.first_conjunct.conllu_id)] = group
+            for conjunct in group.conjuncts:
+                member_groups[str(conjunct.conllu_id)] = group
+        for enhanced_head, token in cc_edges:
+            group = member_groups.get(enhanced_head)
+            if group is not None:
+                group.cc_tokens.append(token)
+
+        self.conj_groups = list(groups.values())
+        self.conj_edges = conj_edges
+
+    def get_conj_groups(self):
+        """Returns the conjunction groups of the sentence, see build_conj_groups."""
+        if self.conj_groups is None:
+            self.build_conj_groups()
+        return self.conj_groups
+
+    def get_conj_edges(self):
+        """Returns a (conjunct, group) pair for every conj relation of the sentence, see build_conj_groups."""
+        if self.conj_edges is None:
+            self.build_conj_groups()
+        return self.conj_edges
+
+    def __reduce__(self):
+        # Tokens are pickled as flat rows of their fields. The children are links within the sentence
+        # which are rebuilt after unpickling, which keeps pickling fast and shallow (e.g. for worker processes).
+        has_children = any(token.children for token in self)
+        return (unpickle_sentence, ([get_pickled_fields(token) for token in self], self.comments, has_children))
+
+
+# ConlluToken fields which are pickled, in the order of the ConlluToken arguments
+get_pickled_fields = attrgetter("conllu_id", "word", "lemma", "upos", "xpos", "feats", "head", "deprel", "deps", "misc",
+                                "process_deps", "raw", "_feats_set", "_deps_set", "dirty")
+
+
+def unpickle_sentence(rows, comments, has_children):
+    """Rebuilds a pickled ConlluSentence together with its ID index and children."""
+    tokens = []
+    for row in rows:
+        token = ConlluToken(*row[:10], process_deps=row[10], raw=row[11])
+        token.feats_set = row[12]
+        token.deps_set = row[13]
+        token.dirty = row[14]
+        tokens.append(token)
+
+    sentence = ConlluSentence(tokens, comments)
+    sentence.build_index()
+    if has_children:
+        sentence.build_children()
+    return sentence
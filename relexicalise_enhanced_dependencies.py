@@ -4,7 +4,9 @@ import os.path
 from collections import Counter
 
 from conllugraph import ConlluGraph
-from graph import stitch_edeps_items, unstitch_edeps_items
+from graph import ConlluSentence, is_conj_label
+from treebank_profile import TreebankProfile
+from utils import format_sentence, get_codec, iter_chunk, map_file_chunks, open_conll
 
 LONG_BASIC_LABELS=[
     "nmod:poss",
@@ -20,6 +22,9 @@ LONG_BASIC_LABELS=[
     "cc:preconj"
     ] # Add any more or get this from a Vocab file
 
+# a label part which delexicalisation put in place of a lexical item, e.g. <case_delex>
+PLACEHOLDER_PATTERN = re.compile(r"<\w+_delex>")
+
 """
 Sample sentences:
 # text = Because the US and Pakistan have managed to capture or kill about 2/3s of the top 25 al-Qaeda commanders, the middle managers are not in close contact with al-Zawahiri and Bin Laden.
@@ -27,10 +32,13 @@ Sample sentences:
 # text = Various mitigating actions have been and will be taken to provide focus, gain comfort over control levels and to provide assurance to senior management as to the accuracy of the Q1 DPR and business balance sheet.
 """
 
-def write_output_file(input_path, relexicalised_sentences, comment_lines):
+def write_output_file(input_path, relexicalised_sentences, compresslevel=None, formatted=False):
     """
     Takes an input path and the relexicalsed sentences and writes them to an output
-    file in CoNLL-U format.
+    file in CoNLL-U format. The sentences can be a lazy iterable, in which case
+    each sentence is written as soon as it has been relexicalised.
+    With formatted, they are already CoNLL-U text, e.g. whole chunks relexicalised by workers.
+    A .gz, .bz2 or .xz input is written out compressed with the same codec.
     """
 
     dirname = os.path.dirname(input_path)
@@ -45,13 +53,19 @@ def write_output_file(input_path, relexicalised_sentences, comment_lines):
 
     if not os.path.exists(output_path):
         print(f"Creating output path {output_path}")
-        os.makedirs(output_path)
+        # another process (e.g. of batch.py) may create it at the same time
+        os.makedirs(output_path, exist_ok=True)
 
     outfile = os.path.join(output_path, basename)
-    with open(outfile, 'w', encoding='utf-8') as fo:
-        for sentence_information, sent in zip(comment_lines.values(), relexicalised_sentences):
-            for line in sentence_information:
-                fo.write(line + "\n") 
+    # the input's codec, which is also detected from its first bytes when its name does not tell
+    with open_conll(outfile, 'w', compresslevel, codec=get_codec(input_path)) as fo:
+        for sent in relexicalised_sentences:
+            if formatted:
+                fo.write(sent)
+                continue
+
+            for line in sent.comments:
+                fo.write(line + "\n")
 
             for conllu_token in sent:
                 fo.write(str(conllu_token) + "\n")
@@ -78,10 +92,28 @@ class RelexicaliseConllu(object):
         self.lexical_item_count = Counter()
         self.lexicalised_deprels_count = Counter()
 
+    def get_counts(self):
+        """Returns the counters, e.g. to send them back from a worker process."""
+
+        return self.deprel_count, self.lexical_item_count, self.lexicalised_deprels_count
+
+    def update_counts(self, counts):
+        """Adds the counters of another RelexicaliseConllu, e.g. the one which relexicalised the next chunk."""
+
+        deprel_count, lexical_item_count, lexicalised_deprels_count = counts
+        self.deprel_count.update(deprel_count)
+        self.lexical_item_count.update(lexical_item_count)
+        self.lexicalised_deprels_count.update(lexicalised_deprels_count)
+
     def relexicalise(self, annotated_sentences):
         """Perform various types of relexicalisation."""
 
-        output_relexicalised_sentences = []
+        output_relexicalised_sentences = list(self.iter_relexicalise(annotated_sentences))
+
+        return output_relexicalised_sentences, self.deprel_count, self.lexical_item_count, self.lexicalised_deprels_count
+
+    def iter_relexicalise(self, annotated_sentences):
+        """Lazily relexicalises the sentences, yielding each one (with its comments) as soon as it is done."""
 
         for annotated_sentence in annotated_sentences:
         
@@ -92,13 +124,26 @@ class RelexicaliseConllu(object):
             # We have delexicalised the labels where tokens have certain modifiers,
             # but we still need to make sure these are applied to conjs which do not have direct
             # modifiers, so they have to get their delexicalised label from the first conjunct.
-            relexicalised_sentence = self.propagate_first_conj_labels(relexicalised_sentence)
+            # The conj passes look up first conjuncts through the ID index of the full sentence and
+            # modify the tokens of the relexicalised sentence in place.
+            self.propagate_first_conj_labels(annotated_sentence)
             # Now propagate 'cc' modifier to all conjuncts
-            relexicalised_sentence = self.propagate_cc_modifier_in_conjs(relexicalised_sentence)
+            self.propagate_cc_modifier_in_conjs(annotated_sentence)
+            # Whatever could not be relexicalised is written out without its placeholder
+            self.drop_unresolved_placeholders(annotated_sentence)
+
+            yield ConlluSentence(relexicalised_sentence, annotated_sentence.comments)
 
-            output_relexicalised_sentences.append(relexicalised_sentence)
+    def iter_relexicalise_parallel(self, filename, workers):
+        """
+        Relexicalises the chunks of an (uncompressed) input file in a pool of worker processes, yielding
+        the CoNLL-U text of each chunk in file order. The counters of the chunks are added in the same
+        order, so the output and the counters are the same as for iter_relexicalise.
+        """
 
-        return output_relexicalised_sentences, deprel_count, lexical_item_count, lexicalised_deprels_count
+        for text, counts in map_file_chunks(relexicalise_chunk, filename, (self.attach_morphological_case,), workers):
+            self.update_counts(counts)
+            yield text
 
     def relexicalise_case_mark_cc(self, annotated_sentence):
         """
@@ -117,102 +162,91 @@ class RelexicaliseConllu(object):
         # Operate on each token apart from ROOT
         for token in annotated_sentence[1:]:
             edeps = token.deps_set
+            deps_modified = False
             for i, edep in enumerate(edeps):
                 enhanced_head = edep[0]
                 enhanced_label = edep[1]
 
                 # 1) Relexicalise "case" placeholders
                 if "<case_delex>" in enhanced_label:
-                    for token_child in token.children:
-                        token_child_edeps = token_child.deps_set
-                        for token_child_edep in token_child_edeps:
-                            token_child_enhanced_label = token_child_edep[1]
-                            if token_child_enhanced_label == "case":
-                                lexical_item = token_child.lemma
+                    for token_child in token.get_relation_children("case"):
+                        lexical_item = token_child.lemma
                                 
-                                # check again for fixed children and append to lexical item
-                                for token_grandchild in token_child.children:
-                                    token_grandchild_edeps = token_grandchild.deps_set
-                                    for token_grandchild_edep in token_grandchild_edeps:
-                                        token_grandchild_enhanced_label = token_grandchild_edep[1]
-                                        if token_grandchild_enhanced_label == "fixed":
-                                            lexical_item = f"{lexical_item}_{token_grandchild.lemma}"
-
-                                # Not allowed in EUD label
-                                if "-" in lexical_item:
-                                    h = lexical_item.split("-")[0]
-                                    t = lexical_item.split("-")[1]
-                                    lexical_item = f"{h}{t}"
-
-                                parts = enhanced_label.split(":")
-                                for j, part in enumerate(parts):
-                                    relex_part = re.sub("<case_delex>", lexical_item, part)
-                                    parts[j] = relex_part
-                                enhanced_label = ":".join(parts)
-                                relexicalised_edep = (enhanced_head, enhanced_label)
-
-                                edeps[i] = relexicalised_edep
-                                # update counters
-                                self.deprel_count.update(["case relexicalised"])
-                                self.lexical_item_count.update([lexical_item])
+                        # check again for fixed children and append to lexical item
+                        for token_grandchild in token_child.get_relation_children("fixed"):
+                            lexical_item = f"{lexical_item}_{token_grandchild.lemma}"
+
+                        # Not allowed in EUD label
+                        if "-" in lexical_item:
+                            h = lexical_item.split("-")[0]
+                            t = lexical_item.split("-")[1]
+                            lexical_item = f"{h}{t}"
+
+                        parts = enhanced_label.split(":")
+                        for j, part in enumerate(parts):
+                            relex_part = re.sub("<case_delex>", lexical_item, part)
+                            parts[j] = relex_part
+                        enhanced_label = ":".join(parts)
+                        relexicalised_edep = (enhanced_head, enhanced_label)
+
+                        edeps[i] = relexicalised_edep
+                        deps_modified = True
+                        # update counters
+                        self.deprel_count.update(["case relexicalised"])
+                        self.lexical_item_count.update([lexical_item])
 
                 # 2) Relexicalise "mark" placeholders
                 if "<mark_delex>" in enhanced_label:
-                    for token_child in token.children:
-                        token_child_edeps = token_child.deps_set
-                        for token_child_edep in token_child_edeps:
-                            token_child_enhanced_label = token_child_edep[1]
-                            if token_child_enhanced_label == "mark":
-                                lexical_item = token_child.lemma
-
-                                # Not allowed in EUD label
-                                if "-" in lexical_item:
-                                    h = lexical_item.split("-")[0]
-                                    t = lexical_item.split("-")[1]
-                                    lexical_item = f"{h}{t}"
-
-                                # fr o m -> fr_o_m (spaces filled with underscores), t o m -> t_o_m
-                                parts = enhanced_label.split(":")
-                                for j, part in enumerate(parts):
-                                    relex_part = re.sub("<mark_delex>", lexical_item, part)
-                                    parts[j] = relex_part
-                                enhanced_label = ":".join(parts)
-                                relexicalised_edep = (enhanced_head, enhanced_label)
+                    for token_child in token.get_relation_children("mark"):
+                        lexical_item = token_child.lemma
+
+                        # Not allowed in EUD label
+                        if "-" in lexical_item:
+                            h = lexical_item.split("-")[0]
+                            t = lexical_item.split("-")[1]
+                            lexical_item = f"{h}{t}"
+
+                        # fr o m -> fr_o_m (spaces filled with underscores), t o m -> t_o_m
+                        parts = enhanced_label.split(":")
+                        for j, part in enumerate(parts):
+                            relex_part = re.sub("<mark_delex>", lexical_item, part)
+                            parts[j] = relex_part
+                        enhanced_label = ":".join(parts)
+                        relexicalised_edep = (enhanced_head, enhanced_label)
                                 
-                                edeps[i] = relexicalised_edep
-                                # update counters
-                                self.deprel_count.update(["mark relexicalised"])
-                                self.lexical_item_count.update([lexical_item])
+                        edeps[i] = relexicalised_edep
+                        deps_modified = True
+                        # update counters
+                        self.deprel_count.update(["mark relexicalised"])
+                        self.lexical_item_count.update([lexical_item])
 
                 # 3) Relexicalise "cc" placeholders
                 if "<cc_delex>" in enhanced_label:
-                    for token_child in token.children:
-                        token_child_edeps = token_child.deps_set
-                        for token_child_edep in token_child_edeps:
-                            token_child_enhanced_label = token_child_edep[1]
-                            if token_child_enhanced_label == "cc":
-                                lexical_item = token_child.lemma
-
-                                # Not allowed in EUD label
-                                if "-" in lexical_item:
-                                    h = lexical_item.split("-")[0]
-                                    t = lexical_item.split("-")[1]
-                                    lexical_item = f"{h}{t}"
-
-                                parts = enhanced_label.split(":")
-                                for j, part in enumerate(parts):
-                                    relex_part = re.sub("<cc_delex>", lexical_item, part)
-                                    parts[j] = relex_part
-                                enhanced_label = ":".join(parts)
-                                relexicalised_edep = (enhanced_head, enhanced_label)
+                    for token_child in token.get_relation_children("cc"):
+                        lexical_item = token_child.lemma
+
+                        # Not allowed in EUD label
+                        if "-" in lexical_item:
+                            h = lexical_item.split("-")[0]
+                            t = lexical_item.split("-")[1]
+                            lexical_item = f"{h}{t}"
+
+                        parts = enhanced_label.split(":")
+                        for j, part in enumerate(parts):
+                            relex_part = re.sub("<cc_delex>", lexical_item, part)
+                            parts[j] = relex_part
+                        enhanced_label = ":".join(parts)
+                        relexicalised_edep = (enhanced_head, enhanced_label)
                                 
-                                edeps[i] = relexicalised_edep
-                                # update counters
-                                self.deprel_count.update(["cc relexicalised"])
-                                self.lexical_item_count.update([lexical_item])
-
-            # update token deps
-            token.deps_set = edeps
+                        edeps[i] = relexicalised_edep
+                        deps_modified = True
+                        # update counters
+                        self.deprel_count.update(["cc relexicalised"])
+                        self.lexical_item_count.update([lexical_item])
+
+            # update token deps, only marking the tokens whose deps were changed as modified
+            if deps_modified:
+                token.deps_set = edeps
             relexicalised_sentence.append(token)
         
         return relexicalised_sentence, self.deprel_count, self.lexical_item_count, self.lexicalised_deprels_count
@@ -226,55 +260,33 @@ class RelexicaliseConllu(object):
         the label of the conjunct if there is a matching shorthand label.
         """
 
-        relexicalised_sentence = []
-        visited_conjuncts = set()
-        possible_duplicates = []
+        relexicalised_sentence = list(annotated_sentence)
 
-        for token in annotated_sentence:
+        for token, group in annotated_sentence.get_conj_edges():
             edeps = token.deps_set
-            for i, edep in enumerate(edeps):
-                enhanced_head = edep[0]
-                enhanced_label = edep[1]
+            first_conjunct_token = group.first_conjunct
 
-                if "conj" in enhanced_label:     
-                    first_conjunct_index = enhanced_head
-                    # As EUD sentences may contain elided tokens, e.g. 5.1, we can't directly access
-                    # the token from the head ID, so we search for matching conllu_ids instead 
-                    for target_index, target_token in enumerate(annotated_sentence):
-                        if target_token.conllu_id == first_conjunct_index:
-                            first_conjunct_token = annotated_sentence[int(target_index)]             
-
-                    # 1) Get the conj's parent's edeps and see if we can take the label from there
-                    fct_edeps = first_conjunct_token.deps_set
-                    for i, fct_edep in enumerate(fct_edeps):
-                        fct_edep = stitch_edeps_items(fct_edep)
-
-                        # Now scan back through our own edeps to see if we have a matching shorthand label
-                        for i, edep in enumerate(edeps):
-                            enhanced_head = edep[0]
-                            enhanced_label = edep[1]
-                            edep = stitch_edeps_items(edep)
-
-                            if "delex" in enhanced_label:
-                                delex_placeholder = enhanced_label.split(":")[-1]
-                                # check for the same base relation (excluding head and lexical tail)
-                                if fct_edep.split(":")[1:-1] == edep.split(":")[1:-1]:
-                                    lexical_item = fct_edep.split(":")[-1]
-                                    edep = (enhanced_head, enhanced_label.replace(delex_placeholder, lexical_item))
-                                    edeps[i] = edep
-
-                        token.deps_set = edeps
-                        visited_conjuncts.add(token.conllu_id)
-                        possible_duplicates.append(token.conllu_id)
-
-                        self.deprel_count.update(["first relexicalised conjunct propagated"])
+            # 1) Get the conj's parent's edeps and see if we can take the label from there
+            fct_edeps = first_conjunct_token.deps_set
+            for fct_edep in fct_edeps:
+                fct_label_parts = fct_edep[1].split(":")
 
-            relexicalised_sentence.append(token)
+                # Now scan back through our own edeps to see if we have a matching shorthand label
+                for i, edep in enumerate(edeps):
+                    enhanced_head = edep[0]
+                    enhanced_label = edep[1]
+
+                    if "delex" in enhanced_label:
+                        label_parts = enhanced_label.split(":")
+                        delex_placeholder = label_parts[-1]
+                        # check for the same base relation (excluding head and lexical tail)
+                        if fct_label_parts[:-1] == label_parts[:-1]:
+                            lexical_item = fct_label_parts[-1]
+                            edeps[i] = (enhanced_head, enhanced_label.replace(delex_placeholder, lexical_item))
+
+                token.deps_set = edeps
+                self.deprel_count.update(["first relexicalised conjunct propagated"])
 
-        # if len(visited_conjuncts) > 0:
-        #     if len(visited_conjuncts) != len(possible_duplicates):
-        #         raise ValueError("A token's deps was modified more than once!")
-        
         return relexicalised_sentence
 
 
@@ -282,75 +294,99 @@ class RelexicaliseConllu(object):
         """
         For the last conjunct there is usually a 'cc' modifer, e.g. apples, bananas and oranges.
         This 'and' needs to be passed to the labels of the words which precede the last conjunct in the sequence.
+        Each conjunction group is relexicalised once, when the first of its conj relations which
+        still has a delexicalised label is met.
         """
 
-        relexicalised_sentence = []
-        visited_conjuncts = set()
-        possible_duplicates = []
+        relexicalised_sentence = list(annotated_sentence)
+        relexicalised_groups = set()
 
-        seen_cc_modifier = False
-        for token in annotated_sentence:
-            edeps = token.deps_set
-            for i, edep in enumerate(edeps):
-                enhanced_head = edep[0]
-                enhanced_label = edep[1]
-                
-                # Check if the token is a "conj" and inspect other tokens it is in conjunction with.
-                base_relation = enhanced_label.split(":")[0]
-                if base_relation == "conj":
+        for token, group in annotated_sentence.get_conj_edges():
+            if group in relexicalised_groups:
+                continue
 
-                    # only carry this out if there is a delexicalised label
-                    if "delex" in enhanced_label:
-                        first_conjunct_index = enhanced_head
-                        
-                        # As EUD sentences may contain elided tokens, e.g. 5.1, we can't directly access
-                        # the token from the head ID, so we search for matching conllu_ids instead 
-                        for target_index, target_token in enumerate(annotated_sentence):
-                            if target_token.conllu_id == first_conjunct_index:
-                                first_conjunct_token = annotated_sentence[int(target_index)]    
-
-                        fct_children = first_conjunct_token.children
-                        # 1) Search through all of the grandchildren of the FCT and see which one the 'cc' modifier is attached to
-                        # then pass that delexicalised label to the other conjuncts.
-                        for fct_child in fct_children:
-                            for fct_grandchild in fct_child.children:
-                                fct_grandchild_edeps = fct_grandchild.deps_set
-                                for i, edep in enumerate(fct_grandchild_edeps):
-                                    fct_grandchild_enhanced_label = edep[1]
-                                    # Token has a "cc" dependent
-                                    if fct_grandchild_enhanced_label == "cc":
-                                        lexical_item = fct_grandchild.lemma
-                                        seen_cc_modifier = True
-
-
-                        # 2) Now that we have found the cc modifier, traverse the conj chain and use that label.
-                        if seen_cc_modifier:
-                            for fct_child in fct_children:
-                                fct_child_edeps = fct_child.deps_set
-                                for i, edep in enumerate(fct_child_edeps):
-                                    enhanced_head = edep[0]
-                                    enhanced_label = edep[1]
-
-                                    if "<cc_delex>" in enhanced_label:
-                                        edep = (enhanced_head, enhanced_label.replace("<cc_delex>", lexical_item))
-                                        fct_child_edeps[i] = edep
-
-                                # update child token deps
-                                fct_child.deps_set = fct_child_edeps
-                                visited_conjuncts.add(token.conllu_id)
-                                possible_duplicates.append(token.conllu_id)
-                                
-                                # update counters
-                                self.deprel_count.update(["last delexicalised conjunct propagated"])
+            # only carry this out if there is a delexicalised label
+            first_conjunct_id = str(group.first_conjunct.conllu_id)
+            if not any("delex" in enhanced_label for enhanced_head, enhanced_label in token.deps_set
+                       if enhanced_head == first_conjunct_id and is_conj_label(enhanced_label)):
+                continue
+            relexicalised_groups.add(group)
 
-            relexicalised_sentence.append(token)
+            # 1) The lemma of the 'cc' modifier attached to the conjuncts, otherwise the one
+            # delexicalisation propagated from the grandchildren of the first conjunct
+            lexical_item = group.cc_lemma
+            if lexical_item is None:
+                lexical_item = self.get_first_conjunct_cc_lemma(group.first_conjunct)
+            if lexical_item is None:
+                continue
+
+            # 2) Now that we have found the cc modifier, traverse the conj chain and use that label.
+            for conjunct in group.conjuncts:
+                conjunct_edeps = conjunct.deps_set
+                for i, edep in enumerate(conjunct_edeps):
+                    enhanced_head = edep[0]
+                    enhanced_label = edep[1]
 
-        #if len(visited_conjuncts) > 0:
-        #    if len(visited_conjuncts) != len(possible_duplicates):
-        #        raise ValueError("A token's deps was modified more than once!")
+                    if "<cc_delex>" in enhanced_label:
+                        conjunct_edeps[i] = (enhanced_head, enhanced_label.replace("<cc_delex>", lexical_item))
+
+                # update conjunct token deps
+                conjunct.deps_set = conjunct_edeps
+
+                # update counters
+                self.deprel_count.update(["last delexicalised conjunct propagated"])
 
         return relexicalised_sentence
 
+    def get_first_conjunct_cc_lemma(self, first_conjunct_token):
+        """
+        Returns the lemma of the (last) 'cc' modifier among the grandchildren of a first conjunct, or None.
+        Delexicalisation propagates the 'cc' placeholder from there, e.g. from a coordination
+        nested in a dependent of the first conjunct, to conjuncts which have no 'cc' modifier of their own.
+        """
+
+        lexical_item = None
+        for fct_child in first_conjunct_token.children:
+            for fct_grandchild in fct_child.children:
+                if any(enhanced_label == "cc" for enhanced_head, enhanced_label in fct_grandchild.deps_set):
+                    lexical_item = fct_grandchild.lemma
+        return lexical_item
+
+    def drop_unresolved_placeholders(self, annotated_sentence):
+        """
+        Removes the placeholders which could not be relexicalised, e.g. when the parser predicted
+        obl:<case_delex> for a word without a 'case' dependent, so no placeholder is written out.
+        obl:<case_delex> becomes obl and conj:<cc_delex> becomes conj.
+        """
+
+        for token in annotated_sentence[1:]:
+            edeps = token.deps_set
+            if not any("_delex>" in edep[1] for edep in edeps):
+                continue
+
+            for i, (enhanced_head, enhanced_label) in enumerate(edeps):
+                if "_delex>" in enhanced_label:
+                    parts = [part for part in enhanced_label.split(":") if not PLACEHOLDER_PATTERN.fullmatch(part)]
+                    edeps[i] = (enhanced_head, ":".join(parts))
+                    self.deprel_count.update(["unresolved placeholder dropped"])
+
+            token.deps_set = edeps
+
+
+def relexicalise_chunk(filename, start, end, attach_morphological_case):
+    """
+    Relexicalises the sentences in a byte range of the input, e.g. in a worker process.
+
+    Returns:
+        text: the relexicalised sentences as CoNLL-U text.
+        counts: the counters of the chunk, see RelexicaliseConllu.get_counts.
+    """
+
+    relexicalise_conllu = RelexicaliseConllu(attach_morphological_case, False)
+    sentences = relexicalise_conllu.iter_relexicalise(iter_chunk(filename, start, end))
+    text = "".join(format_sentence(sent) for sent in sentences)
+
+    return text, relexicalise_conllu.get_counts()
 
 def argparser():
     from argparse import ArgumentParser
@@ -359,14 +395,20 @@ def argparser():
     help='Input CoNLL-U file.')
     ap.add_argument('-e', '--encoding', default='utf-8', type=str,
     help='Type of encoding.')
-    ap.add_argument('-mc', '--attach_morphological_case', default=False, action='store_true',
-    help='Whether to append morphological case to enhanced label.')
+    ap.add_argument('-t', '--treebank', type=str, default=None,
+    help='Training treebank of the parser, whose profile decides whether to append morphological case.')
+    ap.add_argument('-mc', '--attach_morphological_case', default=None, action='store_true',
+    help='Whether to append morphological case to enhanced label. Defaults to the decision stored in the treebank profile of --treebank.')
     ap.add_argument('-v', '--visualise', default=False, action='store_true',
     help='Whether to visualise the dependency labels.')
     ap.add_argument('-ws', '--write-stats', metavar='FILE', default=None,
     help='Write statistics.')
     ap.add_argument('-q', '--quiet', default=False, action='store_true',
     help='Do not display certain helper information.')
+    ap.add_argument('--compress-level', type=int, default=None,
+    help='Compression level for .gz, .bz2 and .xz outputs.')
+    ap.add_argument('--workers', type=int, default=1,
+    help='Number of processes which relexicalise chunks of the input.')
     return ap
 
 def main(argv):
@@ -376,13 +418,25 @@ def main(argv):
 
     if args.input:
         base_input = os.path.basename(args.input)
-        input_annotated_sentences, vocab, comment_lines = conllu_graph.build_dataset(args.input)
-        input_sentence_edges = conllu_graph.build_edges(input_annotated_sentences)
-
-        relexicalise_conllu = RelexicaliseConllu(args.attach_morphological_case, args.visualise)
-        output_relexicalised_sentences, deprel_count, lexical_item_count, lexicalised_deprels_count = relexicalise_conllu.relexicalise(input_annotated_sentences)
 
-        write_output_file(args.input, output_relexicalised_sentences, comment_lines)
+        # the input is parser output, so the decision is taken from the treebank the parser was trained on
+        attach_morphological_case = args.attach_morphological_case
+        if attach_morphological_case is None:
+            attach_morphological_case = args.treebank is not None and TreebankProfile.load(args.treebank).attach_morphological_case
+
+        # Relexicalise and write out one sentence at a time.
+        relexicalise_conllu = RelexicaliseConllu(attach_morphological_case, args.visualise)
+        parallel = args.workers > 1
+        if parallel and get_codec(args.input):
+            # compressed files can't be split into byte ranges
+            print(f"{args.input} is compressed, relexicalising it in a single process")
+            parallel = False
+        if parallel:
+            output_chunks = relexicalise_conllu.iter_relexicalise_parallel(args.input, args.workers)
+            write_output_file(args.input, output_chunks, args.compress_level, formatted=True)
+        else:
+            output_relexicalised_sentences = relexicalise_conllu.iter_relexicalise(conllu_graph.stream_dataset(args.input))
+            write_output_file(args.input, output_relexicalised_sentences, args.compress_level)
 
         # print(deprel_count)
         # print(lexical_item_count)
@@ -1,10 +1,19 @@
 # uses boiler-plate code from: https://github.com/spyysalo/wiki-bert-pipeline/blob/master/scripts/udtokenize.py
 
+import io
 import sys
 import csv
+import glob
 import os.path
+import multiprocessing
+from contextlib import redirect_stdout
+from align import align_sentences, get_sentence_keys
+from confusion import LabelConfusion, log_confusions
 from conllugraph import ConlluGraph
+from corpus import ConlluCorpus
 from evaluate import EvaluateConllu
+from score import METRICS, encode_edges, log_scores, score_edges
+from treebank_profile import TreebankProfile
 
 
 def argparser():
@@ -12,26 +21,38 @@ def argparser():
     ap = ArgumentParser()
     ap.add_argument('-g', '--gold', type=str,
     help='Gold CoNLL-U file.')
-    ap.add_argument('-s', '--system', type=str, 
-    help='System CoNLL-U file.')
+    ap.add_argument('-s', '--system', type=str, nargs='+',
+    help='System CoNLL-U files, glob patterns or directories, e.g. "sysoutputs/*/test/pertreebank", '
+         'in which the files of the gold treebank are evaluated.')
     ap.add_argument('-e', '--encoding', default='utf-8', type=str,
     help='Type of encoding.')
     ap.add_argument('--evaluate_edges', default=False, action='store_true',
     help='Evaluate certain dependency labels.')
     ap.add_argument('--evaluate_labels', default=False, action='store_true',
     help='Evaluate certain depenency labels.')
-    ap.add_argument('-mc', '--attach_morphological_case', default=False, action='store_true',
-    help='Whether to append morphological case to enhanced label.')
+    ap.add_argument('-mc', '--attach_morphological_case', default=None, action='store_true',
+    help='Whether to append morphological case to enhanced label. Defaults to the decision stored in the treebank profile of the gold file.')
     ap.add_argument('-v', '--visualise', default=False, action='store_true',
     help='Whether to visualise the dependency labels.')
     ap.add_argument('-ws', '--write-stats', metavar='FILE', default=None,
     help='Write statistics.')
     ap.add_argument('-q', '--quiet', default=False, action='store_true',
     help='Do not display certain helper information.')
+    ap.add_argument('--cache-dir', type=str, default=None,
+    help='Directory for caching parsed input files between runs.')
+    ap.add_argument('--parse-workers', type=int, default=1,
+    help='Number of processes used to parse the input files.')
+    ap.add_argument('--confusion', metavar='FILE', default=None,
+    help='Write the confusion matrix of the enhanced labels to FILE, as NPZ or (for any other extension) CSV. '
+         'With several systems, the name of each system is added to FILE.')
+    ap.add_argument('--workers', type=int, default=1,
+    help='Number of system files evaluated concurrently, each in its own process.')
+    ap.add_argument('--table', metavar='FILE', default='metadata.csv',
+    help='CSV table the row of each system is appended to.')
     return ap
 
 
-def log_output(args, input_type, count_dict, modifier_lemmas):
+def log_output(args, input_type, filename, count_dict, modifier_lemmas):
     """ Prints outputs of gold/system results. """
     
     # in some cases, the parser may not have had any success
@@ -39,10 +60,10 @@ def log_output(args, input_type, count_dict, modifier_lemmas):
 
     if input_type == "gold":
         print("\n***\nGOLD")
-        print(args.gold, "\n")
+        print(filename, "\n")
     elif input_type == "system":
         print("\n***\nSYSTEM")
-        print(args.system, "\n")
+        print(filename, "\n")
 
     num_case_deprels = count_dict['case']
     print(f"number case deprels: {num_case_deprels}")
@@ -60,70 +81,266 @@ def log_output(args, input_type, count_dict, modifier_lemmas):
     return case_success
 
 
-def main(argv):
-    args = argparser().parse_args(argv[1:])
+def get_tbid(filename):
+    return os.path.basename(filename).split("-")[0]
+
+
+def get_system_files(patterns, tbid=None):
+    """
+    Expands the system arguments: files, glob patterns or directories, e.g. sysoutputs/*/test/pertreebank,
+    in which the files of the treebank (or all CoNLL-U files, without a tbid) are taken.
+    """
+
+    system_files = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]:
+            if os.path.isdir(path):
+                system_files.extend(sorted(glob.glob(os.path.join(path, f"{tbid}-*.conllu" if tbid else "*.conllu"))))
+            else:
+                system_files.append(path)
+    return system_files
+
+
+def get_system_names(system_files):
+    """
+    Names each system file by the parts of its path which differ between the files,
+    e.g. adapt and clasp for sysoutputs/adapt/test/pertreebank/en_ewt-ud-test-sys.conllu
+    and sysoutputs/clasp/test/pertreebank/en_ewt-ud-test-sys.conllu.
+    """
+
+    if len(system_files) == 1:
+        return [os.path.splitext(os.path.basename(system_files[0]))[0]]
+
+    paths = [os.path.normpath(filename).split(os.sep) for filename in system_files]
+    prefix = len(os.path.commonprefix(paths))
+    suffix = len(os.path.commonprefix([path[::-1] for path in paths]))
+    return ["/".join(path[prefix:len(path) - suffix]) or os.path.basename(filename)
+            for path, filename in zip(paths, system_files)]
+
+
+def evaluate_file(args, filename, input_type):
+    """
+    Parses a gold or system file and prints its edge and case statistics.
+
+    Returns:
+        annotated_sentences: the parsed sentences.
+        edge_count: number of enhanced edges (if evaluated).
+        dummy_root_count: number of extra edges to ROOT (if evaluated).
+        deprel_count, modifier_lemmas: the case statistics of EvaluateConllu.
+        case_success: share of case dependents attached to the enhanced label.
+        corpus: the columnar corpus of the file if it was loaded from the cache, otherwise None.
+    """
 
     conllu_graph = ConlluGraph()
+    annotated_sentences, _, _ = conllu_graph.build_dataset(filename, cache_dir=args.cache_dir, workers=args.parse_workers)
+    sentence_edges = conllu_graph.build_edges(annotated_sentences)
+    evaluate_conllu = EvaluateConllu(args.evaluate_edges, args.evaluate_labels, args.attach_morphological_case, args.visualise)
+    edge_count, dummy_root_count, deprel_count, modifier_lemmas, _ = evaluate_conllu.evaluate(sentence_edges, annotated_sentences)
+    case_success = log_output(args, input_type, filename, deprel_count, modifier_lemmas)
+
+    print(edge_count)
+    print(dummy_root_count)
+    if args.evaluate_labels:
+        print(f"conj lemmas: {dict(evaluate_conllu.conj_lemmas)}")
+
+    return annotated_sentences, edge_count, dummy_root_count, deprel_count, modifier_lemmas, case_success, conllu_graph.corpus
+
+
+class GoldTreebank(object):
+    """
+    GoldTreebank
+
+    A gold file parsed and indexed once, against which any number of system files are evaluated:
+    its sentences with their alignment keys, its columnar corpus and its statistics.
+    """
+
+    def __init__(self, filename, annotated_sentences, edge_count, case_success, corpus=None):
+        self.filename = filename
+        self.tbid = get_tbid(filename)
+        self.annotated_sentences = annotated_sentences
+        self.sentence_keys = [get_sentence_keys(sentence) for sentence in annotated_sentences]
+        # the corpus loaded from the cache holds the same arrays
+        self.corpus = corpus if corpus is not None else ConlluCorpus.from_sentences(annotated_sentences)
+        self.edge_count = edge_count
+        self.case_success = case_success
+
+
+def evaluate_system(args, gold, filename, name, confusion_file=None):
+    """
+    Evaluates one system file, against the gold treebank if there is one.
+
+    Returns:
+        row: the row of the system in the table, or None without gold.
+    """
+
+    s_annotated_sentences, s_edge_count, s_dummy_root_count, _, _, case_success_system, s_corpus = evaluate_file(args, filename, "system")
+    if gold is None:
+        return None
+
+    assert gold.tbid == get_tbid(filename), f"error: comparing gold and system from different tbids ({filename})"
+    s_edge_count = s_edge_count - s_dummy_root_count
+
+    # the aggregate counts above do not say whether the edges agree, so score the aligned sentences edge by edge
+    print("\n***\nSCORES")
+    alignment = align_sentences(gold.annotated_sentences, s_annotated_sentences, gold_keys=gold.sentence_keys)
+    print(alignment.summary())
+    if s_corpus is None:
+        s_corpus = ConlluCorpus.from_sentences(s_annotated_sentences)
+    edges = encode_edges(gold.corpus, s_corpus, gold.annotated_sentences, s_annotated_sentences, alignment)
+    scores = score_edges(edges)
+    log_scores(scores, 0 if args.quiet else None)
+    if confusion_file:
+        confusion = LabelConfusion.from_edges(edges)
+        log_confusions(confusion.view("shape", args.attach_morphological_case))
+        confusion.save(confusion_file)
+    f1_scores = [scores.score(metric)[2] for metric in METRICS]
+
+    diff_success = gold.case_success - case_success_system
+    return [gold.tbid, name, gold.case_success, case_success_system, diff_success, gold.edge_count, s_edge_count] + f1_scores
+
+
+# the arguments and the gold treebank of the worker processes, set once per worker
+_worker_state = None
+
+
+def _init_worker(args, gold):
+    global _worker_state
+    # the workers are daemon processes, which cannot start a pool of their own for parsing
+    args.parse_workers = 1
+    _worker_state = (args, gold)
+
 
+def _evaluate_system_task(task):
+    """Evaluates a system file in a worker and returns its printed output along with its row."""
+
+    args, gold = _worker_state
+    with redirect_stdout(io.StringIO()) as output:
+        row = evaluate_system(args, gold, *task)
+    return output.getvalue(), row
+
+
+def get_confusion_file(confusion, name, num_systems):
+    """With several systems, each gets its own file, e.g. confusion.adapt.npz for confusion.npz."""
+
+    if not confusion or num_systems == 1:
+        return confusion
+    root, extension = os.path.splitext(confusion)
+    return f"{root}.{name.replace('/', '_')}{extension}"
+
+
+# the columns of the table with one row per evaluated system
+HEADER = ["tbid", "system", "case_success_gold", "case_success_system", "diff_success",
+          "enhanced_deps_gold", "enhanced_deps_system"] + [metric.lower() for metric in METRICS]
+
+
+def log_table(rows):
+    print("\n***\nSUMMARY")
+    print("\t".join(HEADER))
+    for row in rows:
+        print("\t".join(f"{value:.4f}" if isinstance(value, float) else str(value) for value in row))
+
+
+def check_table(filename):
+    """
+    Checks that an existing table has the columns of HEADER, so new rows are never appended
+    under the header of an older version, e.g. before the system and score columns were added.
+    """
+
+    if not os.path.isfile(filename) or os.path.getsize(filename) == 0:
+        return
+
+    with open(filename, newline='') as csv_file:
+        header = next(csv.reader(csv_file), None)
+    if header != HEADER:
+        raise ValueError(f"{filename} has the columns {header} instead of {HEADER}, "
+                         f"move it away or write to another table")
+
+
+def write_table(filename, rows):
+    """Appends the rows to a CSV table, with the header if it is new."""
+
+    check_table(filename)
+    file_exists = os.path.isfile(filename) and os.path.getsize(filename) > 0
+
+    csv_file = open(filename, 'a+', newline ='') 
+    with csv_file:
+        writer = csv.writer(csv_file) 
+        if not file_exists:
+            writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+def evaluate(args):
+    """
+    Evaluates the gold file and every system file of the parsed arguments.
+
+    Returns:
+        rows: the row of each system in the table (empty without gold).
+    """
+
+    system_files = get_system_files(args.system, get_tbid(args.gold) if args.gold else None) if args.system else []
+    if args.system and not system_files:
+        raise FileNotFoundError(f"no system files found for {' '.join(args.system)}")
+
+    if args.attach_morphological_case is None and (args.gold or system_files):
+        # computed once per treebank and stored next to it, but never stored next to a system file
+        if args.gold:
+            profile = TreebankProfile.load(args.gold)
+        else:
+            profile = TreebankProfile.load(system_files[0], save=False)
+        args.attach_morphological_case = profile.attach_morphological_case
+
+    gold = None
     if args.gold:
-        base_gold = os.path.basename(args.gold)
-        g_annotated_sentences = conllu_graph.build_dataset(args.gold)
-        g_sentence_edges = conllu_graph.build_edges(g_annotated_sentences)
-        g_evaluate_conllu = EvaluateConllu(args.evaluate_edges, args.evaluate_labels, args.attach_morphological_case, args.visualise)
-        g_edge_count, g_dummy_root_count, g_deprel_count, g_modifier_lemmas, g_morph_case = g_evaluate_conllu.evaluate(g_sentence_edges, g_annotated_sentences)
-        case_success_gold = log_output(args, "gold", g_deprel_count, g_modifier_lemmas)
-
-        print(g_edge_count)
-        print(g_dummy_root_count)
-
-    if args.system:
-        base_system = os.path.basename(args.system)
-        s_annotated_sentences = conllu_graph.build_dataset(args.system)
-        s_sentence_edges = conllu_graph.build_edges(s_annotated_sentences)
-        s_evaluate_conllu = EvaluateConllu(args.evaluate_edges, args.evaluate_labels, args.attach_morphological_case, args.visualise)
-        s_edge_count, s_dummy_root_count, s_deprel_count, s_modifier_lemmas, s_morph_case = s_evaluate_conllu.evaluate(s_sentence_edges, s_annotated_sentences)
-        case_success_system = log_output(args, "system", s_deprel_count, s_modifier_lemmas)
-
-        print(s_edge_count)
-        print(s_dummy_root_count)
-
-    if args.gold and args.system:
-        gold_tbid = base_gold.split("-")[0]
-        system_tbid = base_system.split("-")[0]
-        assert gold_tbid == system_tbid, "error: comparing gold and system from different tbids"
-
-        s_edge_count = s_edge_count - s_dummy_root_count
-
-        header = ["tbid", "case_success_gold", "case_success_system", "diff_success", "enhanced_deps_gold", "enhanced_deps_system"]
-        row = []
-        diff_success = case_success_gold - case_success_system
-        row.append([gold_tbid, case_success_gold, case_success_system, diff_success, g_edge_count, s_edge_count])
-        filename = "metadata.csv"
-        file_exists = os.path.isfile(filename)
-
-        csv_file = open(filename, 'a+', newline ='') 
-        with csv_file:
-            writer = csv.writer(csv_file) 
-            if not file_exists:
-                writer.writerow(header)
-            writer.writerows(row)
+        # parsed and indexed once, however many systems are evaluated against it
+        g_annotated_sentences, g_edge_count, _, g_deprel_count, g_modifier_lemmas, case_success_gold, g_corpus = evaluate_file(args, args.gold, "gold")
+        gold = GoldTreebank(args.gold, g_annotated_sentences, g_edge_count, case_success_gold, g_corpus)
+
+    names = get_system_names(system_files) if system_files else []
+    tasks = [(filename, name, get_confusion_file(args.confusion, name, len(system_files)))
+             for filename, name in zip(system_files, names)]
 
+    rows = []
+    if args.workers > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(min(args.workers, len(tasks)), initializer=_init_worker, initargs=(args, gold)) as pool:
+            # imap keeps the systems in order, so their outputs are printed as if evaluated one by one
+            for output, row in pool.imap(_evaluate_system_task, tasks):
+                print(output, end="")
+                rows.append(row)
+    else:
+        for task in tasks:
+            rows.append(evaluate_system(args, gold, *task))
+
+    if gold is None:
+        return []
 
     # perform some checks
     num_case_labels = g_deprel_count["case"]
     case_values = sum(x for x in g_modifier_lemmas.values())
     assert num_case_labels == case_values, f"some deprels are unaccounted for when considering the following cases {g_modifier_lemmas.keys()}"
 
+    return rows
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+
+    # checked before the evaluation rather than after it
+    try:
+        check_table(args.table)
+    except ValueError as e:
+        print(f"error: {e}")
+        return 1
+
+    try:
+        rows = evaluate(args)
+    except FileNotFoundError as e:
+        print(f"error: {e}")
+        return 1
 
-    ##
-    # TODO:
-    # working with un-aligned files is tricky.
-    # a workaround may include:
-    # for each gold sentence, look for the phenomenom we are interested in (e.g. case dependent)
-    # then iterate through the system sentence until the corresponding item is found:
-    # compare
-    # reset at the next sentence
-    ##
+    if rows:
+        log_table(rows)
+        write_table(args.table, rows)
 
     return 0
 
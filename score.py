@@ -0,0 +1,350 @@
+import sys
+
+import numpy as np
+
+from align import align_sentences, align_tokens, evaluate_aligned
+from corpus import ConlluCorpus
+from utils import read_conll
+
+"""
+Scores the enhanced dependencies of a system file against a gold file, like the IWPT shared task
+scorer, but over integer edge arrays instead of per-token Python loops, e.g.:
+
+python conllugraph/score.py -g data/UD_English-EWT/en_ewt-ud-test.conllu -s sysoutputs/en_ewt-ud-test-sys.conllu
+
+The sentences and words of the two files are aligned first (see align.py). Every edge is then
+encoded as a single int64 key from its dependent, its head and its label, so the matching edges
+of the whole corpus are found with one sort and one searchsorted. Edges of unaligned sentences
+and words still count as gold or system edges, so they lower recall and precision.
+"""
+
+# the scores, from the strictest to the most lenient
+METRICS = ("ELAS", "EULAS", "EUAS")
+
+
+def get_universal_label(enhanced_label):
+    """Returns the universal part of an enhanced label, e.g. nmod for nmod:in or nmod:poss."""
+    return enhanced_label.split(":")[0]
+
+
+def count_matches(gold_keys, system_keys):
+    """
+    Matches two multisets of edge keys: a key occurring m times in gold and n times in the system
+    output matches min(m, n) times.
+
+    Returns:
+        gold_unique: the distinct gold keys, sorted.
+        matched: how often each of them is matched.
+    """
+
+    gold_unique, gold_counts = np.unique(gold_keys, return_counts=True)
+    system_unique, system_counts = np.unique(system_keys, return_counts=True)
+    if len(system_unique) == 0:
+        return gold_unique, np.zeros(len(gold_unique), dtype=np.int64)
+
+    positions = np.searchsorted(system_unique, gold_unique).clip(max=len(system_unique) - 1)
+    found = system_unique[positions] == gold_unique
+    matched = np.where(found, np.minimum(gold_counts, system_counts[positions]), 0)
+    return gold_unique, matched
+
+
+class EnhancedScores(object):
+    """
+    EnhancedScores
+
+    Edge counts of a gold/system comparison: the number of gold, system and matched edges for
+    each metric, and per enhanced label for ELAS. The counts of several files (or treebanks)
+    can be merged with merge, as long as the scores are computed from the merged counts.
+
+    Params:
+        labels: the enhanced labels, indexing the per-label arrays.
+        gold_label_counts: number of gold edges with each label.
+        system_label_counts: number of system edges with each label.
+        matched_label_counts: number of labelled matches with each (gold) label.
+        matches: dictionary from each metric to its number of matches.
+    """
+
+    def __init__(self, labels, gold_label_counts, system_label_counts, matched_label_counts, matches):
+        self.labels = labels
+        self.gold_label_counts = gold_label_counts
+        self.system_label_counts = system_label_counts
+        self.matched_label_counts = matched_label_counts
+        self.matches = matches
+
+    @property
+    def gold_edges(self):
+        return int(self.gold_label_counts.sum())
+
+    @property
+    def system_edges(self):
+        return int(self.system_label_counts.sum())
+
+    def merge(self, other):
+        """Returns the scores of both comparisons together, with the union of their labels."""
+
+        labels = list(self.labels) + [label for label in other.labels if label not in set(self.labels)]
+        label_ids = {label: label_id for label_id, label in enumerate(labels)}
+        other_ids = np.array([label_ids[label] for label in other.labels], dtype=np.int64)
+
+        def merge_counts(counts, other_counts):
+            merged = np.zeros(len(labels), dtype=np.int64)
+            merged[:len(counts)] = counts
+            np.add.at(merged, other_ids, other_counts)
+            return merged
+
+        return EnhancedScores(labels,
+                              merge_counts(self.gold_label_counts, other.gold_label_counts),
+                              merge_counts(self.system_label_counts, other.system_label_counts),
+                              merge_counts(self.matched_label_counts, other.matched_label_counts),
+                              {metric: self.matches[metric] + other.matches[metric] for metric in METRICS})
+
+    def score(self, metric):
+        """Returns the precision, recall and F1 of a metric."""
+
+        return get_f1(self.matches[metric], self.gold_edges, self.system_edges)
+
+    def label_scores(self):
+        """Returns {label: (gold edges, system edges, precision, recall, f1)}, most frequent gold labels first."""
+
+        order = np.argsort(-self.gold_label_counts, kind="stable")
+        return {self.labels[label_id]: (int(self.gold_label_counts[label_id]), int(self.system_label_counts[label_id]))
+                + get_f1(int(self.matched_label_counts[label_id]), int(self.gold_label_counts[label_id]),
+                         int(self.system_label_counts[label_id]))
+                for label_id in order}
+
+
+def get_f1(matches, gold_edges, system_edges):
+    precision = matches / system_edges if system_edges else 0.
+    recall = matches / gold_edges if gold_edges else 0.
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.
+    return precision, recall, f1
+
+
+def get_aligned_rows(gold_corpus, system_corpus, gold_sentences, system_sentences, alignment):
+    """
+    Maps every token row of the gold corpus to the row of its aligned system token, or -1.
+
+    Returns:
+        aligned_rows: int64 array with one entry per gold token row.
+    """
+
+    aligned_rows = np.full(gold_corpus.num_tokens, -1, dtype=np.int64)
+    gold_offsets = gold_corpus.sentence_offsets.tolist()
+    system_offsets = system_corpus.sentence_offsets.tolist()
+
+    for gold_index, system_index, _ in alignment.pairs:
+        gold_sentence = gold_sentences[gold_index]
+        system_sentence = system_sentences[system_index]
+        # rows are 0-based without ROOT, positions are 1-based after ROOT
+        gold_start = gold_offsets[gold_index] - 1
+        system_start = system_offsets[system_index] - 1
+        for gold_id, system_id in align_tokens(gold_sentence, system_sentence).items():
+            if gold_id != "0":
+                aligned_rows[gold_start + gold_sentence.id_index[gold_id]] = system_start + system_sentence.id_index[system_id]
+
+    return aligned_rows
+
+
+def get_label_map(corpus, label_ids, labels):
+    """Maps the symbol IDs of the enhanced labels of a corpus to IDs in the shared label vocab."""
+
+    label_map = np.full(len(corpus.symbols), -1, dtype=np.int64)
+    for symbol_id in np.unique(corpus.edge_labels).tolist():
+        label = corpus.symbols[symbol_id]
+        label_id = label_ids.get(label)
+        if label_id is None:
+            label_id = label_ids[label] = len(labels)
+            labels.append(label)
+        label_map[symbol_id] = label_id
+    return label_map
+
+
+def get_edge_heads(corpus, head_rows=None):
+    """
+    Returns the head of every edge of the corpus as a corpus-wide code: 0 for ROOT, otherwise the
+    row of the head token plus one. With head_rows (e.g. gold rows mapped to system rows), -1
+    marks a head which is not aligned.
+    """
+
+    edge_tokens = corpus.edge_tokens()
+    sentence_starts = np.repeat(corpus.sentence_offsets[:-1], np.diff(corpus.sentence_offsets))
+    rows = sentence_starts[edge_tokens] + corpus.edge_heads - 1
+    if head_rows is not None:
+        rows = np.where(corpus.edge_heads == 0, 0, head_rows[rows.clip(0)])
+    return np.where(corpus.edge_heads == 0, 0, np.where(rows < 0, -1, rows + 1))
+
+
+class AlignedEdges(object):
+    """
+    AlignedEdges
+
+    The enhanced edges of a gold and a system corpus as integer arrays. The dependent and head of
+    every edge are encoded in system rows, as one arc key per edge, so a gold and a system edge
+    between aligned words have equal arc keys. Labels are IDs in the vocab shared by both corpora.
+
+    Params:
+        labels: the enhanced labels of both corpora.
+        gold_labels: label ID of every gold edge.
+        is_aligned: whether both words of each gold edge are aligned to system words.
+        gold_arcs: arc key of every aligned gold edge.
+        system_arcs: arc key of every system edge.
+        system_labels: label ID of every system edge.
+    """
+
+    def __init__(self, labels, gold_labels, is_aligned, gold_arcs, system_arcs, system_labels):
+        self.labels = labels
+        self.gold_labels = gold_labels
+        self.is_aligned = is_aligned
+        self.gold_arcs = gold_arcs
+        self.system_arcs = system_arcs
+        self.system_labels = system_labels
+
+    @property
+    def aligned_gold_labels(self):
+        return self.gold_labels[self.is_aligned]
+
+
+def encode_edges(gold_corpus, system_corpus, gold_sentences, system_sentences, alignment=None):
+    """
+    Encodes the enhanced edges of a gold and a system corpus for matching.
+
+    Arguments:
+        gold_corpus, system_corpus: ConlluCorpus objects built from the sentences below.
+        gold_sentences, system_sentences: lists of ConlluSentence objects, for the alignment.
+        alignment: optional SentenceAlignment, see align.py.
+
+    Returns:
+        edges: an AlignedEdges.
+    """
+
+    if alignment is None:
+        alignment = align_sentences(gold_sentences, system_sentences)
+    aligned_rows = get_aligned_rows(gold_corpus, system_corpus, gold_sentences, system_sentences, alignment)
+
+    labels = []
+    label_ids = {}
+    gold_labels = get_label_map(gold_corpus, label_ids, labels)[gold_corpus.edge_labels]
+    system_labels = get_label_map(system_corpus, label_ids, labels)[system_corpus.edge_labels]
+
+    # both sides are encoded in system rows, so the keys of matching edges are equal
+    gold_dependents = aligned_rows[gold_corpus.edge_tokens()]
+    gold_heads = get_edge_heads(gold_corpus, aligned_rows)
+    is_aligned = (gold_dependents >= 0) & (gold_heads >= 0)
+    system_dependents = system_corpus.edge_tokens().astype(np.int64)
+    system_heads = get_edge_heads(system_corpus)
+
+    num_heads = system_corpus.num_tokens + 1
+    gold_arcs = gold_dependents[is_aligned] * num_heads + gold_heads[is_aligned]
+    system_arcs = system_dependents * num_heads + system_heads
+
+    return AlignedEdges(labels, gold_labels, is_aligned, gold_arcs, system_arcs, system_labels)
+
+
+def encode_sentences(gold_sentences, system_sentences, alignment=None):
+    """Encodes the edges of annotated sentences, e.g. the output of read_conll, see encode_edges."""
+
+    return encode_edges(ConlluCorpus.from_sentences(gold_sentences), ConlluCorpus.from_sentences(system_sentences),
+                        gold_sentences, system_sentences, alignment)
+
+
+def score_edges(edges):
+    """
+    Scores the encoded enhanced edges of a system corpus against a gold corpus.
+
+    Arguments:
+        edges: an AlignedEdges, see encode_edges.
+
+    Returns:
+        scores: an EnhancedScores.
+    """
+
+    labels = edges.labels
+    gold_labels = edges.aligned_gold_labels
+    universal_ids = {}
+    universal_labels = np.array([universal_ids.setdefault(get_universal_label(label), len(universal_ids)) for label in labels],
+                                dtype=np.int64)
+
+    matches = {}
+    _, matched = count_matches(edges.gold_arcs, edges.system_arcs)
+    matches["EUAS"] = int(matched.sum())
+
+    num_universal = max(len(universal_ids), 1)
+    _, matched = count_matches(edges.gold_arcs * num_universal + universal_labels[gold_labels],
+                               edges.system_arcs * num_universal + universal_labels[edges.system_labels])
+    matches["EULAS"] = int(matched.sum())
+
+    num_labels = max(len(labels), 1)
+    matched_keys, matched = count_matches(edges.gold_arcs * num_labels + gold_labels,
+                                          edges.system_arcs * num_labels + edges.system_labels)
+    matches["ELAS"] = int(matched.sum())
+
+    return EnhancedScores(labels,
+                          np.bincount(edges.gold_labels, minlength=len(labels)),
+                          np.bincount(edges.system_labels, minlength=len(labels)),
+                          np.bincount(matched_keys % num_labels, weights=matched, minlength=len(labels)).astype(np.int64),
+                          matches)
+
+
+def score_sentences(gold_sentences, system_sentences, alignment=None):
+    """Scores annotated sentences, e.g. the output of read_conll, see encode_edges."""
+
+    return score_edges(encode_sentences(gold_sentences, system_sentences, alignment))
+
+
+def log_scores(scores, num_labels=None):
+    """Prints the scores of each metric and the per-label scores of the num_labels most frequent gold labels."""
+
+    print(f"enhanced edges: {scores.gold_edges} gold, {scores.system_edges} system")
+    for metric in METRICS:
+        precision, recall, f1 = scores.score(metric)
+        print(f"{metric}: precision {precision:.4f}, recall {recall:.4f}, f1 {f1:.4f}")
+
+    if num_labels != 0:
+        print(f"{'label':24} {'gold':>8} {'system':>8} {'precision':>9} {'recall':>9} {'f1':>9}")
+        for label, (gold_edges, system_edges, precision, recall, f1) in list(scores.label_scores().items())[:num_labels]:
+            print(f"{label:24} {gold_edges:8} {system_edges:8} {precision:9.4f} {recall:9.4f} {f1:9.4f}")
+
+
+def check_reference(gold_sentences, system_sentences, alignment, scores):
+    """Checks that the vectorised matches agree with the per-sentence comparison of align.py."""
+
+    _, counts = evaluate_aligned(gold_sentences, system_sentences, alignment)
+    identical = counts["labelled_matches"] == scores.matches["ELAS"] \
+                and counts["unlabelled_matches"] == scores.matches["EUAS"]
+    print(f"vectorised matches {'identical to' if identical else 'DIFFER from'} the per-sentence comparison")
+    return identical
+
+
+def argparser():
+    from argparse import ArgumentParser
+    ap = ArgumentParser()
+    ap.add_argument('-g', '--gold', type=str,
+    help='Gold CoNLL-U file.')
+    ap.add_argument('-s', '--system', type=str,
+    help='System CoNLL-U file.')
+    ap.add_argument('-n', '--num-labels', type=int, default=None,
+    help='Number of (most frequent) labels to list the scores of, all by default.')
+    ap.add_argument('--check', default=False, action='store_true',
+    help='Check the matches against the per-sentence comparison of align.py.')
+    return ap
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+
+    gold_sentences, _ = read_conll(args.gold)
+    system_sentences, _ = read_conll(args.system)
+    alignment = align_sentences(gold_sentences, system_sentences)
+    print(alignment.summary())
+
+    scores = score_sentences(gold_sentences, system_sentences, alignment)
+    log_scores(scores, args.num_labels)
+
+    if args.check and not check_reference(gold_sentences, system_sentences, alignment, scores):
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -15,6 +15,9 @@ do
     primarys[$p]=1
 done
 
+# 1) convert all the gold conllu files to plaintext at once, in a pool of processes
+python conllugraph/batch.py convert -d ${DATA_DIR} -- --mode gold-to-plainsen --skip-mwt
+
 for tbid in $TBIDS; do
    echo "** $tbid **"
    
@@ -34,9 +37,6 @@ for tbid in $TBIDS; do
 
         echo "using $language for trankit"
 
-        # 1) convert gold conllu to plaintext
-        python conllugraph/conllu_to_text.py -i ${gold_filepath} --mode gold-to-plainsen --skip-mwt
-
         # 2) predict with trankit
         python scripts/trankitpip.py data/train-dev-gold-to-plainsen/${tb_name}/${tbid}-ud-${ftype}.conllu $language trankit_predicted/${tbid}-ud-${ftype}.conllu
 
@@ -10,49 +10,35 @@ TBIDS=$(echo $1 | tr '-' ' ')
 
 out_file=$1_log.txt
 
-arr=(bg_btb nl_alpino nl_lassysmall en_ewt fr_sequoia it_isdt lv_lvtb pl_lfg sv_talbanken)
-
-# tbids which attach morphological case
-arr_mc=(ar_padt cs_cac cs_fictree cs_pdt et_edt fi_tdt  lt_alksnis pl_pdb ru_syntagrus sk_snk ta_ttb uk_iu)
-
-if [ -e "$out_file" ]; then
-    rm $out_file
-else 
-    touch $out_file
-fi 
-
-for tbid in $TBIDS ; do
-  echo $tbid
-  
-  if [[ " ${arr[*]} " == *" $tbid "* ]]; then
-    echo "not attaching morph case"
-    extra_args=""
-  elif [[ " ${arr_mc[*]} " == *" $tbid "* ]]; then
-    echo "attaching morph case"
-    extra_args="--attach_morphological_case"
-  fi
-
-  echo $'\n'"--------------------" >> ${out_file}
-  echo "$tbid" >> ${out_file}
-  echo "--------------------"$'\n' >> ${out_file}
-  echo $'\n'"with extra args: ${extra_args}" >> ${out_file}
-  
-  for filepath in ${DATA_DIR}/UD_*/${tbid}-ud-train*.conllu; do
-    dir=`dirname ${filepath}`        # e.g. /home/user/ud-treebanks-v2.2/UD_Afrikaans-AfriBooms
-    tb_name=`basename ${dir}`        # e.g. UD_Afrikaans-AfriBooms
-
-    GOLD=${DATA_DIR}/${tb_name}/${tbid}-ud-test.conllu
-    SYSTEM=${DATA_DIR}/sysoutputs/adapt/test/pertreebank/$tbid-ud-test-sys.conllu
-
-    if [ "$tbid" == "fr_sequoia" ]; then
-      GOLD=${DATA_DIR}/${tb_name}/${tbid}-ud-test.fulldeps.conllu
-    fi
-
-    python run.py \
-      -g ${GOLD} \
-      -s ${SYSTEM} \
-      --evaluate_edges \
-      --evaluate_labels \
-      ${extra_args} >> ${out_file}
-  done
-done
+# optionally cache parsed files between runs, e.g. CACHE_DIR=.conllu_cache ./scripts/run.sh en_ewt
+cache_args=""
+if [ -n "$CACHE_DIR" ]; then
+  cache_args="--cache-dir ${CACHE_DIR}"
+fi
+
+# the system outputs are evaluated against one parse of each gold file, e.g. all the systems with
+# SYSTEMS="data/iwpt2020stdata/sysoutputs/*/test/pertreebank" ./scripts/run.sh en_ewt
+SYSTEMS=${SYSTEMS:-"${DATA_DIR}/sysoutputs/adapt/test/pertreebank"}
+# number of treebanks evaluated at the same time, one per CPU by default
+WORKERS=${WORKERS:-0}
+
+# whether to attach morphological case is no longer listed per tbid: run.py takes the decision
+# from the treebank profile of the gold file, which is computed on its first run and stored next to it
+
+# one Python process per worker rather than one per treebank, the largest treebanks first;
+# the output of each treebank goes to ${out_file} and the scores of all of them to metadata.csv
+workers_args=""
+if [ "$WORKERS" -gt 0 ]; then
+  workers_args="--workers ${WORKERS}"
+fi
+
+python batch.py evaluate \
+  -d ${DATA_DIR} \
+  --tbids ${TBIDS} \
+  -s "${SYSTEMS}" \
+  --log ${out_file} \
+  ${workers_args} \
+  -- \
+  --evaluate_edges \
+  --evaluate_labels \
+  ${cache_args}
@@ -0,0 +1,191 @@
+import sys
+import os
+import json
+import mmap
+import random
+
+from utils import parse_sentence, get_codec
+
+SENT_ID_PREFIX = b"# sent_id = "
+
+
+def scan_sentences(filename):
+    """
+    Scans a CoNLL-U file once, in binary mode, for the byte range and sent_id of every sentence.
+
+    Arguments:
+        filename: relative path of input file.
+
+    Returns:
+        starts: byte offset of the first line of each sentence.
+        ends: byte offset just after the last line of each sentence.
+        sent_ids: the sent_id of each sentence, or None if it has none.
+    """
+
+    starts, ends, sent_ids = [], [], []
+    in_sentence = False
+    offset = 0
+
+    with open(filename, "rb") as f:
+        for line in f:
+            if line.rstrip(b"\r\n"):
+                if not in_sentence:
+                    starts.append(offset)
+                    sent_ids.append(None)
+                    in_sentence = True
+                if line.startswith(SENT_ID_PREFIX):
+                    sent_ids[-1] = line[len(SENT_ID_PREFIX):].strip().decode("utf-8")
+            elif in_sentence:
+                ends.append(offset)
+                in_sentence = False
+            offset += len(line)
+
+    # End of file
+    if in_sentence:
+        ends.append(offset)
+
+    return starts, ends, sent_ids
+
+
+class SentenceIndex(object):
+    """
+    SentenceIndex
+
+    Byte-offset index over the sentences of a CoNLL-U file, stored next to it as <file>.sentidx.
+    Sentences can be read by ordinal or sent_id through mmap, without loading the whole file.
+    """
+    SUFFIX = ".sentidx"
+
+    def __init__(self, filename, starts, ends, sent_ids):
+        self.filename = filename
+        self.starts = starts
+        self.ends = ends
+        self.sent_ids = sent_ids
+        self.ordinals = {sent_id: ordinal for ordinal, sent_id in enumerate(sent_ids) if sent_id is not None}
+        self._file = None
+        self._mmap = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def build(cls, filename):
+        """Scans the file and stores the index next to it."""
+
+        if get_codec(filename):
+            raise ValueError(f"{filename} is compressed, random access needs an uncompressed file")
+
+        stat = os.stat(filename)
+        starts, ends, sent_ids = scan_sentences(filename)
+        index = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "starts": starts,
+            "ends": ends,
+            "sent_ids": sent_ids,
+        }
+        # written through a temporary file of this process, so neither a crash nor another process
+        # building the same index at the same time leaves a partial index under the final name
+        index_path = filename + cls.SUFFIX
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+
+        return cls(filename, starts, ends, sent_ids)
+
+    @classmethod
+    def load(cls, filename):
+        """Loads the stored index of a file, rebuilding it if it is missing or the file has changed."""
+
+        stat = os.stat(filename)
+        try:
+            with open(filename + cls.SUFFIX, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return cls.build(filename)
+
+        if index["size"] != stat.st_size or index["mtime"] != stat.st_mtime:
+            return cls.build(filename)
+
+        return cls(filename, index["starts"], index["ends"], index["sent_ids"])
+
+    def read_bytes(self, ordinal):
+        """Returns the raw lines of a sentence."""
+
+        start, end = self.starts[ordinal], self.ends[ordinal]
+        if self._mmap is None:
+            self._file = open(self.filename, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap[start:end]
+
+    def read_sentence(self, ordinal, skip_mwt=False):
+        """Parses the sentence with the given ordinal (counted from 0) into a ConlluSentence."""
+
+        lines = self.read_bytes(ordinal).decode("utf-8").split("\n")
+        return parse_sentence([line.rstrip("\r") for line in lines if line.rstrip("\r")], skip_mwt)
+
+    def read_sent_id(self, sent_id, skip_mwt=False):
+        """Parses the sentence with the given sent_id into a ConlluSentence."""
+
+        return self.read_sentence(self.ordinals[sent_id], skip_mwt)
+
+    def sample(self, k, seed=None, skip_mwt=False):
+        """Parses k randomly chosen sentences, in file order."""
+
+        ordinals = sorted(random.Random(seed).sample(range(len(self)), k))
+        return [self.read_sentence(ordinal, skip_mwt) for ordinal in ordinals]
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+            self._file = None
+
+
+def argparser():
+    from argparse import ArgumentParser
+    ap = ArgumentParser()
+    ap.add_argument('-i', '--input', type=str,
+    help='Input CoNLL-U file.')
+    ap.add_argument('-n', '--sentence-number', type=int, default=None,
+    help='Print the sentence with this ordinal (counted from 1).')
+    ap.add_argument('--sent-id', type=str, default=None,
+    help='Print the sentence with this sent_id.')
+    ap.add_argument('--sample', type=int, default=None,
+    help='Print this many randomly chosen sentences.')
+    ap.add_argument('--seed', type=int, default=None,
+    help='Random seed for --sample.')
+    return ap
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+
+    sentence_index = SentenceIndex.load(args.input)
+    print(f"{len(sentence_index)} sentences in {args.input}", file=sys.stderr)
+
+    if args.sentence_number is not None:
+        sentences = [sentence_index.read_sentence(args.sentence_number - 1)]
+    elif args.sent_id is not None:
+        sentences = [sentence_index.read_sent_id(args.sent_id)]
+    elif args.sample is not None:
+        sentences = sentence_index.sample(args.sample, args.seed)
+    else:
+        sentences = []
+
+    for sentence in sentences:
+        for line in sentence.comments:
+            print(line)
+        for conllu_token in sentence[1:]:
+            print(str(conllu_token))
+        print()
+
+    sentence_index.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,328 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import selectors
+from collections import Counter
+from contextlib import redirect_stdout
+
+from api import LexicalisationPipeline
+from utils import format_sentence
+
+"""
+Long-running delexicalisation/relexicalisation service, which loads the treebank profile and the
+rewrite rules once and then answers requests on stdin or on a Unix socket, e.g.:
+
+python conllugraph/service.py -t data/train-dev/UD_Finnish-TDT/fi_tdt-ud-train.conllu --socket /tmp/delex.sock
+
+A request is a command line ("delexicalise", "relexicalise" or "stats"), followed by the CoNLL-U
+lines of its sentences and a line with a single "." which ends the request. The response is the
+transformed CoNLL-U text (the JSON statistics for "stats", or a line starting with "error:"),
+again ended by a "." line. All the requests which are complete after a read are handled as one
+batch, so the sentences of many small requests are transformed together.
+"""
+
+END = "."
+
+COMMANDS = ("delexicalise", "relexicalise", "stats")
+
+
+class LatencyHistogram(object):
+    """
+    LatencyHistogram
+
+    Counts request latencies in power-of-two buckets of microseconds, so percentiles can be
+    reported without storing every latency.
+    """
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        microseconds = seconds * 1e6
+        # the upper bound of the bucket, e.g. 100us is counted in the 128us bucket
+        bucket = 1 << max(int(microseconds) - 1, 0).bit_length()
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += microseconds
+        self.max = max(self.max, microseconds)
+
+    def percentile(self, percentage):
+        """Returns the upper bound (in microseconds) of the bucket the given percentile falls into."""
+
+        target = self.count * percentage / 100
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                return bucket
+        return 0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": round(self.total / self.count, 1) if self.count else 0.0,
+            "max_us": round(self.max, 1),
+            "p50_us": self.percentile(50),
+            "p90_us": self.percentile(90),
+            "p99_us": self.percentile(99),
+            "buckets_us": {f"<={bucket}": self.buckets[bucket] for bucket in sorted(self.buckets)},
+        }
+
+
+class RequestReader(object):
+    """Splits the bytes received on a stream into complete (command, CoNLL-U text) requests."""
+
+    def __init__(self):
+        self.buffer = b""
+        self.command = None
+        self.lines = []
+
+    def feed(self, data):
+        """Adds the received bytes and returns the requests they complete."""
+
+        *complete_lines, self.buffer = (self.buffer + data).split(b"\n")
+        requests = []
+
+        for line in complete_lines:
+            line = line.decode("utf-8").rstrip("\r")
+            if self.command is None:
+                # blank lines between requests are skipped
+                if line.strip():
+                    self.command = line.strip()
+            elif line == END:
+                requests.append((self.command, "\n".join(self.lines)))
+                self.command = None
+                self.lines = []
+            else:
+                self.lines.append(line)
+
+        return requests
+
+
+class LexicalisationService(object):
+    """
+    LexicalisationService
+
+    Answers batches of requests with a preloaded LexicalisationPipeline and keeps the latency
+    histogram of the requests and the sizes of the batches.
+
+    Params:
+        pipeline: the LexicalisationPipeline, see api.py.
+        max_batch: maximum number of requests which are transformed together.
+    """
+
+    def __init__(self, pipeline, max_batch=64):
+        self.pipeline = pipeline
+        self.max_batch = max_batch
+        self.latencies = LatencyHistogram()
+        self.batch_sizes = Counter()
+
+    def transform(self, command, texts):
+        """Transforms the texts of several requests with one pipeline call and returns the text of each."""
+
+        parsed = [self.pipeline.parse(text) for text in texts]
+        sentences = [sentence for request_sentences in parsed for sentence in request_sentences]
+        if command == "delexicalise":
+            sentences = self.pipeline.delexicalise(sentences)
+        else:
+            sentences = self.pipeline.relexicalise(sentences)
+
+        outputs = []
+        offset = 0
+        for request_sentences in parsed:
+            outputs.append("".join(format_sentence(sentence) for sentence in sentences[offset:offset + len(request_sentences)]))
+            offset += len(request_sentences)
+
+        return outputs
+
+    def handle_batch(self, requests):
+        """
+        Answers a batch of (command, text) requests.
+
+        Returns:
+            responses: the response to each request, including the line which ends it.
+        """
+
+        self.batch_sizes[len(requests)] += 1
+        responses = [None] * len(requests)
+
+        for command in ("delexicalise", "relexicalise"):
+            indices = [index for index, (request_command, _) in enumerate(requests) if request_command == command]
+            if not indices:
+                continue
+            try:
+                outputs = self.transform(command, [requests[index][1] for index in indices])
+            except Exception:
+                # answer the requests one by one, so one malformed request does not fail the whole batch
+                outputs = []
+                for index in indices:
+                    try:
+                        outputs.extend(self.transform(command, [requests[index][1]]))
+                    except Exception as e:
+                        outputs.append(f"error: {type(e).__name__}: {e}\n")
+            for index, output in zip(indices, outputs):
+                responses[index] = output
+
+        for index, (command, _) in enumerate(requests):
+            if command == "stats":
+                responses[index] = json.dumps(self.stats()) + "\n"
+            elif command not in COMMANDS:
+                responses[index] = f"error: unknown command {command}, expected one of {', '.join(COMMANDS)}\n"
+
+        return [response + END + "\n" for response in responses]
+
+    def handle(self, requests, received, send):
+        """
+        Answers the requests in batches of at most max_batch and records their latencies.
+
+        Arguments:
+            requests: list of (client, request) pairs, where request is a (command, text) pair.
+            received: perf_counter time at which the requests were received.
+            send: function which sends a response (as bytes) to a client.
+        """
+
+        for start in range(0, len(requests), self.max_batch):
+            batch = requests[start:start + self.max_batch]
+            responses = self.handle_batch([request for _, request in batch])
+            for (client, _), response in zip(batch, responses):
+                send(client, response.encode("utf-8"))
+                self.latencies.add(time.perf_counter() - received)
+
+    def stats(self):
+        return {
+            "latency": self.latencies.summary(),
+            "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+        }
+
+
+def serve_stream(service, infile, outfile):
+    """Answers the requests read from a stream (e.g. stdin) until it is closed."""
+
+    reader = RequestReader()
+    fd = infile.fileno()
+
+    def send(_, response):
+        outfile.write(response)
+
+    while True:
+        # read whatever is available, rather than a line at a time, so requests can be batched
+        data = os.read(fd, 1 << 16)
+        if not data:
+            break
+        received = time.perf_counter()
+        service.handle([(None, request) for request in reader.feed(data)], received, send)
+        outfile.flush()
+
+
+def serve_socket(service, path):
+    """Answers the requests of any number of clients on a Unix socket, until interrupted or terminated."""
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, terminate)
+
+    if os.path.exists(path):
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    print(f"Listening on {path}", file=sys.stderr)
+
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    readers = {}
+
+    def send(connection, response):
+        try:
+            connection.sendall(response)
+        except OSError:
+            pass
+
+    try:
+        while True:
+            requests = []
+            for key, _ in selector.select():
+                if key.fileobj is server:
+                    connection, _ = server.accept()
+                    selector.register(connection, selectors.EVENT_READ)
+                    readers[connection] = RequestReader()
+                    continue
+
+                connection = key.fileobj
+                try:
+                    data = connection.recv(1 << 16)
+                except OSError:
+                    data = b""
+                if not data:
+                    selector.unregister(connection)
+                    del readers[connection]
+                    connection.close()
+                    continue
+                requests.extend((connection, request) for request in readers[connection].feed(data))
+
+            # the requests of all the clients which are ready are answered as one batch
+            if requests:
+                service.handle(requests, time.perf_counter(), send)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for connection in readers:
+            connection.close()
+        server.close()
+        os.remove(path)
+
+
+def request(path, command, text=""):
+    """Sends one request to a service listening on a Unix socket and returns the response."""
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall(f"{command}\n{text.rstrip()}\n{END}\n".encode("utf-8"))
+        response = b""
+        while not response.endswith(f"\n{END}\n".encode("utf-8")) and response != f"{END}\n".encode("utf-8"):
+            data = client.recv(1 << 16)
+            if not data:
+                break
+            response += data
+
+    return response.decode("utf-8")[:-len(END) - 1]
+
+
+def argparser():
+    from argparse import ArgumentParser
+    ap = ArgumentParser()
+    ap.add_argument('-t', '--treebank', type=str,
+    help='Treebank whose profile (morphological case decision and forbidden list) is used.')
+    ap.add_argument('--socket', type=str, default=None,
+    help='Path of the Unix socket to listen on, otherwise requests are read from stdin.')
+    ap.add_argument('--max-batch', type=int, default=64,
+    help='Maximum number of requests which are transformed together.')
+    return ap
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+
+    # stdout carries the responses, so everything else goes to stderr
+    with redirect_stdout(sys.stderr):
+        pipeline = LexicalisationPipeline.from_treebank(args.treebank)
+        service = LexicalisationService(pipeline, args.max_batch)
+
+        if args.socket:
+            serve_socket(service, args.socket)
+        else:
+            serve_stream(service, sys.stdin, sys.__stdout__.buffer)
+
+        print(json.dumps(service.stats()))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
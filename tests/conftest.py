@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# the modules of the package import each other as top-level modules, e.g. "from graph import ConlluSentence"
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+DATA_DIR = os.path.join(TESTS_DIR, "data")
+
+
+@pytest.fixture
+def sample_file():
+    """A small treebank with coordinations, elided tokens, a multi-word token and a sentence without comments."""
+    return os.path.join(DATA_DIR, "en_sample-ud-train.conllu")
+
+
+@pytest.fixture
+def sample_text(sample_file):
+    with open(sample_file, encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,29 @@
+import os
+import shutil
+
+import pytest
+
+import batch
+
+
+@pytest.fixture
+def data_dir(sample_file, tmp_path):
+    data_dir = tmp_path / "data"
+    (data_dir / "UD_Sample").mkdir(parents=True)
+    shutil.copy(sample_file, data_dir / "UD_Sample" / os.path.basename(sample_file))
+    return str(data_dir)
+
+
+@pytest.mark.parametrize("job_args", [["--workers", "2"], ["--parse-workers=2"]])
+def test_pool_options_of_the_job_are_rejected(data_dir, job_args, capsys, monkeypatch):
+    monkeypatch.setattr(batch, "get_tasks", lambda args, job_args: pytest.fail("no task should be started"))
+
+    assert batch.main(["batch.py", "delexicalise", "-d", data_dir, "--"] + job_args) == 1
+    assert "cannot be passed on to the job" in capsys.readouterr().out
+
+
+def test_delexicalise(data_dir, capsys):
+    assert batch.main(["batch.py", "delexicalise", "-d", data_dir, "--workers", "1", "--", "-q"]) == 0
+    assert "done" in capsys.readouterr().out
+    output_dir = os.path.join(os.path.dirname(data_dir), "data-delexicalised", "UD_Sample")
+    assert os.listdir(output_dir) == ["en_sample-ud-train.conllu"]
@@ -0,0 +1,69 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from cache import get_entry_path, load_corpus
+from conllugraph import ConlluGraph
+from utils import format_sentence, read_conll
+
+
+@pytest.fixture
+def treebank(sample_file, tmp_path):
+    filename = tmp_path / os.path.basename(sample_file)
+    shutil.copy(sample_file, filename)
+    return str(filename)
+
+
+def get_text(annotated_sentences):
+    return "".join(format_sentence(sentence) for sentence in annotated_sentences)
+
+
+def test_cached_parse_equals_parse(treebank, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    annotated_sentences, _ = read_conll(treebank)
+    for _ in range(2):
+        conllu_graph = ConlluGraph()
+        cached_sentences, vocab, _ = conllu_graph.build_dataset(treebank, cache_dir=cache_dir)
+        assert get_text(cached_sentences) == get_text(annotated_sentences)
+        assert conllu_graph.corpus.num_tokens == sum(len(sentence) - 1 for sentence in annotated_sentences)
+        assert "obl:to" in vocab["edeprels"]
+
+    # a parse which is not cached has no corpus
+    conllu_graph.build_dataset(treebank)
+    assert conllu_graph.corpus is None
+
+
+def test_touched_file_keeps_its_entry(treebank, tmp_path, capsys):
+    cache_dir = str(tmp_path / "cache")
+    load_corpus(treebank, cache_dir)
+    stat = os.stat(treebank)
+    os.utime(treebank, (stat.st_atime, stat.st_mtime + 10))
+    capsys.readouterr()
+
+    load_corpus(treebank, cache_dir)
+    assert "contents unchanged" in capsys.readouterr().out
+    entry_path = get_entry_path(treebank, cache_dir)
+    with open(os.path.join(entry_path, "meta.json"), encoding="utf-8") as f:
+        assert json.load(f)["mtime"] == os.stat(treebank).st_mtime
+    assert not os.path.exists(os.path.join(entry_path, "meta.json.tmp"))
+
+    load_corpus(treebank, cache_dir)
+    assert "contents unchanged" not in capsys.readouterr().out
+
+
+def test_changed_file_rebuilds_its_entry(treebank, tmp_path, capsys):
+    cache_dir = str(tmp_path / "cache")
+    load_corpus(treebank, cache_dir)
+    with open(treebank, "r+", encoding="utf-8") as f:
+        text = f.read()
+        f.seek(0)
+        # same size, other contents
+        f.write(text.replace("store", "shops"))
+    capsys.readouterr()
+
+    corpus, _ = load_corpus(treebank, cache_dir)
+    assert "stale" in capsys.readouterr().out
+    assert corpus.symbol_id("shops") >= 0
+    assert corpus.symbol_id("store") == -1
@@ -0,0 +1,32 @@
+import os
+import shutil
+
+import conllu_to_text
+from utils import iter_conll
+
+
+def test_copy_basic_to_misc_aligns_tokens(sample_file):
+    copy_conllu = conllu_to_text.CopyConllu()
+    output_sentences = list(copy_conllu.copy_basic_to_misc(iter_conll(sample_file, skip_mwt=True),
+                                                           iter_conll(sample_file, skip_mwt=True)))
+
+    gold_sentences = list(iter_conll(sample_file, skip_mwt=True))
+    assert len(output_sentences) == len(gold_sentences)
+    for output_sentence, gold_sentence in zip(output_sentences, gold_sentences):
+        # no ROOT in the output, and each token has its own head and label
+        assert [token.misc for token in output_sentence] == [f"Head={token.head}|Label={token.deprel}" for token in gold_sentence[1:]]
+
+
+def test_pred_to_misc(sample_file, tmp_path):
+    # the output is written to <data>-pred-to-misc/<treebank>/<file>
+    input_file = tmp_path / "data" / "UD_Sample" / os.path.basename(sample_file)
+    input_file.parent.mkdir(parents=True)
+    shutil.copy(sample_file, input_file)
+
+    assert conllu_to_text.main(["conllu_to_text.py", "-i", str(input_file), "-s", str(input_file),
+                                "--mode", "pred-to-misc", "--skip-mwt"]) == 0
+
+    output_file = tmp_path / "data-pred-to-misc" / "UD_Sample" / input_file.name
+    lines = [line.split("\t") for line in output_file.read_text().split("\n") if line]
+    assert lines
+    assert all(columns[9] == f"Head={columns[6]}|Label={columns[7]}" for columns in lines)
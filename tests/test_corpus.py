@@ -0,0 +1,27 @@
+from conllugraph import ConlluGraph
+from corpus import ConlluCorpus
+from evaluate import EvaluateConllu
+from utils import buildVocab, format_sentence, read_conll
+
+
+def test_to_sentences_round_trip(sample_file):
+    annotated_sentences, _ = read_conll(sample_file)
+    corpus = ConlluCorpus.from_sentences(annotated_sentences)
+    assert len(corpus) == len(annotated_sentences)
+    assert corpus.num_tokens == sum(len(sentence) - 1 for sentence in annotated_sentences)
+
+    sentences = corpus.to_sentences()
+    assert [format_sentence(sentence) for sentence in sentences] == [format_sentence(sentence) for sentence in annotated_sentences]
+    # the elided token is found through the rebuilt ID index, with its dependents
+    assert [child.word for child in sentences[1].get_token("5.1").children] == [",", "John", "pears"]
+
+
+def test_vectorised_statistics_equal_the_per_sentence_ones(sample_file):
+    annotated_sentences, _ = read_conll(sample_file)
+    corpus = ConlluCorpus.from_sentences(annotated_sentences)
+
+    assert corpus.build_vocab() == buildVocab(annotated_sentences)
+
+    sentence_graphs = ConlluGraph().build_edges(annotated_sentences)
+    edge_count, dummy_root_count, *_ = EvaluateConllu(True, False, False, False).evaluate(sentence_graphs, annotated_sentences)
+    assert EvaluateConllu(True, False, False, False).evaluate_corpus_heads(corpus) == (edge_count, dummy_root_count)
@@ -0,0 +1,88 @@
+import gzip
+import os
+
+import pytest
+
+import delexicalise_enhanced_dependencies
+from api import LexicalisationPipeline
+from benchmark import check_reference
+from delexicalise_enhanced_dependencies import DelexicaliseConllu
+from utils import format_sentence, get_codec, iter_conll, open_conll
+
+
+def get_deps(text):
+    return [line.split("\t")[8] for line in text.split("\n") if line and not line.startswith("#")]
+
+
+def test_only_modifiers_attached_to_the_token_delexicalise_it():
+    # "near" is a case dependent of Rome, but only an advmod dependent of Paris
+    sentence = ("1\tHe\the\tPRON\t_\t_\t2\tnsubj\t2:nsubj\t_\n"
+                "2\tlives\tlive\tVERB\t_\t_\t0\troot\t0:root\t_\n"
+                "3\tnear\tnear\tADP\t_\t_\t5\tcase\t4:advmod|5:case\t_\n"
+                "4\tParis\tParis\tPROPN\t_\t_\t2\tobl\t2:obl:near\t_\n"
+                "5\tRome\tRome\tPROPN\t_\t_\t2\tobl\t2:obl:near\t_\n\n")
+    pipeline = LexicalisationPipeline(False, [])
+    delexicalised = pipeline.delexicalise_text(sentence)
+
+    assert get_deps(delexicalised)[3:] == ["2:obl:near", "2:obl:<case_delex>"]
+    assert pipeline.relexicalise_text(delexicalised) == sentence
+
+
+# the morphological case is attached after the lemma, e.g. obl:in:loc
+MORPH_CASE_SENTENCE = ("1\tHe\the\tPRON\t_\tCase=Nom\t2\tnsubj\t2:nsubj\t_\n"
+                       "2\tlives\tlive\tVERB\t_\t_\t0\troot\t0:root\t_\n"
+                       "3\tin\tin\tADP\t_\t_\t4\tcase\t4:case\t_\n"
+                       "4\tRome\tRome\tPROPN\t_\tCase=Loc\t2\tobl\t2:obl:in:loc\t_\n"
+                       "5\tand\tand\tCCONJ\t_\t_\t6\tcc\t6:cc\t_\n"
+                       "6\tParis\tParis\tPROPN\t_\tCase=Loc\t4\tconj\t2:obl:in:loc|4:conj:and\t_\n\n")
+
+
+def get_fused_and_reference_outputs(filename, attach_morphological_case):
+    outputs = []
+    for reference in (False, True):
+        delexicalise_conllu = DelexicaliseConllu(attach_morphological_case, False, [], reference)
+        delexicalised_sentences, *counts = delexicalise_conllu.delexicalise(iter_conll(filename))
+        outputs.append(("".join(format_sentence(sentence) for sentence in delexicalised_sentences), counts))
+    return outputs
+
+
+def test_fused_pass_equals_reference_passes(sample_file):
+    (fused_text, fused_counts), (reference_text, reference_counts) = get_fused_and_reference_outputs(sample_file, False)
+
+    assert "<cc_delex>" in fused_text and "<case_delex>" in fused_text and "<mark_delex>" in fused_text
+    assert fused_text == reference_text
+    assert fused_counts == reference_counts
+
+
+def test_fused_pass_equals_reference_passes_with_morphological_case(tmp_path):
+    filename = tmp_path / "xx_morph-ud-train.conllu"
+    filename.write_text(MORPH_CASE_SENTENCE)
+    (fused_text, fused_counts), (reference_text, reference_counts) = get_fused_and_reference_outputs(filename, True)
+
+    assert get_deps(fused_text)[3:] == ["2:obl:<case_delex>:loc", "6:cc", "2:obl:in:loc|4:conj:and"]
+    assert fused_text == reference_text
+    assert fused_counts == reference_counts
+
+
+def test_benchmark_check(sample_file, capsys):
+    assert check_reference(sample_file, False, [])
+    assert "identical to" in capsys.readouterr().out
+
+
+def test_compressed_input_gives_compressed_output(sample_file, sample_text, tmp_path):
+    outputs = []
+    for name in ("plain", "gzip"):
+        input_dir = tmp_path / name / "UD_Sample"
+        input_dir.mkdir(parents=True)
+        filename = str(input_dir / os.path.basename(sample_file))
+        with open_conll(filename, "w", codec=gzip if name == "gzip" else None) as f:
+            f.write(sample_text)
+        assert delexicalise_enhanced_dependencies.main(["delexicalise_enhanced_dependencies.py", "-i", filename, "-q"]) == 0
+
+        output_file = str(tmp_path / f"{name}-delexicalised" / "UD_Sample" / os.path.basename(sample_file))
+        assert get_codec(output_file) is (gzip if name == "gzip" else None)
+        with open_conll(output_file) as f:
+            outputs.append(f.read())
+
+    assert outputs[0] == outputs[1]
+    assert "<cc_delex>" in outputs[0]
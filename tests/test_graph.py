@@ -0,0 +1,27 @@
+import pytest
+
+from graph import ConlluSentence
+from utils import iter_conll
+
+
+def test_id_index_covers_root_elided_tokens_and_ranges(sample_file):
+    sentences = list(iter_conll(sample_file))
+
+    elided = sentences[1]
+    assert elided.get_token("0") is elided[0]
+    assert elided.get_token("5.1").word == "bought"
+    assert elided.get_token("6").word == "pears"
+    # the heads of the elided token's dependents are found through the index
+    assert [child.word for child in elided.get_token("5.1").children] == [",", "John", "pears"]
+
+    mwt = sentences[2]
+    assert mwt.get_token("3-4").word == "du"
+    assert mwt.get_token(5).word == "livre"
+    with pytest.raises(KeyError):
+        mwt.get_token("7")
+
+
+def test_sentence_built_by_hand_is_indexed_on_first_lookup(sample_file):
+    sentence = ConlluSentence(next(iter_conll(sample_file)))
+    assert sentence.id_index is None
+    assert sentence.get_token("2").word == sentence[2].word
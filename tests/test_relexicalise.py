@@ -0,0 +1,75 @@
+import os
+import re
+import shutil
+
+import relexicalise_enhanced_dependencies
+from api import LexicalisationPipeline
+from treebank_profile import TreebankProfile
+from utils import iter_sentence_lines
+
+PLACEHOLDER = re.compile(r"<\w+_delex>")
+
+
+def get_deps(text):
+    return [line.split("\t")[8] for line in text.split("\n") if line and not line.startswith("#")]
+
+
+def test_round_trip_leaves_no_placeholders(sample_text):
+    pipeline = LexicalisationPipeline(False, [])
+    delexicalised = pipeline.delexicalise_text(sample_text)
+    assert PLACEHOLDER.search(delexicalised)
+
+    relexicalised = pipeline.relexicalise_text(delexicalised)
+    assert not PLACEHOLDER.search(relexicalised)
+    assert len(list(iter_sentence_lines(relexicalised.split("\n")))) == len(list(iter_sentence_lines(sample_text.split("\n"))))
+
+
+def test_round_trip_restores_lexical_labels(sample_text):
+    pipeline = LexicalisationPipeline(False, [])
+    relexicalised = pipeline.relexicalise_text(pipeline.delexicalise_text(sample_text))
+    deps = get_deps(relexicalised)
+
+    assert "2:obl:to|5:conj:and" in deps
+    assert "2:obl:in|4:conj:or" in deps
+    assert "2:obl:in_spite_of" in deps
+    assert "2:advcl:because" in deps
+    # the first conjunct has no cc of its own, delexicalisation propagated the one of its nested coordination
+    assert "2:obj|3:conj:or" in deps
+
+
+def test_unresolved_placeholders_are_dropped():
+    # e.g. a parser which predicted placeholders for words without a case or cc dependent
+    parsed = ("1\tHe\the\tPRON\t_\t_\t2\tnsubj\t2:nsubj\t_\n"
+              "2\tlives\tlive\tVERB\t_\t_\t0\troot\t0:root\t_\n"
+              "3\tParis\tParis\tPROPN\t_\t_\t2\tobl\t2:obl:<case_delex>\t_\n"
+              "4\tRome\tRome\tPROPN\t_\t_\t3\tconj\t2:obl:<case_delex>|3:conj:<cc_delex>\t_\n\n")
+    pipeline = LexicalisationPipeline(False, [])
+    relexicalised = pipeline.relexicalise_text(parsed)
+
+    assert get_deps(relexicalised) == ["2:nsubj", "0:root", "2:obl", "2:obl|3:conj"]
+    assert pipeline.relexicalise_conllu.deprel_count["unresolved placeholder dropped"] == 3
+
+
+def test_morphological_case_from_the_training_treebank(sample_file, tmp_path, monkeypatch):
+    treebank = tmp_path / "train" / "UD_Sample" / "en_sample-ud-train.conllu"
+    parsed = tmp_path / "parsed" / "UD_Sample" / "en_sample-ud-test.conllu"
+    for filename in (treebank, parsed):
+        filename.parent.mkdir(parents=True)
+        shutil.copy(sample_file, filename)
+    profile = TreebankProfile.load(str(treebank))
+    profile.attach_morphological_case = True
+    profile.save(str(treebank))
+
+    decisions = []
+
+    class RelexicaliseConllu(relexicalise_enhanced_dependencies.RelexicaliseConllu):
+        def __init__(self, attach_morphological_case, visualise):
+            decisions.append(attach_morphological_case)
+            super().__init__(attach_morphological_case, visualise)
+
+    monkeypatch.setattr(relexicalise_enhanced_dependencies, "RelexicaliseConllu", RelexicaliseConllu)
+    assert relexicalise_enhanced_dependencies.main(["relex", "-i", str(parsed), "-t", str(treebank)]) == 0
+    assert relexicalise_enhanced_dependencies.main(["relex", "-i", str(parsed)]) == 0
+    assert decisions == [True, False]
+    # no profile is stored next to the parser output
+    assert not os.path.exists(str(parsed) + TreebankProfile.SUFFIX)
@@ -0,0 +1,72 @@
+import csv
+import os
+import shutil
+
+import pytest
+
+import run
+
+
+@pytest.fixture
+def gold_and_systems(sample_file, tmp_path):
+    gold = tmp_path / "UD_Sample" / "en_sample-ud-test.conllu"
+    gold.parent.mkdir()
+    shutil.copy(sample_file, gold)
+    systems = tmp_path / "sysoutputs"
+    systems.mkdir()
+    for name in ("en_sample-a.conllu", "en_sample-b.conllu"):
+        shutil.copy(sample_file, systems / name)
+    return str(gold), str(systems)
+
+
+def read_table(filename):
+    with open(filename, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_evaluate_systems_against_one_gold(gold_and_systems):
+    gold, systems = gold_and_systems
+    rows = run.evaluate(run.argparser().parse_args(["-g", gold, "-s", systems]))
+
+    assert [row[:2] for row in rows] == [["en_sample", "en_sample-a.conllu"], ["en_sample", "en_sample-b.conllu"]]
+    for row in rows:
+        scores = dict(zip(run.HEADER, row))
+        assert scores["elas"] == scores["eulas"] == scores["euas"] == 1.0
+
+
+def test_rows_are_appended_under_one_header(gold_and_systems, tmp_path):
+    gold, systems = gold_and_systems
+    table = str(tmp_path / "metadata.csv")
+    for _ in range(2):
+        assert run.main(["run.py", "-g", gold, "-s", systems, "--table", table]) == 0
+
+    rows = read_table(table)
+    assert rows[0] == run.HEADER
+    assert len(rows) == 5
+    assert all(len(row) == len(run.HEADER) for row in rows)
+
+
+def test_table_of_another_version_is_rejected(gold_and_systems, tmp_path, monkeypatch):
+    gold, systems = gold_and_systems
+    table = str(tmp_path / "metadata.csv")
+    with open(table, "w") as f:
+        f.write("tbid,case_success_gold,case_success_system,diff_success,enhanced_deps_gold,enhanced_deps_system\n")
+
+    def evaluate(args):
+        raise AssertionError("evaluated although the table does not fit")
+
+    monkeypatch.setattr(run, "evaluate", evaluate)
+    assert run.main(["run.py", "-g", gold, "-s", systems, "--table", table]) == 1
+    with pytest.raises(ValueError):
+        run.write_table(table, [])
+
+
+def test_evaluation_errors_are_not_caught(gold_and_systems, tmp_path, monkeypatch):
+    gold, systems = gold_and_systems
+
+    def evaluate(args):
+        raise ValueError("broken system file")
+
+    monkeypatch.setattr(run, "evaluate", evaluate)
+    with pytest.raises(ValueError, match="broken system file"):
+        run.main(["run.py", "-g", gold, "-s", systems, "--table", str(tmp_path / "metadata.csv")])
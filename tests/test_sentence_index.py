@@ -0,0 +1,60 @@
+import os
+import shutil
+
+import pytest
+
+import sentence_index
+from sentence_index import SentenceIndex
+from utils import format_sentence, iter_conll
+
+
+@pytest.fixture
+def treebank(sample_file, tmp_path):
+    filename = tmp_path / os.path.basename(sample_file)
+    shutil.copy(sample_file, filename)
+    return str(filename)
+
+
+def test_read_by_ordinal_and_sent_id(treebank):
+    annotated_sentences = list(iter_conll(treebank))
+    index = SentenceIndex.load(treebank)
+    try:
+        assert len(index) == len(annotated_sentences)
+        for ordinal, annotated_sentence in enumerate(annotated_sentences):
+            assert format_sentence(index.read_sentence(ordinal)) == format_sentence(annotated_sentence)
+        assert format_sentence(index.read_sent_id("s7")) == format_sentence(annotated_sentences[6])
+        # the last sentence has no sent_id
+        assert index.sent_ids[-1] is None
+    finally:
+        index.close()
+
+
+def test_stored_index_is_reused_until_the_file_changes(treebank, monkeypatch):
+    SentenceIndex.build(treebank)
+    assert os.path.exists(treebank + SentenceIndex.SUFFIX)
+    assert not [name for name in os.listdir(os.path.dirname(treebank)) if name.endswith(".tmp")]
+
+    scans = []
+    scan_sentences = sentence_index.scan_sentences
+    monkeypatch.setattr(sentence_index, "scan_sentences", lambda filename: scans.append(filename) or scan_sentences(filename))
+    assert len(SentenceIndex.load(treebank)) == 8
+    assert scans == []
+
+    with open(treebank, "a", encoding="utf-8") as f:
+        f.write("# sent_id = s8\n1\tYes\tyes\tINTJ\t_\t_\t0\troot\t0:root\t_\n\n")
+    index = SentenceIndex.load(treebank)
+    assert scans == [treebank]
+    assert index.read_sent_id("s8")[1].word == "Yes"
+    index.close()
+
+
+def test_empty_file(tmp_path):
+    filename = tmp_path / "empty.conllu"
+    filename.write_text("")
+
+    index = SentenceIndex.load(str(filename))
+    assert len(index) == 0
+    assert index.sample(0) == []
+    with pytest.raises(IndexError):
+        index.read_sentence(0)
+    index.close()
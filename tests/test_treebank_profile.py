@@ -0,0 +1,61 @@
+import os
+import shutil
+
+import pytest
+
+import treebank_profile
+from treebank_profile import TreebankProfile
+
+
+@pytest.fixture
+def treebank(sample_file, tmp_path):
+    filename = tmp_path / os.path.basename(sample_file)
+    shutil.copy(sample_file, filename)
+    return str(filename)
+
+
+def test_profile_is_stored_and_read(treebank):
+    profile = TreebankProfile.load(treebank)
+    assert os.path.isfile(treebank + TreebankProfile.SUFFIX)
+    assert "obl:to" in profile.edeprels
+
+    stored = TreebankProfile.read(treebank)
+    assert stored is not None
+    assert stored.forbidden_list == profile.forbidden_list
+    assert stored.attach_morphological_case == profile.attach_morphological_case
+
+
+def test_touched_file_keeps_its_profile(treebank):
+    TreebankProfile.load(treebank)
+    stat = os.stat(treebank)
+    os.utime(treebank, (stat.st_atime, stat.st_mtime + 10))
+
+    assert TreebankProfile.read(treebank) is not None
+
+
+def test_changed_file_invalidates_its_profile(treebank):
+    TreebankProfile.load(treebank)
+    with open(treebank, "r+", encoding="utf-8") as f:
+        text = f.read()
+        f.seek(0)
+        # same size, other contents
+        f.write(text.replace("store", "shops"))
+
+    assert TreebankProfile.read(treebank) is None
+    assert TreebankProfile.read(treebank, vocab_cutoff=2) is None
+
+
+def test_load_without_saving(treebank):
+    TreebankProfile.load(treebank, save=False)
+    assert not os.path.exists(treebank + TreebankProfile.SUFFIX)
+
+
+def test_load_when_the_profile_cannot_be_stored(treebank, monkeypatch):
+    def write_profile(path, profile):
+        raise PermissionError(13, "Permission denied", path)
+
+    # e.g. a treebank on read-only storage
+    monkeypatch.setattr(treebank_profile, "write_profile", write_profile)
+    profile = TreebankProfile.load(treebank)
+    assert profile.edeprels
+    assert not os.path.exists(treebank + TreebankProfile.SUFFIX)
@@ -0,0 +1,68 @@
+import os
+import types
+
+import pytest
+
+from utils import (buildVocab, count_vocab_parallel, find_chunk_boundaries, format_sentence,
+                   get_codec, iter_chunk, iter_conll, open_conll, read_conll, read_conll_parallel)
+
+
+def get_text(annotated_sentences):
+    """Writes the sentences back out without their ROOT tokens."""
+    return "".join("\n".join(sentence.comments + [str(token) for token in sentence[1:]]) + "\n\n" for sentence in annotated_sentences)
+
+
+def test_iter_conll_streams_the_sentences_of_read_conll(sample_file, sample_text):
+    sentences = iter_conll(sample_file)
+    assert isinstance(sentences, types.GeneratorType)
+    sentences = list(sentences)
+
+    annotated_sentences, comments = read_conll(sample_file)
+    assert [format_sentence(sentence) for sentence in sentences] == [format_sentence(sentence) for sentence in annotated_sentences]
+    assert get_text(sentences) == sample_text
+
+    # comments are indexed from 1, and only kept for the sentences which have some
+    assert sorted(comments) == list(range(1, 8))
+    assert comments[3] == ["# sent_id = s3", "# text = Il parle du livre."]
+    assert not annotated_sentences[-1].comments
+
+
+def test_iter_conll_skip_mwt(sample_file):
+    sentence = list(iter_conll(sample_file, skip_mwt=True))[2]
+    assert [str(token.conllu_id) for token in sentence[1:]] == ["1", "2", "3", "4", "5", "6"]
+
+
+@pytest.mark.parametrize("num_chunks", [1, 3, 8, 100])
+def test_chunks_end_on_sentence_boundaries(sample_file, sample_text, num_chunks):
+    boundaries = find_chunk_boundaries(sample_file, num_chunks)
+    assert boundaries[0][0] == 0 and boundaries[-1][1] == len(sample_text.encode("utf-8"))
+    assert all(end == next_start for (_, end), (next_start, _) in zip(boundaries, boundaries[1:]))
+
+    sentences = [sentence for start, end in boundaries for sentence in iter_chunk(sample_file, start, end)]
+    assert get_text(sentences) == sample_text
+
+
+def test_read_conll_parallel_equals_read_conll(sample_file):
+    annotated_sentences, comments = read_conll(sample_file)
+
+    parallel_sentences, parallel_comments, parallel_vocab = read_conll_parallel(sample_file, workers=2, chunks_per_worker=2)
+    assert get_text(parallel_sentences) == get_text(annotated_sentences)
+    assert parallel_comments == comments
+    assert parallel_vocab == buildVocab(annotated_sentences)
+    assert count_vocab_parallel(sample_file, workers=2).build() == parallel_vocab
+
+
+@pytest.mark.parametrize("extension", [".gz", ".bz2", ".xz"])
+def test_compressed_files_read_like_plain_ones(sample_file, sample_text, tmp_path, extension):
+    filename = str(tmp_path / ("en_sample-ud-train.conllu" + extension))
+    with open_conll(filename, "w", compresslevel=1) as f:
+        f.write(sample_text)
+    with open(filename, "rb") as f:
+        assert f.read(len(sample_text)) != sample_text.encode("utf-8")
+
+    assert get_text(iter_conll(filename)) == sample_text
+    # a compressed file is recognised by its first bytes whatever its name
+    renamed = str(tmp_path / "en_sample-ud-train.conllu")
+    os.rename(filename, renamed)
+    assert get_codec(renamed) is get_codec(filename)
+    assert get_text(read_conll_parallel(renamed, workers=1)[0]) == sample_text
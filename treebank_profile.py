@@ -0,0 +1,270 @@
+import os
+import sys
+import json
+from collections import Counter
+
+from utils import VocabCounter, hash_file, iter_conll_columns
+
+"""
+Computes the profile of a treebank, i.e. the decisions delexicalisation takes from the whole
+input (whether to attach morphological case and which words are never delexicalised) plus its
+label inventory, and stores it next to the treebank as <file>.profile.json, e.g.:
+
+python conllugraph/treebank_profile.py -i data/train-dev/UD_Finnish-TDT/fi_tdt-ud-train.conllu
+"""
+
+# bump whenever the layout or the computation of a profile changes
+PROFILE_VERSION = 1
+
+
+def get_case_feature(feats):
+    """Returns the lowercased Case value of an unprocessed FEATS column, or None if it has none."""
+
+    case_information = None
+    if feats != "_":
+        for feature in feats.split("|"):
+            if feature.startswith("Case="):
+                case_information = feature.split("=")[1].lower()
+
+    return case_information
+
+
+def profile_treebank(filename, num_case_sentences=1000):
+    """
+    Lightweight first pass over the input, which only looks at the FEATS, DEPREL and DEPS columns
+    instead of parsing full sentences. It counts the vocab for the forbidden list and makes the same
+    decision as delexicalise_enhanced_dependencies.check_edeps_for_morph_case on the first
+    num_case_sentences sentences.
+
+    Returns:
+        vocab_counter: VocabCounter with the feats, deprels and edeprels of the input (the words are not counted).
+        attach_morphological_case: whether to attach morphological case to the enhanced labels.
+    """
+
+    vocab_counter = VocabCounter()
+    hits = 0
+
+    for sentence_index, rows in enumerate(iter_conll_columns(filename)):
+        vocab_counter.add_columns(rows)
+        if sentence_index >= num_case_sentences:
+            continue
+        for feats, _, deps in rows:
+            case_information = get_case_feature(feats)
+            if case_information is None:
+                continue
+            for edep in deps.split("|"):
+                # the last part of the label, e.g. gen in 4:nmod:gen
+                if edep != "_" and edep.rpartition(":")[2] == case_information:
+                    hits += 1
+
+    attach_morphological_case = hits >= 50
+    print(f"Attaching morphological case: {attach_morphological_case}")
+
+    return vocab_counter, attach_morphological_case
+
+
+def get_forbidden_from_vocab(vocab):
+    """
+    Adds deprels/edeprels/and case feats to forbidden list.
+
+    Arguments:
+        vocab: the buildVocab output, e.g. built from a VocabCounter stored with --vocab.
+    """
+
+    # counts will just be 1 as we are taking information from a final vocabulary.
+    featForbidden = Counter()
+    deprelForbidden = Counter()
+    edeprelForbidden = Counter()
+
+    feats = vocab["feats"]
+    for mf in feats:
+        k, v = mf.split("=")
+        if k == "Case":
+            case_info = v.lower()
+            featForbidden.update([case_info])
+
+    for deprel in vocab["deprels"]:
+        deprelForbidden.update([deprel])
+        #split on deprel for uncommon parts.
+        if len(deprel.split(":")) == 2:
+            short = deprel.split(":")[0]
+            long = deprel.split(":")[1]
+            deprelForbidden.update([short])
+            deprelForbidden.update([long])
+
+    for edeprel in vocab["edeprels"]:
+        first = edeprel.split(":")[0]
+        edeprelForbidden.update([first])
+    
+    forbidden = featForbidden + deprelForbidden + edeprelForbidden
+    
+    extras = ["obl", "arg", "pass", "poss", "xsubj", "mod", "tmod", "prt", "agent", "relcl", "relobj", "alias"]
+
+    forbidden_list = list(forbidden.keys()) + extras
+
+    print(f"Not delexicalising the following words: {forbidden_list}")
+
+    return forbidden_list
+
+
+
+class TreebankProfile(object):
+    """
+    TreebankProfile
+
+    The morphological case decision, the forbidden list, the label inventory and the vocab sizes
+    of a treebank. It is stored as a small JSON sidecar next to the treebank, keyed by the SHA-1
+    of its contents, so delexicalisation and evaluation can load it instead of scanning the
+    treebank again, and relexicalisation can load the profile of the training treebank (--treebank)
+    for parser output. Storing it is best effort, e.g. a treebank on read-only storage is profiled
+    on every run instead.
+    """
+    SUFFIX = ".profile.json"
+
+    def __init__(self, attach_morphological_case, forbidden_list, deprels, edeprels, vocab_sizes, vocab_cutoff=1):
+        self.attach_morphological_case = attach_morphological_case
+        self.forbidden_list = forbidden_list
+        self.deprels = deprels
+        self.edeprels = edeprels
+        self.vocab_sizes = vocab_sizes
+        self.vocab_cutoff = vocab_cutoff
+
+    @classmethod
+    def from_vocab(cls, vocab, attach_morphological_case, forbidden_list=None, vocab_cutoff=1):
+        """Builds the profile from a buildVocab output, e.g. when the vocab is stored or cached."""
+
+        if forbidden_list is None:
+            forbidden_list = get_forbidden_from_vocab(vocab)
+        vocab_sizes = {key: len(items) for key, items in vocab.items()}
+        return cls(attach_morphological_case, forbidden_list, vocab["deprels"], vocab["edeprels"], vocab_sizes, vocab_cutoff)
+
+    @classmethod
+    def compute(cls, filename, vocab_cutoff=1):
+        """Profiles the treebank with a column-only scan, see profile_treebank."""
+
+        vocab_counter, attach_morphological_case = profile_treebank(filename)
+        return cls.from_vocab(vocab_counter.build(vocab_cutoff), attach_morphological_case, vocab_cutoff=vocab_cutoff)
+
+    def save(self, filename):
+        """Stores the profile as the sidecar of a treebank file, keyed by its current contents."""
+
+        stat = os.stat(filename)
+        profile = {
+            "version": PROFILE_VERSION,
+            "sha1": hash_file(filename),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "vocab_cutoff": self.vocab_cutoff,
+            "attach_morphological_case": self.attach_morphological_case,
+            "forbidden_list": self.forbidden_list,
+            "deprels": self.deprels,
+            "edeprels": self.edeprels,
+            "vocab_sizes": self.vocab_sizes,
+        }
+        write_profile(filename + self.SUFFIX, profile)
+
+    @classmethod
+    def read(cls, filename, vocab_cutoff=None):
+        """
+        Reads the stored profile of a treebank file, built with any vocab cutoff unless one is given.
+
+        The profile is valid when the file's size and mtime are unchanged. If only the mtime changed,
+        the content hash decides, so touching (or copying) a file does not make its profile stale.
+
+        Returns:
+            profile: the TreebankProfile, or None if there is no valid stored profile.
+        """
+
+        try:
+            with open(filename + cls.SUFFIX, encoding="utf-8") as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if profile.get("version") != PROFILE_VERSION:
+            return None
+        if vocab_cutoff is not None and profile["vocab_cutoff"] != vocab_cutoff:
+            return None
+
+        stat = os.stat(filename)
+        if profile["size"] != stat.st_size:
+            return None
+        if profile["mtime"] != stat.st_mtime:
+            if profile["sha1"] != hash_file(filename):
+                return None
+            profile["mtime"] = stat.st_mtime
+            try:
+                write_profile(filename + cls.SUFFIX, profile)
+            except OSError:
+                # still valid, the hash is only checked again on the next read
+                pass
+
+        return cls(profile["attach_morphological_case"], profile["forbidden_list"], profile["deprels"],
+                   profile["edeprels"], profile["vocab_sizes"], profile["vocab_cutoff"])
+
+    @classmethod
+    def load(cls, filename, vocab_cutoff=1, save=True):
+        """
+        Returns the stored profile of a treebank file, computing it if it is missing or stale.
+        A computed profile is stored unless save is False, e.g. for files which are not treebanks
+        of the data tree, and it is still returned when it can't be stored.
+        """
+
+        profile = cls.read(filename, vocab_cutoff)
+        if profile is not None:
+            print(f"Loading treebank profile of {filename}")
+            print(f"Attaching morphological case: {profile.attach_morphological_case}")
+            return profile
+
+        profile = cls.compute(filename, vocab_cutoff)
+        if save:
+            try:
+                profile.save(filename)
+            except OSError as e:
+                print(f"Not storing the treebank profile of {filename}: {e}")
+        return profile
+
+
+def write_profile(path, profile):
+    """Writes the sidecar through a temporary file, so an interrupted write never leaves half a profile."""
+
+    try:
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        if os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
+        raise
+
+
+def argparser():
+    from argparse import ArgumentParser
+    ap = ArgumentParser()
+    ap.add_argument('-i', '--input', type=str,
+    help='Input CoNLL-U file.')
+    ap.add_argument('--vocab-cutoff', type=int, default=1,
+    help='Minimum number of occurrences for a feature or label to be part of the vocab.')
+    ap.add_argument('--force', default=False, action='store_true',
+    help='Recompute the profile even if a valid one is stored.')
+    return ap
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+
+    if args.force:
+        profile = TreebankProfile.compute(args.input, args.vocab_cutoff)
+        profile.save(args.input)
+    else:
+        profile = TreebankProfile.load(args.input, args.vocab_cutoff)
+
+    print(f"{args.input}: {profile.vocab_sizes}")
+    print(f"deprels: {profile.deprels}")
+    print(f"edeprels: {len(profile.edeprels)}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,163 +1,604 @@
 # based on the C2L2 utils in https://github.com/CoNLL-UD-2017/C2L2/blob/master/cdparser_multi/io.py
 
+import os
+import json
+import hashlib
+import bz2
+import gzip
+import lzma
+import multiprocessing
 from collections import defaultdict
 from collections import Counter
 
-from graph import ConlluToken
+from graph import ConlluToken, ConlluSentence, SymbolTable, parse_deps
 
 # set CoNLL-U columns as indices
 ID, FORM, LEMMA, UPOS, XPOS, FEATS, HEAD, DEPREL, DEPS, MISC = range(10)
 
+# compression codecs by file extension and by the magic bytes they start with
+CODECS = {
+    ".gz": gzip,
+    ".bz2": bz2,
+    ".xz": lzma,
+}
+MAGIC_BYTES = [
+    (b"\x1f\x8b", gzip),
+    (b"BZh", bz2),
+    (b"\xfd7zXZ\x00", lzma),
+]
 
 
-def buildVocab(annotated_sentences, cutoff=1):
-    wordsCount = Counter()
-    charsCount = Counter()
-    uposCount = Counter()
-    xposCount = Counter()
-    deprelCount = Counter()
-    edeprelCount = Counter()
-    featCount = Counter()
+def get_codec(filename, sniff=True):
+    """
+    Returns the compression module (gzip, bz2 or lzma) for a file, or None if it is not compressed.
+    The codec is detected from the extension or, for existing files, from their first bytes.
+    """
 
-    for annotated_sentence in annotated_sentences:
-        for node in annotated_sentence[1:]:
-            # words
-            wordsCount.update([node.word])
-            # feats
-            if type(node.feats_set) == dict:
-                for k, v in node.feats_set.items():
-                    feat_singleton = f"{k}={v}"
-                    featCount.update([feat_singleton])
-            # deprels
-            deprelCount.update([node.deprel])
-            # edeprels
-            if type(node.deps_set) == list:
-                for h_l_tuple in node.deps_set:
-                    enhanced_label = h_l_tuple[1]
-                    edeprelCount.update([enhanced_label])
-
-    # wordsCount = Counter({w: i for w, i in wordsCount.items() if i >= cutoff})
-    print("Vocab containing {} words".format(len(wordsCount)))
-
-    print("Feats containing {} tags".format(len(featCount)))
-    print("Deprels containing {} tags".format(len(deprelCount)))
-    print("EDeprels containing {} tags".format(len(edeprelCount)))
-
-    ret = {
-        #"vocab": list(wordsCount.keys()),
-        "feats": list(featCount.keys()),
-        "deprels": list(deprelCount.keys()),
-        "edeprels": list(edeprelCount.keys()),
-    }
-
-    return ret
-
-
-def read_conll(filename, skip_mwt=False):
+    codec = CODECS.get(os.path.splitext(filename)[1].lower())
+    if codec is None and sniff and os.path.isfile(filename):
+        with open(filename, "rb") as f:
+            head = f.read(6)
+        for magic, magic_codec in MAGIC_BYTES:
+            if head.startswith(magic):
+                return magic_codec
+    return codec
+
+
+def open_conll(filename, mode="r", compresslevel=None, encoding="utf-8", codec=None):
     """
-    Reads an input CoNLL-U file and parses the various CoNLL-U features.
+    Opens a (possibly compressed) CoNLL-U file in text mode, streaming the (de)compression.
 
     Arguments:
-        filename: relative path of input file.
+        filename: path of the file.
+        mode: "r" to read, "w" to write.
+        compresslevel: compression level when writing a compressed file, defaults to the codec's default.
+        encoding: text encoding of the file.
+        codec: optional compression module to use instead of the one detected by get_codec,
+        e.g. to write an output with the codec of its input, whatever its name.
+    """
 
-    Returns:
-        annotated_sentences: List of Lists where each list contains the ConlluToken objects
-        for each token in a sentence.
+    if codec is None:
+        codec = get_codec(filename, sniff="r" in mode)
+    if codec is None:
+        return open(filename, mode, encoding=encoding)
+
+    kwargs = {}
+    if "w" in mode and compresslevel is not None:
+        # lzma calls it a preset
+        kwargs["preset" if codec is lzma else "compresslevel"] = compresslevel
+    return codec.open(filename, mode + "t", encoding=encoding, **kwargs)
+
+
+def hash_file(filename, chunk_size=1 << 20):
+    """Returns the SHA-1 hex digest of a file's contents."""
+
+    sha1 = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class VocabCounter(object):
+    """
+    VocabCounter
+
+    Counts the words, morphological features, deprels and enhanced deprels of a corpus, one sentence
+    at a time, so the vocab can be built in the same pass as the reading. Counters of consecutive
+    parts of a corpus (e.g. from worker processes) can be merged, and a counter can be saved to
+    and loaded from a JSON file, so the vocab of a corpus can be reused without reading it again.
+    Items keep the order in which they first occur.
     """
+    KEYS = ("words", "feats", "deprels", "edeprels")
 
-    def get_word(columns):
+    def __init__(self, counts=None):
+        self.counts = {key: Counter() for key in self.KEYS}
+        # whole FEATS columns are counted and only split into k=v singletons when the counts are read
+        self.feats_columns = Counter()
+        if counts:
+            for key, counter in counts.items():
+                self.counts[key].update(counter)
+
+    def add_sentence(self, annotated_sentence):
+        words = self.counts["words"]
+        deprels = self.counts["deprels"]
+        edeprels = self.counts["edeprels"]
+        feats_columns = self.feats_columns
+
+        # skip ROOT
+        for node in annotated_sentence[1:]:
+            words[node.word] += 1
+            feats_columns[node.feats] += 1
+            deprels[node.deprel] += 1
+            for enhanced_head, enhanced_label in node.deps_set:
+                edeprels[enhanced_label] += 1
+
+    def add_columns(self, rows):
         """
-        Arguments:
-            columns: List containing the 10 CoNLL-U columns at a particular row.
+        Counts the vocab of one sentence from its raw columns, without building ConlluToken objects.
+        The words are not counted.
 
-        Returns:
-            ConlluToken object for the row which enables accessing the word's fields.
+        Arguments:
+            rows: the (FEATS, DEPREL, DEPS) columns of each token line, see iter_conll_columns.
         """
+        deprels = self.counts["deprels"]
+        edeprels = self.counts["edeprels"]
+        feats_columns = self.feats_columns
+
+        for feats, deprel, deps in rows:
+            feats_columns[feats] += 1
+            deprels[deprel] += 1
+            for enhanced_head, enhanced_label in parse_deps(deps):
+                edeprels[enhanced_label] += 1
+
+    def get_counts(self):
+        """Returns a dictionary with the Counter of each item type."""
+
+        if self.feats_columns:
+            feats = self.counts["feats"]
+            for feats_column, count in self.feats_columns.items():
+                if feats_column == "_":
+                    continue
+                for feat_singleton in feats_column.split("|"):
+                    feats[feat_singleton] += count
+            self.feats_columns = Counter()
+        return self.counts
+
+    def update(self, other):
+        """Adds the counts of another VocabCounter, e.g. the one of the next chunk of a corpus."""
 
-        return ConlluToken(columns[ID], columns[FORM], columns[LEMMA], columns[UPOS], columns[XPOS], columns[FEATS], columns[HEAD], columns[DEPREL], columns[DEPS], columns[MISC])
+        counts = self.get_counts()
+        for key, counter in other.get_counts().items():
+            counts[key].update(counter)
+        return self
 
-    def get_children(words):
+    @classmethod
+    def merge(cls, counters):
+        """Merges the counters of consecutive parts of a corpus into a new VocabCounter."""
+
+        merged = cls()
+        for counter in counters:
+            merged.update(counter)
+        return merged
+
+    def save(self, filename):
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(self.get_counts(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def build(self, cutoff=1):
         """
+        Builds the vocab from the counts.
+
         Arguments:
-            words: List of word objects
+            cutoff: minimum number of occurrences for an item to be part of the vocab.
+
+        Returns:
+            vocab: dictionary with the "feats", "deprels" and "edeprels" lists.
         """
-        # skip ROOT
-        words = words[1:]
-        for word in words:
-            parent_deps = word.deps_set
-            
-            for h_l_tuple in parent_deps:
-                parent = h_l_tuple[0]
-                # skip ROOT
-                if parent != "0":
-                    # As EUD sentences may contain elided tokens, e.g. 5.1, we can't directly access
-                    # the token from the head ID, so we search for matching conllu_ids instead
-                    for target_index, target_token in enumerate(words):
-                        if target_token.conllu_id == parent:
-                            parent_token = words[int(target_index)]
-
-                    parent_token.children.add(word)
-                    #print(f"parent {parent}, children: {parent_token.children}")
-
-    file = open(filename, "r")
-
-    root = ConlluToken(0, '*ROOT*', '*ROOT*', 'ROOT-UPOS', 'ROOT-XPOS', '_', -1, 'rroot', '-1:rroot', '_')
-
-    words = []
-    tokens = []
-    edges = []
-    annotated_sentences = []
-    
-    sentence_index = 1
-    comments = defaultdict(lambda: [])
 
-    while True:
-        line = file.readline()
+        vocab = {key: [item for item, count in counter.items() if count >= cutoff]
+                 for key, counter in self.get_counts().items()}
 
-        # Set sentence_start to True for start of file.
-        sentence_start = True
+        print("Vocab containing {} words".format(len(vocab["words"])))
+
+        print("Feats containing {} tags".format(len(vocab["feats"])))
+        print("Deprels containing {} tags".format(len(vocab["deprels"])))
+        print("EDeprels containing {} tags".format(len(vocab["edeprels"])))
+
+        ret = {
+            "feats": vocab["feats"],
+            "deprels": vocab["deprels"],
+            "edeprels": vocab["edeprels"],
+        }
+
+        return ret
+
+
+def buildVocab(annotated_sentences, cutoff=1):
+    vocab_counter = VocabCounter()
+    for annotated_sentence in annotated_sentences:
+        vocab_counter.add_sentence(annotated_sentence)
+    return vocab_counter.build(cutoff)
 
-        # End of file
-        if not line:
-            if len(words) > 0:
-                get_children(words)
-                #get_children([w for w in words if isinstance(w, ConlluToken)])
-                annotated_sentences.append(words)
-                words, tokens, edges = [], [], []
-            break
-        
-        line = line.rstrip("\r\n") # individual lines without linebreaks
 
+def get_word(columns, symbols=None, raw=None):
+    """
+    Arguments:
+        columns: List containing the 10 CoNLL-U columns at a particular row.
+        symbols: optional SymbolTable to intern the columns in. The DEPS column is mostly unique
+        per token, so it is left as is and only its parsed heads and labels are interned.
+        raw: the original line, which is written out as long as the token is not modified.
+
+    Returns:
+        ConlluToken object for the row which enables accessing the word's fields.
+    """
+
+    if symbols is not None:
+        intern = symbols.intern
+        return ConlluToken(intern(columns[ID]), intern(columns[FORM]), intern(columns[LEMMA]), intern(columns[UPOS]),
+                           intern(columns[XPOS]), intern(columns[FEATS]), intern(columns[HEAD]), intern(columns[DEPREL]),
+                           columns[DEPS], intern(columns[MISC]), raw=raw)
+
+    return ConlluToken(columns[ID], columns[FORM], columns[LEMMA], columns[UPOS], columns[XPOS], columns[FEATS], columns[HEAD], columns[DEPREL], columns[DEPS], columns[MISC], raw=raw)
+
+
+def get_children(words):
+    """
+    Arguments:
+        words: ConlluSentence of word objects
+    """
+    words.build_children()
+
+
+def get_root():
+    """Creates the dummy ROOT token which starts every sentence."""
+
+    return ConlluToken(0, '*ROOT*', '*ROOT*', 'ROOT-UPOS', 'ROOT-XPOS', '_', -1, 'rroot', '-1:rroot', '_')
+
+
+def parse_sentence(lines, skip_mwt=False, root=None, build_children=True, symbols=None):
+    """
+    Parses the lines of a single sentence.
+
+    Arguments:
+        lines: the comment and token lines of one sentence, without linebreaks.
+        skip_mwt: whether to skip multi-word token ranges, e.g. 3-4.
+        root: the dummy ROOT token to start the sentence with.
+        build_children: whether to link each token to its enhanced dependents. This needs the DEPS
+        column of every token to be parsed, so it can be turned off when only the word forms are used.
+        symbols: optional SymbolTable shared by the sentences of a corpus, see get_word.
+
+    Returns:
+        sentence: a ConlluSentence containing the ConlluToken objects of the sentence
+        and its comment lines.
+    """
+
+    if root is None:
+        root = get_root()
+
+    words = [root]
+    comments = []
+
+    for line in lines:
         if line.startswith("#"):
-            if sentence_start == True:
-                # append dummy root node
-                words = [root]
-            sentence_start = False
-            comments[sentence_index].append(line.strip())
+            comments.append(line.strip())
+            continue
 
-        # Sentence ends, process items and create empty lists for next sentence
-        if not line:
-            # reset sentence_start to True for next line
-            sentence_start = True
-            sentence_index += 1
-            if len(words) > 0:
-                get_children(words)
-                annotated_sentences.append(words)
-                words, tokens, edges = [], [], []
         # Normal UD Line
         columns = line.split("\t")
         if len(columns) == 10:
             if skip_mwt:
-                if "-" in columns[0]:
+                if "-" in columns[ID]:
                     continue
 
-            words.append(get_word(columns))
-            if columns[HEAD].isdigit():
-                head = int(columns[HEAD])
-            else:
-                head = -1
-            edges.append((head, columns[ID], columns[DEPREL].split(":")[0]))
+            word = get_word(columns, symbols, line)
+            if symbols is not None and build_children:
+                # the children need the parsed DEPS column anyway, so parse it now with interned labels
+                # (set directly, as parsing does not modify the token)
+                word._deps_set = parse_deps(word.deps, symbols)
+            words.append(word)
+
+    sentence = ConlluSentence(words, comments)
+    sentence.build_index()
+    if build_children:
+        get_children(sentence)
+
+    return sentence
+
+
+def iter_sentence_lines(lines):
+    """
+    Groups the lines of a CoNLL-U file into sentences.
+
+    Arguments:
+        lines: iterable of lines, with or without linebreaks.
+
+    Yields:
+        sentence_lines: the comment and token lines of one sentence, without linebreaks.
+    """
+
+    sentence_lines = []
+
+    for line in lines:
+        line = line.rstrip("\r\n") # individual lines without linebreaks
+
+        # Sentence ends, start collecting the next sentence
+        if not line:
+            if len(sentence_lines) > 0:
+                yield sentence_lines
+                sentence_lines = []
+            continue
+
+        sentence_lines.append(line)
+
+    # End of file
+    if len(sentence_lines) > 0:
+        yield sentence_lines
+
+
+def iter_conll_columns(filename, columns=(FEATS, DEPREL, DEPS)):
+    """
+    Cheap scan of a CoNLL-U file which only splits the token lines into their columns, without
+    building ConlluToken or ConlluSentence objects, e.g. to profile a treebank before processing it.
+
+    Arguments:
+        filename: relative path of input file.
+        columns: indices of the columns to keep, by default FEATS, DEPREL and DEPS.
+
+    Yields:
+        rows: a tuple with the requested columns of each token line of one sentence.
+    """
+
+    rows = []
+    in_sentence = False
+
+    with open_conll(filename, "r") as file:
+        for line in file:
+            line = line.rstrip("\r\n")
 
-    file.close()
+            # Sentence ends, start collecting the next sentence
+            if not line:
+                if in_sentence:
+                    yield rows
+                    rows = []
+                    in_sentence = False
+                continue
+
+            in_sentence = True
+            if line.startswith("#"):
+                continue
+
+            fields = line.split("\t")
+            if len(fields) == 10:
+                rows.append(tuple(fields[column] for column in columns))
+
+    # End of file
+    if in_sentence:
+        yield rows
+
+
+def iter_conll(filename, skip_mwt=False, build_children=True, vocab_counter=None, symbols=None):
+    """
+    Lazily reads an input CoNLL-U file, one sentence at a time. Nothing outlives the current
+    sentence, so memory only depends on the longest sentence, unless a SymbolTable is given.
+
+    Arguments:
+        filename: relative path of input file.
+        skip_mwt: whether to skip multi-word token ranges.
+        build_children: whether to link each token to its enhanced dependents.
+        vocab_counter: optional VocabCounter which counts the vocab of each sentence as it is read.
+        symbols: optional SymbolTable to intern the strings of all the sentences in, so repeated
+        labels, lemmas and tags are only stored once when the sentences are all kept, see read_conll.
+
+    Yields:
+        sentence: a ConlluSentence containing the ConlluToken objects for each token
+        in a sentence, with the sentence's comment lines attached.
+    """
+
+    root = get_root()
+
+    with open_conll(filename, "r") as file:
+        for sentence_lines in iter_sentence_lines(file):
+            sentence = parse_sentence(sentence_lines, skip_mwt, root, build_children, symbols)
+            if vocab_counter is not None:
+                vocab_counter.add_sentence(sentence)
+            yield sentence
+
+
+def format_sentence(sent):
+    """Returns a sentence with its comments as CoNLL-U text, including the blank line which ends it."""
+
+    lines = sent.comments + [str(conllu_token) for conllu_token in sent]
+    return "\n".join(lines) + "\n\n"
+
+
+def get_comment_lines(annotated_sentences):
+    """Returns the comment lines of each sentence in a dictionary indexed from 1."""
+
+    comments = defaultdict(lambda: [])
+
+    for sentence_index, sentence in enumerate(annotated_sentences, 1):
+        if sentence.comments:
+            comments[sentence_index] = sentence.comments
+
+    return comments
+
+
+def read_conll(filename, skip_mwt=False, vocab_counter=None):
+    """
+    Reads an input CoNLL-U file and parses the various CoNLL-U features.
+
+    Arguments:
+        filename: relative path of input file.
+        vocab_counter: optional VocabCounter which counts the vocab in the same pass.
+
+    Returns:
+        annotated_sentences: List of Lists where each list contains the ConlluToken objects
+        for each token in a sentence.
+        comments: dictionary with the comment lines of each sentence, indexed from 1.
+    """
+
+    annotated_sentences = list(iter_conll(filename, skip_mwt, vocab_counter=vocab_counter, symbols=SymbolTable()))
+    comments = get_comment_lines(annotated_sentences)
 
     return annotated_sentences, comments
+
+
+def find_chunk_boundaries(filename, num_chunks):
+    """
+    Splits a CoNLL-U file into byte ranges which start and end on sentence boundaries.
+
+    Arguments:
+        filename: relative path of input file.
+        num_chunks: the number of (roughly equally sized) chunks to aim for.
+
+    Returns:
+        boundaries: list of (start, end) byte offsets.
+    """
+
+    size = os.path.getsize(filename)
+    offsets = [0]
+
+    with open(filename, "rb") as f:
+        for chunk_index in range(1, num_chunks):
+            target = max(size * chunk_index // num_chunks, offsets[-1])
+            # skip the rest of the line before the target, which may just be its linebreak,
+            # then move on to the next blank line
+            f.seek(max(target - 1, 0))
+            f.readline()
+            line = f.readline()
+            while line and line.rstrip(b"\r\n"):
+                line = f.readline()
+            offset = f.tell()
+            if offsets[-1] < offset < size:
+                offsets.append(offset)
+
+    offsets.append(size)
+
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+def iter_chunk(filename, start, end, skip_mwt=False, build_children=True, vocab_counter=None, symbols=None):
+    """
+    Lazily parses the sentences in a byte range of a CoNLL-U file, see find_chunk_boundaries.
+    The arguments are the same as for iter_conll.
+    """
+
+    with open(filename, "rb") as f:
+        f.seek(start)
+        lines = f.read(end - start).decode("utf-8").split("\n")
+
+    root = get_root()
+    for sentence_lines in iter_sentence_lines(lines):
+        sentence = parse_sentence(sentence_lines, skip_mwt, root, build_children, symbols)
+        if vocab_counter is not None:
+            vocab_counter.add_sentence(sentence)
+        yield sentence
+
+
+def parse_chunk(filename, start, end, skip_mwt=False, return_sentences=True):
+    """
+    Parses the sentences in a byte range of a CoNLL-U file, e.g. in a worker process.
+
+    Returns:
+        annotated_sentences: the ConlluSentence objects of the chunk, or None if not requested.
+        vocab_counter: the VocabCounter of the chunk.
+    """
+
+    vocab_counter = VocabCounter()
+    annotated_sentences = []
+    # the sentences of the chunk are kept, so their strings are interned
+    symbols = SymbolTable() if return_sentences else None
+    for sentence in iter_chunk(filename, start, end, skip_mwt, return_sentences, vocab_counter, symbols):
+        if return_sentences:
+            annotated_sentences.append(sentence)
+
+    return (annotated_sentences if return_sentences else None), vocab_counter
+
+
+def _apply_to_chunk(task):
+    function, filename, start, end, args = task
+    return function(filename, start, end, *args)
+
+
+def map_file_chunks(function, filename, args=(), workers=None, chunks_per_worker=4):
+    """
+    Splits a file into chunks on sentence boundaries and calls function(filename, start, end, *args)
+    on each chunk in a process pool, yielding the results in file order. The function has to be
+    defined at module level, so it can be sent to the workers.
+    """
+
+    workers = workers or multiprocessing.cpu_count()
+    boundaries = find_chunk_boundaries(filename, workers * chunks_per_worker)
+    tasks = [(function, filename, start, end, args) for start, end in boundaries]
+
+    with multiprocessing.Pool(workers) as pool:
+        # imap keeps the chunks in file order
+        for result in pool.imap(_apply_to_chunk, tasks):
+            yield result
+
+
+def map_chunks(filename, skip_mwt, workers, chunks_per_worker, return_sentences):
+    """Parses the chunks of a file in a process pool, yielding the results in file order."""
+
+    return map_file_chunks(parse_chunk, filename, (skip_mwt, return_sentences), workers, chunks_per_worker)
+
+
+def read_conll_parallel(filename, skip_mwt=False, workers=None, chunks_per_worker=4, cutoff=1):
+    """
+    Reads an input CoNLL-U file with a pool of worker processes. The file is split into byte ranges
+    on sentence boundaries, each range is parsed by a worker and the results are put back together
+    in the original order, so the output is the same as read_conll plus buildVocab.
+
+    The parsed sentences have to be pickled back to this process, and rebuilding them here costs
+    about as much as parsing them, so this pays off when the workers do more than parsing, e.g.
+    when only the vocab is needed (see build_vocab_parallel).
+
+    Arguments:
+        filename: relative path of input file.
+        skip_mwt: whether to skip multi-word token ranges.
+        workers: number of worker processes, defaults to the number of CPUs.
+        chunks_per_worker: more chunks than workers balance the load when sentences vary in length.
+        cutoff: minimum number of occurrences for an item to be part of the vocab.
+
+    Returns:
+        annotated_sentences: the ConlluSentence objects of the file.
+        comments: dictionary with the comment lines of each sentence, indexed from 1.
+        vocab: the buildVocab output, merged across the workers.
+    """
+
+    # compressed files can't be split into byte ranges
+    if get_codec(filename):
+        print(f"{filename} is compressed, parsing it in a single process")
+        vocab_counter = VocabCounter()
+        annotated_sentences, comments = read_conll(filename, skip_mwt, vocab_counter)
+        return annotated_sentences, comments, vocab_counter.build(cutoff)
+
+    annotated_sentences = []
+    vocab_counter = VocabCounter()
+
+    for chunk_sentences, chunk_vocab_counter in map_chunks(filename, skip_mwt, workers, chunks_per_worker, True):
+        annotated_sentences.extend(chunk_sentences)
+        vocab_counter.update(chunk_vocab_counter)
+
+    comments = get_comment_lines(annotated_sentences)
+    vocab = vocab_counter.build(cutoff)
+
+    return annotated_sentences, comments, vocab
+
+
+def count_vocab_parallel(filename, skip_mwt=False, workers=None, chunks_per_worker=4):
+    """
+    Counts the vocab of a CoNLL-U file with a pool of worker processes. Only the vocab counts
+    are sent back from the workers, so this scales with the number of workers.
+
+    Returns:
+        vocab_counter: the VocabCounter of the file, merged across the workers.
+    """
+
+    # compressed files can't be split into byte ranges
+    if get_codec(filename):
+        print(f"{filename} is compressed, parsing it in a single process")
+        vocab_counter = VocabCounter()
+        for _ in iter_conll(filename, skip_mwt, build_children=False, vocab_counter=vocab_counter):
+            pass
+        return vocab_counter
+
+    return VocabCounter.merge(chunk_vocab_counter for _, chunk_vocab_counter
+                              in map_chunks(filename, skip_mwt, workers, chunks_per_worker, False))
+
+
+def build_vocab_parallel(filename, skip_mwt=False, workers=None, chunks_per_worker=4, cutoff=1):
+    """
+    Builds the vocab of a CoNLL-U file with a pool of worker processes, see count_vocab_parallel.
+
+    Returns:
+        vocab: the buildVocab output, merged across the workers.
+    """
+
+    return count_vocab_parallel(filename, skip_mwt, workers, chunks_per_worker).build(cutoff)